@@ -0,0 +1,28 @@
+"""
+add user_book shelf index
+
+Revision ID: a2ed5b3b2e49
+Revises: e58b89e64a84
+Create Date: 2026-10-18 09:10:42.118305
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a2ed5b3b2e49"
+down_revision: str | None = "e58b89e64a84"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade."""
+    op.create_index("idx_user_book_user_status_book", "user_book", ["user_id", "status", "book_id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade."""
+    op.drop_index("idx_user_book_user_status_book", table_name="user_book")
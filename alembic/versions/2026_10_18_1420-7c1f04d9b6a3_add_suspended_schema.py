@@ -0,0 +1,37 @@
+"""
+add suspended_schema
+
+Revision ID: 7c1f04d9b6a3
+Revises: a2ed5b3b2e49
+Create Date: 2026-10-18 14:20:05.531207
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7c1f04d9b6a3"
+down_revision: str | None = "a2ed5b3b2e49"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade."""
+    # Holds the definitions of triggers and indexes dropped for a bulk load until they are recreated.
+    op.create_table(
+        "suspended_schema",
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("sql", sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade."""
+    op.drop_table("suspended_schema")
@@ -0,0 +1,71 @@
+"""
+add catalog_version
+
+Revision ID: b3e8d2c61f0a
+Revises: 7c1f04d9b6a3
+Create Date: 2026-10-18 16:10:37.402115
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b3e8d2c61f0a"
+down_revision: str | None = "7c1f04d9b6a3"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# Tables whose changes can change search results.
+CATALOG_TABLES = ("book", "author", "author_book")
+
+
+def upgrade() -> None:
+    """Upgrade."""
+    # A single row, bumped on every change to the catalog, so cached search results can tell they are stale.
+    op.create_table("catalog_version", sa.Column("version", sa.Integer(), nullable=False))
+    op.execute(sa.text("INSERT INTO catalog_version (version) VALUES (0)"))
+
+    if op.get_context().dialect.name == "postgresql":
+        op.execute(
+            sa.text("""\
+CREATE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE catalog_version SET version = version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql""")
+        )
+        for table in CATALOG_TABLES:
+            op.execute(
+                sa.text(
+                    f"CREATE TRIGGER {table}_catalog_version AFTER INSERT OR UPDATE OR DELETE ON {table}"
+                    " FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version()"
+                )
+            )
+        return
+
+    for table in CATALOG_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            op.execute(
+                sa.text(f"""\
+CREATE TRIGGER {table}_catalog_version_{event[0].lower()} AFTER {event} ON {table} BEGIN
+    UPDATE catalog_version SET version = version + 1;
+END""")
+            )
+
+
+def downgrade() -> None:
+    """Downgrade."""
+    if op.get_context().dialect.name == "postgresql":
+        for table in CATALOG_TABLES:
+            op.execute(sa.text(f"DROP TRIGGER {table}_catalog_version ON {table}"))
+        op.execute(sa.text("DROP FUNCTION bump_catalog_version()"))
+    else:
+        for table in CATALOG_TABLES:
+            for event in "iud":
+                op.execute(sa.text(f"DROP TRIGGER {table}_catalog_version_{event}"))
+    op.drop_table("catalog_version")
@@ -0,0 +1,101 @@
+"""
+add typeahead indexes
+
+Revision ID: d41c7e9a2b58
+Revises: b3e8d2c61f0a
+Create Date: 2026-10-18 18:30:12.649021
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d41c7e9a2b58"
+down_revision: str | None = "b3e8d2c61f0a"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# The FTS5 tables over each content table, and the columns the triggers copy into each. fts_book and
+# fts_author are recreated with prefix indexes; the trigram tables are new.
+FTS_TABLES = {
+    "book": {
+        "fts_book": "fts5(id unindexed, isbn unindexed, title, content='book', prefix='2 3 4')",
+        "fts_book_trigram": "fts5(title, content='book', tokenize='trigram')",
+    },
+    "author": {
+        "fts_author": "fts5(id unindexed, name, content='author', prefix='2 3 4')",
+        "fts_author_trigram": "fts5(name, content='author', tokenize='trigram')",
+    },
+}
+PREVIOUS_FTS_TABLES = {
+    "book": {"fts_book": "fts5(id unindexed, isbn unindexed, title, content='book')"},
+    "author": {"fts_author": "fts5(id unindexed, name, content='author')"},
+}
+FTS_COLUMNS = {
+    "fts_book": ("id", "isbn", "title"),
+    "fts_book_trigram": ("title",),
+    "fts_author": ("id", "name"),
+    "fts_author_trigram": ("name",),
+}
+
+
+def _create_fts(tables: dict[str, dict[str, str]]) -> None:
+    """Create the FTS5 tables and the triggers keeping them in sync with their content tables, then fill them."""
+    for content, fts_tables in tables.items():
+        insert, delete = [], []
+        for fts, definition in fts_tables.items():
+            op.execute(sa.text(f"CREATE VIRTUAL TABLE {fts} USING {definition}"))
+            columns = ", ".join(FTS_COLUMNS[fts])
+            new = ", ".join(f"new.{column}" for column in FTS_COLUMNS[fts])
+            old = ", ".join(f"old.{column}" for column in FTS_COLUMNS[fts])
+            insert.append(f"    INSERT INTO {fts}(rowid, {columns}) VALUES (new.rowid, {new});")
+            delete.append(f"    INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.rowid, {old});")
+            op.execute(sa.text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+        for event, statements in (("INSERT", insert), ("DELETE", delete), ("UPDATE", delete + insert)):
+            body = "\n".join(statements)
+            op.execute(
+                sa.text(f"CREATE TRIGGER {content}_a{event[0].lower()} AFTER {event} ON {content} BEGIN\n{body}\nEND")
+            )
+
+
+def _drop_fts(tables: dict[str, dict[str, str]]) -> None:
+    for content, fts_tables in tables.items():
+        for event in ("ai", "ad", "au"):
+            op.execute(sa.text(f"DROP TRIGGER {content}_{event}"))
+        for fts in fts_tables:
+            # Dropping an FTS5 table drops its shadow tables with it.
+            op.execute(sa.text(f"DROP TABLE {fts}"))
+
+
+def upgrade() -> None:
+    """Upgrade."""
+    # Author searches look up the books of each matching author.
+    op.create_index("idx_author_book_author", "author_book", ["author_id"], unique=False)
+
+    if op.get_context().dialect.name == "postgresql":
+        # Prefix matching uses the existing tsvector indexes; pg_trgm serves trigram similarity.
+        op.execute(sa.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        op.execute(sa.text("CREATE INDEX idx_book_title_trgm ON book USING gin (title gin_trgm_ops)"))
+        op.execute(sa.text("CREATE INDEX idx_author_name_trgm ON author USING gin (name gin_trgm_ops)"))
+        return
+
+    # The old author_ad and author_au triggers wrote the wrong columns; all of them are recreated.
+    _drop_fts(PREVIOUS_FTS_TABLES)
+    _create_fts(FTS_TABLES)
+
+
+def downgrade() -> None:
+    """Downgrade."""
+    op.drop_index("idx_author_book_author", table_name="author_book")
+
+    if op.get_context().dialect.name == "postgresql":
+        op.drop_index("idx_author_name_trgm", table_name="author")
+        op.drop_index("idx_book_title_trgm", table_name="book")
+        return
+
+    _drop_fts(FTS_TABLES)
+    _create_fts(PREVIOUS_FTS_TABLES)
@@ -40,7 +40,7 @@ def upgrade() -> None:
     op.create_index("idx_book_title", "book", ["title"], unique=False)
     op.create_table(
         "user",
-        sa.Column("id", sa.String(), autoincrement=True, nullable=False),
+        sa.Column("id", sa.String(), autoincrement=False, nullable=False),
         sa.Column("email", sa.String(), nullable=False),
         sa.Column("name", sa.String(), nullable=False),
         sa.PrimaryKeyConstraint("id"),
@@ -89,3 +89,5 @@ def downgrade() -> None:
     op.drop_index("idx_author_name", table_name="author")
     op.drop_table("author")
     # ### end Alembic commands ###
+    # PostgreSQL keeps the enum as a type of its own.
+    sa.Enum(name="bookstatus").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,76 @@
+"""
+Importing a shelf: N single POST /books/reading calls vs. one POST /books/batch.
+
+Both runs go through the real application over an ASGI transport against the
+synthetic catalog of benchmarks/synthetic.py, so each single post pays for its
+own request handling, transaction and commit, while the batch pays for them once.
+
+    PYTHONPATH=src python benchmarks/bench_batch.py --books 10000
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from openbook.auth import verify_user
+from openbook.database import WriteQueue, get_db, get_writer
+from openbook.models.orm import User
+from openbook.server import app
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from synthetic import Dataset, clear_shelves, generate
+
+
+async def single_posts(client: httpx.AsyncClient, books: int) -> None:
+    """Put every book on the shelf one request at a time."""
+    for book_id in range(1, books + 1):
+        (await client.post("/books/reading", json={"id": book_id})).raise_for_status()
+
+
+async def one_batch(client: httpx.AsyncClient, books: int) -> None:
+    """Put every book on the shelf in one request."""
+    updates = [{"id": book_id, "status": "reading"} for book_id in range(1, books + 1)]
+    (await client.post("/books/batch", json=updates)).raise_for_status()
+
+
+async def timed(run, books: int) -> float:  # noqa: ANN001
+    """Run one import through the application and return the elapsed seconds."""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        start = time.perf_counter()
+        await run(client, books)
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    """Import the same shelf both ways and print the time each took."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        dataset = Dataset(users=1, books=args.books, seed=args.seed)
+        generate(path, dataset)
+        sessions = async_sessionmaker(bind=create_async_engine(f"sqlite+aiosqlite:///{path}"))
+
+        async def get_bench_db():  # noqa: ANN202
+            async with sessions() as db:
+                yield db
+
+        bench_writer = WriteQueue(sessions)
+        app.dependency_overrides[get_db] = get_bench_db
+        app.dependency_overrides[get_writer] = lambda: bench_writer
+        user = User(**dataset.user(0))
+        app.dependency_overrides[verify_user] = lambda: user
+
+        for name, run in {"single posts": single_posts, "one batch": one_batch}.items():
+            clear_shelves(path)
+            elapsed = asyncio.run(timed(run, args.books))
+            print(f"{name:<14}{args.books:>7} books  {elapsed:8.2f}s  {args.books / elapsed:10.0f} books/s")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
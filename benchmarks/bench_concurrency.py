@@ -0,0 +1,142 @@
+"""
+Throughput of GET /books under concurrent clients, blocking vs. async database access.
+
+"before" serves the shelf query the way the endpoints used to, through a synchronous
+Session inside an async handler, so every query blocks the event loop. "after" is the
+real application running on the AsyncSession dependency. Both are driven in-process
+through an ASGI transport with N clients issuing requests in parallel, against the
+synthetic catalog of benchmarks/synthetic.py.
+
+    PYTHONPATH=src python benchmarks/bench_concurrency.py --clients 1 8 32 --books 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Annotated
+
+import httpx
+from fastapi import Depends, FastAPI
+from openbook.auth import verify_user
+from openbook.database import get_db
+from openbook.endpoints.books import SHELF_PAGE_LIMIT
+from openbook.models.orm import AuthorBook, Book, User, UserBook
+from openbook.models.schemas import Author as AuthorSchema, Book as BookSchema
+from openbook.server import app
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from synthetic import Dataset, clear_shelves, generate, shelve
+
+USER = User(**Dataset().user(0))
+
+
+def populate(path: Path, books: int, seed: int) -> None:
+    """Build the synthetic catalog with `books` books, all on the benchmark user's shelf."""
+    generate(path, Dataset(users=1, books=books, seed=seed))
+    clear_shelves(path)
+    shelve(path, USER.id, range(1, books + 1))
+
+
+def blocking_app(url: str) -> FastAPI:
+    """The pre-async shelf endpoint: a sync Session used from an async handler."""
+    sync_sessions = sessionmaker(bind=create_engine(url, connect_args={"check_same_thread": False}))
+    blocking = FastAPI()
+
+    def get_sync_db():  # noqa: ANN202
+        db = sync_sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @blocking.get("/books")
+    async def get_books(db: Annotated[Session, Depends(get_sync_db)]) -> list[BookSchema]:
+        user_books = (
+            db.query(Book)
+            .join(UserBook, Book.id == UserBook.book_id)
+            .join(AuthorBook, AuthorBook.book_id == Book.id)
+            .filter(UserBook.user_id == USER.id)
+            .all()
+        )
+        return [
+            BookSchema(
+                id=book.id,
+                isbn=book.isbn,
+                title=book.title,
+                authors=[AuthorSchema(id=a.author_id, name=a.author.name, books=[]) for a in book.author],
+                status=book.user[0].status,
+            )
+            for book in user_books
+        ]
+
+    return blocking
+
+
+def async_app(url: str) -> FastAPI:
+    """The application as deployed, pointed at the benchmark database."""
+    async_sessions = async_sessionmaker(
+        bind=create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://")), expire_on_commit=False
+    )
+
+    async def get_async_db():  # noqa: ANN202
+        async with async_sessions() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = get_async_db
+    app.dependency_overrides[verify_user] = lambda: USER
+    return app
+
+
+async def drive(target: FastAPI, clients: int, requests: int) -> tuple[float, list[float]]:
+    """Issue `requests` GET /books calls from `clients` concurrent clients."""
+    latencies: list[float] = []
+    remaining = requests
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=target), base_url="http://bench") as client:
+
+        async def worker() -> None:
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                response = await client.get("/books", params={"limit": SHELF_PAGE_LIMIT})
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        await client.get("/books")  # warm up pools and caches
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+
+def main() -> None:
+    """Time both modes at each client count and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--books", type=int, default=200, help=f"books on the user's shelf, at most {SHELF_PAGE_LIMIT}")
+    parser.add_argument("--requests", type=int, default=400, help="requests per run")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        populate(path, args.books, args.seed)
+        url = f"sqlite:///{path}"
+        modes = {"before (sync Session)": blocking_app(url), "after (AsyncSession)": async_app(url)}
+
+        print(f"{'mode':<24}{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")  # noqa: T201
+        for name, target in modes.items():
+            for clients in args.clients:
+                elapsed, latencies = asyncio.run(drive(target, clients, args.requests))
+                p50 = statistics.median(latencies) * 1000
+                p99 = statistics.quantiles(latencies, n=100)[98] * 1000
+                print(f"{name:<24}{clients:>8}{len(latencies) / elapsed:>10.1f}{p50:>10.2f}{p99:>10.2f}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Throughput of the bulk catalog ingest.
+
+Writes the synthetic catalog of benchmarks/synthetic.py as an OpenLibrary-style
+JSONL dump, migrates a temp database, and times parsing and loading it
+separately and end to end.
+
+    PYTHONPATH=src python benchmarks/bench_ingest.py --books 1000000 --workers 4
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from openbook.ingest import ingest, parse_jsonl, read_jsonl
+from synthetic import Dataset, catalog, migrated_engine
+
+
+def write_dump(path: Path, dataset: Dataset) -> None:
+    """Write the dataset's catalog as a dump of editions."""
+    with path.open("w") as f:
+        for record in catalog(dataset, np.random.default_rng(dataset.seed)):
+            edition = {
+                "title": record.title,
+                "isbn_13": [record.isbn],
+                "authors": [{"name": name} for name in record.authors],
+            }
+            f.write(json.dumps(edition) + "\n")
+
+
+def main() -> None:
+    """Write the dump, then time parsing, loading and both together."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dump = Path(tmp) / "editions.jsonl"
+        write_dump(dump, Dataset(books=args.books, authors=max(args.books // 10, 1), seed=args.seed))
+
+        start = time.perf_counter()
+        with dump.open() as f:
+            records = parse_jsonl(f.readlines())
+        parse = time.perf_counter() - start
+        engine = migrated_engine(Path(tmp) / "parsed.db")
+        start = time.perf_counter()
+        ingest(engine, records)
+        write = time.perf_counter() - start
+        engine.dispose()
+
+        engine = migrated_engine(Path(tmp) / "ingest.db")
+        start = time.perf_counter()
+        with dump.open() as f:
+            stats = ingest(engine, read_jsonl(f, args.workers))
+        total = time.perf_counter() - start
+        engine.dispose()
+
+    print(f"books {stats.books}, authors {stats.authors}")  # noqa: T201
+    print(f"parse only          {parse:6.1f}s  {args.books / parse:9.0f} books/s")  # noqa: T201
+    print(f"write only          {write:6.1f}s  {args.books / write:9.0f} books/s")  # noqa: T201
+    print(f"end to end ({args.workers} wkr)  {total:6.1f}s  {args.books / total:9.0f} books/s")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
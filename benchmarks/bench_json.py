@@ -0,0 +1,98 @@
+"""
+Encoding a page of books: Pydantic models and response validation vs. dicts and orjson.
+
+Both sides start from the same query rows (book, isbn, title, status, author id,
+author name), one per author of the books of the synthetic catalog of
+benchmarks/synthetic.py. The model path builds a Book and Author
+models per row and then does what FastAPI does with a returned BookPage:
+validate it against the response model and dump it to JSON. The fast path
+builds dicts and encodes them once (see openbook.responses).
+
+    PYTHONPATH=src python benchmarks/bench_json.py --books 10000
+"""
+
+import argparse
+import time
+from collections.abc import Callable
+
+import numpy as np
+from openbook.models.orm import BookStatus
+from openbook.models.schemas import Author, Book, BookPage
+from openbook.responses import BookJSONResponse, author_json, book_json
+from pydantic import TypeAdapter
+from synthetic import Dataset, catalog
+
+Row = tuple[int, str, str, BookStatus, int, str]
+
+
+def make_rows(dataset: Dataset) -> list[Row]:
+    """Return the rows of a shelf holding every book of the dataset."""
+    statuses = [BookStatus.READING, BookStatus.COMPLETED]
+    author_ids: dict[str, int] = {}
+    return [
+        (
+            book_id,
+            record.isbn,
+            record.title,
+            statuses[book_id % 2],
+            author_ids.setdefault(name, len(author_ids) + 1),
+            name,
+        )
+        for book_id, record in enumerate(catalog(dataset, np.random.default_rng(dataset.seed)), start=1)
+        for name in record.authors
+    ]
+
+
+def with_models(rows: list[Row]) -> bytes:
+    """Build models per row, then validate and dump them like FastAPI does for a response_model."""
+    books: list[Book] = []
+    for book_id, isbn, title, status, author_id, author_name in rows:
+        if not books or books[-1].id != book_id:
+            books.append(Book(id=book_id, isbn=isbn, title=title, authors=[], status=status))
+        books[-1].authors.append(Author(id=author_id, name=author_name, books=[]))
+    adapter = TypeAdapter(BookPage)
+    page = adapter.validate_python(BookPage(books=books, next_cursor=None), from_attributes=True)
+    return adapter.dump_json(page)
+
+
+def with_orjson(rows: list[Row]) -> bytes:
+    """Build dicts per row and encode them with orjson."""
+    books: list[dict] = []
+    for book_id, isbn, title, status, author_id, author_name in rows:
+        if not books or books[-1]["id"] != book_id:
+            books.append(book_json(book_id, isbn, title, [], status))
+        books[-1]["authors"].append(author_json(author_id, author_name))
+    return BookJSONResponse({"books": books, "next_cursor": None}).body
+
+
+def best_of(run: Callable[[list[Row]], bytes], rows: list[Row], repeat: int) -> float:
+    """Return the fastest of `repeat` runs, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(rows)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    """Time encoding the same page of books both ways."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = make_rows(Dataset(books=args.books, authors=max(args.books // 10, 1), seed=args.seed))
+    # Same document either way, up to whitespace.
+    pages = TypeAdapter(BookPage)
+    if pages.validate_json(with_models(rows)) != pages.validate_json(with_orjson(rows)):
+        raise RuntimeError("the two encodings disagree")
+
+    for name, run in {"pydantic models": with_models, "dicts + orjson": with_orjson}.items():
+        elapsed = best_of(run, rows, args.repeat)
+        print(f"{name:<16}{args.books:>7} books  {elapsed * 1000:8.1f} ms  {args.books / elapsed:10.0f} books/s")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Build time, peak memory and query latency of the item-to-item similarity and ALS models.
+
+Draws the shelves of benchmarks/synthetic.py (log-normal shelf lengths, a few
+heavy readers and many light ones, Zipf-popular books), then builds the top-K
+model and trains ALS factors from them the way the recommender does.
+
+    PYTHONPATH=src python benchmarks/bench_recommend.py --users 30000 --books 200000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from openbook.recommend.als import train_als
+from openbook.recommend.similarity import build_item_similarity
+from synthetic import Dataset, shelves
+
+
+def interactions(dataset: Dataset) -> tuple[list[str], list[int]]:
+    """Return the (user, book) pairs of the dataset's shelves."""
+    rows = shelves(dataset, np.arange(1, dataset.books + 1), np.random.default_rng(dataset.seed))
+    return [user for user, _, _ in rows], [book for _, book, _ in rows]
+
+
+def main() -> None:
+    """Build both models from the same shelves, then time their queries."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=30_000)
+    parser.add_argument("--books", type=int, default=200_000)
+    parser.add_argument("--shelf-median", type=int, default=20)
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--iterations", type=int, default=15)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    users, books = interactions(
+        Dataset(users=args.users, books=args.books, shelf_median=args.shelf_median, seed=args.seed)
+    )
+    tracemalloc.start()
+    start = time.perf_counter()
+    model = build_item_similarity(users, books, k=args.k)
+    build = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    seeds = books[:50]
+    start = time.perf_counter()
+    for _ in range(100):
+        model.recommend(seeds, exclude=seeds, n=20)
+    query = (time.perf_counter() - start) / 100
+
+    print(f"interactions          {len(users)}")  # noqa: T201
+    print(f"books in model        {model.item_ids.size}")  # noqa: T201
+    print(f"build                 {build:.2f}s")  # noqa: T201
+    print(f"peak memory           {peak / 2**20:.0f} MiB")  # noqa: T201
+    print(f"model size            {(model.neighbors.nbytes + model.scores.nbytes) / 2**20:.1f} MiB")  # noqa: T201
+    print(f"recommend (50 seeds)  {query * 1000:.2f}ms")  # noqa: T201
+
+    start = time.perf_counter()
+    factors = train_als(users, books, factors=args.factors, iterations=args.iterations)
+    train = time.perf_counter() - start
+    start = time.perf_counter()
+    for user in users[:100]:
+        factors.recommend(user, exclude=seeds, n=20)
+    query = (time.perf_counter() - start) / 100
+
+    print(f"ALS train             {train:.2f}s")  # noqa: T201
+    print(f"ALS recommend         {query * 1000:.2f}ms")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
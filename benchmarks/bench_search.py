@@ -0,0 +1,88 @@
+"""
+Cost of deep pages in GET /books/search: OFFSET paging vs. rank-ordered keyset paging.
+
+Builds the synthetic catalog of benchmarks/synthetic.py (300k books by default),
+so the FTS5 tables and triggers match production, then times fetching page N of
+the most common title word with both queries, on the same connection: ranked
+LIMIT/OFFSET, in the same (rank, rowid) order, and the keyset hits query the
+endpoint runs for a next_cursor (Fts5Search.title_query), starting after the
+last hit of page N - 1. Only the queries are timed, not hydrating the books or
+encoding the response, which cost the same either way.
+
+    PYTHONPATH=src python benchmarks/bench_search.py --books 300000 --pages 1 10 100 1000
+"""
+
+import argparse
+import sqlite3
+import statistics
+import tempfile
+import time
+from contextlib import closing
+from pathlib import Path
+
+from openbook.search import Fts5Search
+from synthetic import Dataset, generate
+
+COMMON = Dataset().title_word(0)
+
+OFFSET_QUERY = """\
+select rowid, rank from fts_book
+where fts_book = :title
+order by rank, rowid limit :limit offset :offset
+"""
+# What the endpoint runs for the first page, and for the pages after a cursor.
+FIRST_QUERY = str(Fts5Search().title_query(keyset=False))
+KEYSET_QUERY = str(Fts5Search().title_query(keyset=True))
+
+
+def best(db: sqlite3.Connection, sql: str, params: dict, repeat: int) -> tuple[float, list[tuple]]:
+    """Median seconds to run a query, and its rows."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = db.execute(sql, params).fetchall()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), rows
+
+
+def time_page(db: sqlite3.Connection, page: int, limit: int, repeat: int) -> tuple[float, float]:
+    """Median seconds to fetch page `page` with OFFSET and with the keyset query."""
+    offset, rows = best(db, OFFSET_QUERY, {"title": COMMON, "limit": limit, "offset": (page - 1) * limit}, repeat)
+    if page == 1:
+        keyset, keyset_rows = best(db, FIRST_QUERY, {"title": COMMON, "limit": limit}, repeat)
+    else:
+        # The cursor of page N - 1 is its last hit, looked up without timing it.
+        previous = db.execute(OFFSET_QUERY, {"title": COMMON, "limit": limit, "offset": (page - 2) * limit}).fetchall()
+        after_1, after_0 = previous[-1]
+        params = {"title": COMMON, "limit": limit, "after_0": after_0, "after_1": after_1}
+        keyset, keyset_rows = best(db, KEYSET_QUERY, params, repeat)
+    if keyset_rows != rows:
+        raise RuntimeError(f"page {page}: the two queries disagree")
+    return offset, keyset
+
+
+def main() -> None:
+    """Build the catalog, time both kinds of paging at each depth and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=300_000)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        start = time.perf_counter()
+        generate(path, Dataset(users=1, books=args.books, seed=args.seed))
+        print(f"built catalog of {args.books} books in {time.perf_counter() - start:.1f}s")  # noqa: T201
+
+        print(f"{'page':>6}{'offset ms':>12}{'keyset ms':>12}")  # noqa: T201
+        with closing(sqlite3.connect(path)) as db:
+            for page in args.pages:
+                offset, keyset = time_page(db, page, args.limit, args.repeat)
+                print(f"{page:>6}{offset * 1000:>12.2f}{keyset * 1000:>12.2f}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
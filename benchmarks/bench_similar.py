@@ -0,0 +1,66 @@
+"""
+Latency and recall of the IVF index behind GET /books/{id}/similar vs. brute-force scoring.
+
+Embeds the synthetic catalog of benchmarks/synthetic.py the way the server
+does, builds the index, then compares top-10 queries against scoring every
+book.
+
+    PYTHONPATH=src python benchmarks/bench_similar.py --books 300000 --nprobe 4 8 16
+"""
+
+import argparse
+import time
+
+import numpy as np
+from openbook.recommend.service import build_similar_index, embed_books
+from synthetic import Dataset, catalog
+
+
+def books_by_id(dataset: Dataset) -> dict[int, tuple[str, list[str]]]:
+    """Return the dataset's books as the server loads them, keyed by id in ingest order."""
+    records = catalog(dataset, np.random.default_rng(dataset.seed))
+    return {i: (record.title, record.authors) for i, record in enumerate(records, start=1)}
+
+
+def main() -> None:
+    """Build the index, then time and score queries at each nprobe against brute force."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=300_000)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    books = books_by_id(Dataset(books=args.books, authors=max(args.books // 20, 1), seed=args.seed))
+    start = time.perf_counter()
+    ids, vectors = embed_books(books)
+    embed = time.perf_counter() - start
+    start = time.perf_counter()
+    index = build_similar_index(books)
+    build = time.perf_counter() - start
+    print(f"books {len(ids)}, lists {index.centroids.shape[0]}")  # noqa: T201
+    print(f"embed {embed:.1f}s, build {build:.1f}s")  # noqa: T201
+
+    queries = np.random.default_rng(args.seed).choice(len(ids), size=args.queries, replace=False)
+    start = time.perf_counter()
+    expected = []
+    for q in queries:
+        scores = vectors @ vectors[q]
+        scores[q] = -np.inf
+        expected.append(np.partition(scores, -10)[-10])
+    brute = (time.perf_counter() - start) / args.queries
+    print(f"brute force      {brute * 1000:7.2f}ms")  # noqa: T201
+
+    for nprobe in args.nprobe:
+        index.nprobe = nprobe
+        hits = 0
+        start = time.perf_counter()
+        for q, tenth in zip(queries, expected, strict=True):
+            # Titles tie a lot, so a hit is any result scoring at least the true 10th best.
+            hits += sum(score >= tenth - 1e-6 for _, score in index.similar(ids[q], n=10))
+        elapsed = (time.perf_counter() - start) / args.queries
+        print(f"ivf nprobe={nprobe:<3}  {elapsed * 1000:7.2f}ms  recall@10 {hits / (10 * args.queries):.2f}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
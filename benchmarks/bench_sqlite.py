@@ -0,0 +1,102 @@
+"""
+Read and write throughput of the application engine under different SQLite connection profiles.
+
+Each profile opens a fresh engine on the same file database, holding the
+synthetic catalog of benchmarks/synthetic.py, then concurrent asyncio workers
+run either point reads (a book with its authors) or shelf upserts that commit
+one row each, for a fixed time. "baseline" is the engine
+as it was before the profile existed: WAL only, sqlite3's default statement
+cache and SQLAlchemy's default pool.
+
+    PYTHONPATH=src python benchmarks/bench_sqlite.py --books 100000 --workers 8 --seconds 5
+"""
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from openbook.constants import Settings
+from openbook.database import async_database_url, configure_sqlite, create_database_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from synthetic import Dataset, generate
+
+READ = (
+    "SELECT book.id, book.title, author.name FROM book"
+    " JOIN author_book ON author_book.book_id = book.id JOIN author ON author.id = author_book.author_id"
+    " WHERE book.id = ?"
+)
+# user-0 is the dataset's first user, Dataset().user_id(0).
+WRITE = (
+    "INSERT INTO user_book (user_id, book_id, status) VALUES ('user-0', ?, 'READING')"
+    " ON CONFLICT (user_id, book_id) DO UPDATE SET status = excluded.status"
+)
+
+PROFILES = {
+    "tuned": Settings(),
+    "synchronous=FULL": Settings(sqlite_synchronous="FULL"),
+    "synchronous=OFF": Settings(sqlite_synchronous="OFF"),
+    "no mmap": Settings(sqlite_mmap_size=0),
+    "small cache": Settings(sqlite_cache_size_kib=2000, sqlite_statement_cache_size=128),
+}
+
+
+def baseline_engine(url: str) -> AsyncEngine:
+    """The engine before connection profiles: WAL and nothing else."""
+    engine = create_async_engine(async_database_url(url), connect_args={"check_same_thread": False})
+    configure_sqlite(engine.sync_engine, {"journal_mode": "WAL"})
+    return engine
+
+
+async def run(engine: AsyncEngine, sql: str, books: int, workers: int, seconds: float) -> float:
+    """Run `sql` with random book ids from concurrent workers and return statements per second."""
+    deadline = time.perf_counter() + seconds
+    counts = [0] * workers
+
+    async def worker(n: int) -> None:
+        rng = random.Random(n)
+        while time.perf_counter() < deadline:
+            async with engine.connect() as connection:
+                await connection.exec_driver_sql(sql, (rng.randint(1, books),))
+                await connection.commit()
+            counts[n] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(workers)))
+    return sum(counts) / (time.perf_counter() - start)
+
+
+async def measure(engine: AsyncEngine, args: argparse.Namespace) -> tuple[float, float]:
+    """Return read and write QPS for one engine."""
+    reads = await run(engine, READ, args.books, args.workers, args.seconds)
+    writes = await run(engine, WRITE, args.books, args.workers, args.seconds)
+    await engine.dispose()
+    return reads, writes
+
+
+def main() -> None:
+    """Build the catalog, then measure every profile on it and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        generate(path, Dataset(users=1, books=args.books, seed=args.seed))
+        url = f"sqlite:///{path}"
+        engines = {"baseline": lambda: baseline_engine(url)}
+        for name, config in PROFILES.items():
+            engines[name] = lambda config=config: create_database_engine(url, config)
+        print(f"{'profile':<18}{'read qps':>10}{'write qps':>11}")  # noqa: T201
+        for name, make_engine in engines.items():
+            reads, writes = asyncio.run(measure(make_engine(), args))
+            print(f"{name:<18}{reads:>10.0f}{writes:>11.0f}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
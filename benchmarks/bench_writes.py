@@ -0,0 +1,127 @@
+"""
+Concurrent shelf writes: a connection per request vs. the single writer queue.
+
+N clients POST /books/reading through the real application over an ASGI
+transport, against the synthetic catalog of benchmarks/synthetic.py, with reads
+on the read-only pool. "direct" gives every write its own pooled connection and
+transaction, the way the endpoints used to, so concurrent writers contend for
+SQLite's write lock; "queue" sends them through the WriteQueue, which holds the
+only write connection and commits whatever has queued up together. Both use the
+configured SQLite profile.
+
+    PYTHONPATH=src python benchmarks/bench_writes.py --clients 1 8 32 --requests 2000
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+import httpx
+from openbook.auth import verify_user
+from openbook.database import (
+    WriteQueue,
+    async_database_url,
+    configure_sqlite,
+    create_database_engine,
+    get_db,
+    get_writer,
+    sqlite_connect_args,
+    sqlite_pragmas,
+)
+from openbook.models.orm import User
+from openbook.server import app
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from synthetic import Dataset, clear_shelves, generate
+
+
+class DirectWrites:
+    """Runs each write in its own transaction on a pooled connection, as the endpoints used to."""
+
+    def __init__(self, sessionmaker: async_sessionmaker[AsyncSession]) -> None:
+        self.sessionmaker = sessionmaker
+
+    async def submit(self, write: Callable[[AsyncSession], Awaitable[Any]]) -> Any:
+        """Run a write in a transaction of its own and return its result once it is committed."""
+        async with self.sessionmaker() as session, session.begin():
+            return await write(session)
+
+
+def provide(value: object) -> Callable[[], object]:
+    """A dependency override returning `value`."""
+    return lambda: value
+
+
+async def run(clients: int, requests: int) -> tuple[float, int]:
+    """Issue `requests` posts from `clients` concurrent clients; return the elapsed seconds and failed requests."""
+    failures = 0
+
+    async def client_loop(client: httpx.AsyncClient, book_ids: range) -> None:
+        nonlocal failures
+        for book_id in book_ids:
+            try:
+                response = await client.post("/books/reading", json={"id": book_id})
+                failures += response.status_code != 200
+            except Exception:
+                failures += 1
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, range(n + 1, requests + 1, clients)) for n in range(clients)))
+        return time.perf_counter() - start, failures
+
+
+def main() -> None:
+    """Time both ways of writing at each client count and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        dataset = Dataset(users=1, books=args.requests, seed=args.seed)
+        generate(path, dataset)
+        url = f"sqlite:///{path}"
+        read_engine = create_database_engine(url, read_only=True)
+        # create_database_engine gives a read-write SQLite engine one connection, so build the old pooled one here.
+        pooled = create_async_engine(
+            async_database_url(url), connect_args=sqlite_connect_args(), pool_size=max(args.clients)
+        )
+        configure_sqlite(pooled.sync_engine, sqlite_pragmas())
+        single = create_database_engine(url)
+        read_sessions = async_sessionmaker(bind=read_engine)
+        writers = {
+            "direct": (pooled, DirectWrites(async_sessionmaker(bind=pooled))),
+            "queue": (single, WriteQueue(async_sessionmaker(bind=single))),
+        }
+
+        async def get_bench_db():  # noqa: ANN202
+            async with read_sessions() as db:
+                yield db
+
+        app.dependency_overrides[get_db] = get_bench_db
+        user = User(**dataset.user(0))
+        app.dependency_overrides[verify_user] = lambda: user
+        print(f"{'writes':<8}{'clients':>8}{'writes/s':>10}{'commits':>9}{'failed':>8}")  # noqa: T201
+        commits = Counter()
+        for name, (engine, writer) in writers.items():
+            app.dependency_overrides[get_writer] = provide(writer)
+            event.listen(engine.sync_engine, "commit", lambda _connection, name=name: commits.update([name]))
+            for clients in args.clients:
+                clear_shelves(path)
+                before = commits[name]
+                elapsed, failures = asyncio.run(run(clients, args.requests))
+                rate = args.requests / elapsed
+                print(f"{name:<8}{clients:>8}{rate:>10.0f}{commits[name] - before:>9}{failures:>8}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
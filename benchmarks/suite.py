@@ -0,0 +1,382 @@
+"""
+Latency of the main request paths on a seeded synthetic dataset, as JSON to compare between commits.
+
+The dataset (see benchmarks/synthetic.py) is built once into --db and reused
+while its parameters stay the same; each run works on a copy, so the upsert
+scenarios never change it. Requests go through the whole application,
+middleware included, in process over ASGI, one at a time. Auth is stubbed:
+the user comes from a header instead of a session. The auth scenarios time
+the same request with the stub and with the real dependency (a signed
+session cookie whose token is already verified), so the difference is
+what verify_user costs a logged-in request.
+
+Scenarios:
+    shelf_all, shelf_reading   GET /books, /books/reading for a random user
+    search_title               GET /books/search?title=, a Zipf-drawn word, result cache cleared first
+    search_author              GET /books/search?author=, a Zipf-drawn surname, result cache cleared first
+    search_cached              GET /books/search?title= among a few popular words, result cache kept
+    typeahead_prefix           GET /books/search?mode=typeahead&title= of two Zipf-drawn words, the last cut short
+    typeahead_typo             GET /books/search?mode=typeahead&title= of a Zipf-drawn word with one character changed
+    upsert_reading             POST /books/reading of a Zipf-drawn book for a random user
+    upsert_batch               POST /books/batch of 100 books for a random user
+    auth_stubbed, auth_session GET /books?limit=1 for one user, stubbed and really authenticated
+
+    PYTHONPATH=src python benchmarks/suite.py --output before.json
+    PYTHONPATH=src python benchmarks/suite.py --output after.json --baseline before.json
+"""
+
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import closing
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Annotated
+
+import httpx
+from authlib.jose import JWTClaims
+from fastapi import Header
+from openbook.auth import UserSnapshot, VerifiedToken, optional_user, token_cache, token_digest, verify_user
+from openbook.database import WriteQueue, create_database_engine, get_db, get_writer
+from openbook.models.orm import Book, User
+from openbook.search import search_cache
+from openbook.server import app
+from openbook.sessions import KeyRingSessionMiddleware
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from synthetic import Dataset, add_arguments, dataset_from_arguments, generate, stored_dataset
+
+ROOT = Path(__file__).resolve().parent.parent
+# The session cookie is https-only.
+BASE_URL = "https://bench"
+BATCH_SIZE = 100
+CACHED_QUERIES = 20
+AUTH_USER = 0
+
+
+def bench_user(x_bench_user: Annotated[str, Header()]) -> User:
+    """Stands in for verify_user: the user named by the X-Bench-User header."""
+    return User(id=x_bench_user, email=f"{x_bench_user}@example.com", name=x_bench_user)
+
+
+def optional_bench_user(x_bench_user: Annotated[str | None, Header()] = None) -> User | None:
+    """Stands in for optional_user."""
+    return None if x_bench_user is None else bench_user(x_bench_user)
+
+
+def session_cookie(user: User) -> str:
+    """Return a session cookie for `user`, whose token verify_user will find already verified."""
+    id_token = f"bench-token-{user.id}"
+    snapshot = UserSnapshot(id=user.id, email=user.email, name=user.name)
+    token_cache.set(token_digest(id_token), VerifiedToken(claims=JWTClaims({}, {}), user=snapshot), time.time() + 3600)
+    session = next(middleware for middleware in app.user_middleware if middleware.cls is KeyRingSessionMiddleware)
+    signer = KeyRingSessionMiddleware(app, **session.kwargs).signer
+    data = base64.b64encode(json.dumps({"id_token": id_token}).encode())
+    return f"session={signer.sign(data).decode()}"
+
+
+class Workload:
+    """Draws the users, books and search terms of requests, following the dataset's distributions."""
+
+    def __init__(self, dataset: Dataset, book_ids: list[int], rng: random.Random) -> None:
+        self.dataset = dataset
+        self.book_ids = book_ids
+        self.rng = rng
+        self._popular_books = rng.sample(book_ids, len(book_ids))
+        self._book_weights = zipf_cumulative(len(book_ids), dataset.zipf)
+        self._word_weights = zipf_cumulative(dataset.words, dataset.zipf)
+        self._surname_weights = zipf_cumulative(dataset.surnames, dataset.zipf)
+
+    def user(self) -> dict[str, str]:
+        """Headers for a random user."""
+        return {"x-bench-user": self.dataset.user_id(self.rng.randrange(self.dataset.users))}
+
+    def book(self) -> int:
+        """A book, drawn by popularity."""
+        return self.rng.choices(self._popular_books, cum_weights=self._book_weights)[0]
+
+    def title_word(self) -> str:
+        """A title word, drawn by frequency."""
+        rank = self.rng.choices(range(self.dataset.words), cum_weights=self._word_weights)[0]
+        return self.dataset.title_word(rank)
+
+    def surname(self) -> str:
+        """An author surname, drawn by frequency."""
+        rank = self.rng.choices(range(self.dataset.surnames), cum_weights=self._surname_weights)[0]
+        return self.dataset.surname(rank)
+
+
+def zipf_cumulative(n: int, exponent: float) -> list[float]:
+    """Return the cumulative weights 1 / rank ** exponent for ranks 1..n, as random.choices takes them."""
+    return list(itertools.accumulate(1 / rank**exponent for rank in range(1, n + 1)))
+
+
+MakeRequest = Callable[[httpx.AsyncClient, Workload], Awaitable[httpx.Response]]
+
+
+async def shelf_all(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    """A random user's whole shelf."""
+    return await client.get("/books", headers=workload.user())
+
+
+async def shelf_reading(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    """A random user's reading list."""
+    return await client.get("/books/reading", headers=workload.user())
+
+
+async def search_title(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    """A title search for one word, past the result cache."""
+    search_cache.clear()
+    return await client.get("/books/search", params={"title": workload.title_word()}, headers=workload.user())
+
+
+async def search_author(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    """An author search for one surname, past the result cache."""
+    search_cache.clear()
+    return await client.get("/books/search", params={"author": workload.surname()}, headers=workload.user())
+
+
+async def search_cached(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    """A title search for one of a few popular words, mostly served by the result cache."""
+    word = workload.dataset.title_word(workload.rng.randrange(CACHED_QUERIES))
+    return await client.get("/books/search", params={"title": word}, headers=workload.user())
+
+
+async def typeahead_prefix(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    """A typeahead search for a word and the start of another."""
+    search_cache.clear()
+    first, last = workload.title_word(), workload.title_word()
+    query = f"{first} {last[: workload.rng.randint(2, len(last))]}"
+    return await client.get("/books/search", params={"mode": "typeahead", "title": query}, headers=workload.user())
+
+
+async def typeahead_typo(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    """A typeahead search for a word with one character changed."""
+    search_cache.clear()
+    word = workload.title_word()
+    at = workload.rng.randrange(len(word))
+    query = word[:at] + workload.rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") + word[at + 1 :]
+    return await client.get("/books/search", params={"mode": "typeahead", "title": query}, headers=workload.user())
+
+
+async def upsert_reading(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    """Put a book on a random user's reading list."""
+    return await client.post("/books/reading", json={"id": workload.book()}, headers=workload.user())
+
+
+async def upsert_batch(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    """Put BATCH_SIZE books on a random user's shelf in one request."""
+    updates = [
+        {"id": workload.book(), "status": workload.rng.choice(["reading", "completed"])} for _ in range(BATCH_SIZE)
+    ]
+    return await client.post("/books/batch", json=updates, headers=workload.user())
+
+
+async def auth_stubbed(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    """One book of AUTH_USER's shelf, with the user taken from the header."""
+    headers = {"x-bench-user": workload.dataset.user_id(AUTH_USER)}
+    return await client.get("/books", params={"limit": 1}, headers=headers)
+
+
+async def auth_session(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    """One book of AUTH_USER's shelf, with the user taken from the session cookie the client sends."""
+    return await client.get("/books", params={"limit": 1})
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """A named request to time."""
+
+    name: str
+    request: MakeRequest
+    # Run with the real verify_user and optional_user, and a session cookie.
+    authenticated: bool = False
+
+
+SCENARIOS = [
+    Scenario("shelf_all", shelf_all),
+    Scenario("shelf_reading", shelf_reading),
+    Scenario("search_title", search_title),
+    Scenario("search_author", search_author),
+    Scenario("search_cached", search_cached),
+    Scenario("typeahead_prefix", typeahead_prefix),
+    Scenario("typeahead_typo", typeahead_typo),
+    Scenario("upsert_reading", upsert_reading),
+    Scenario("upsert_batch", upsert_batch),
+    Scenario("auth_stubbed", auth_stubbed),
+    Scenario("auth_session", auth_session, authenticated=True),
+]
+
+
+def summarize(seconds: list[float]) -> dict[str, float]:
+    """Latency statistics in milliseconds, and requests per second."""
+    ms = sorted(s * 1000 for s in seconds)
+    percentiles = statistics.quantiles(ms, n=100, method="inclusive")
+    return {
+        "requests": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(percentiles[49], 3),
+        "p95_ms": round(percentiles[94], 3),
+        "p99_ms": round(percentiles[98], 3),
+        "max_ms": round(ms[-1], 3),
+        "per_second": round(len(ms) / sum(seconds), 1),
+    }
+
+
+async def run_scenario(scenario: Scenario, workload: Workload, requests: int, warmup: int) -> dict[str, float]:
+    """Time `requests` requests, one after the other, after `warmup` untimed ones."""
+    headers = {}
+    if scenario.authenticated:
+        user = bench_user(workload.dataset.user_id(AUTH_USER))
+        headers["cookie"] = session_cookie(user)
+        stubs = {dependency: app.dependency_overrides.pop(dependency) for dependency in (verify_user, optional_user)}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url=BASE_URL, headers=headers) as client:
+            seconds = []
+            for i in range(warmup + requests):
+                start = time.perf_counter()
+                response = await scenario.request(client, workload)
+                elapsed = time.perf_counter() - start
+                if response.status_code != 200:
+                    raise RuntimeError(f"{scenario.name}: {response.status_code} {response.text[:200]}")
+                if i >= warmup:
+                    seconds.append(elapsed)
+    finally:
+        if scenario.authenticated:
+            app.dependency_overrides.update(stubs)
+    return summarize(seconds)
+
+
+def prepare_database(path: Path, dataset: Dataset) -> dict[str, int]:
+    """Generate the dataset at `path` unless it is already there, and return what it holds."""
+    if stored_dataset(path) != dataset:
+        path.unlink(missing_ok=True)
+        generate(path, dataset)
+    with closing(sqlite3.connect(path)) as db:
+        return {
+            "users": dataset.users,
+            "books": db.execute("select count(*) from book").fetchone()[0],
+            "authors": db.execute("select count(*) from author").fetchone()[0],
+            "shelf_rows": db.execute("select count(*) from user_book").fetchone()[0],
+        }
+
+
+async def run_suite(path: Path, dataset: Dataset, scenarios: list[Scenario], requests: int, warmup: int) -> dict:
+    """Run the scenarios against the database at `path`, with the app's own engine settings."""
+    read_engine = create_database_engine(f"sqlite:///{path}", read_only=True)
+    write_engine = create_database_engine(f"sqlite:///{path}")
+    sessions = async_sessionmaker(bind=read_engine, autoflush=False, expire_on_commit=False)
+    bench_writer = WriteQueue(async_sessionmaker(bind=write_engine, autoflush=False, expire_on_commit=False))
+
+    async def get_bench_db():  # noqa: ANN202
+        async with sessions() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = get_bench_db
+    app.dependency_overrides[get_writer] = lambda: bench_writer
+    app.dependency_overrides[verify_user] = bench_user
+    app.dependency_overrides[optional_user] = optional_bench_user
+
+    async with sessions() as db:
+        book_ids = list((await db.scalars(select(Book.id).order_by(Book.id))).all())
+    results = {}
+    for scenario in scenarios:
+        # Each scenario draws the same requests, whichever others run.
+        workload = Workload(dataset, book_ids, random.Random(f"{dataset.seed}:{scenario.name}"))
+        results[scenario.name] = await run_scenario(scenario, workload, requests, warmup)
+        print(f"{scenario.name:<18}" + "  ".join(f"{k} {v}" for k, v in results[scenario.name].items()))  # noqa: T201
+    await read_engine.dispose()
+    await write_engine.dispose()
+    return results
+
+
+def git(*args: str) -> str:
+    """Return the output of a git command on this checkout, or "" if git is missing or fails."""
+    executable = shutil.which("git")
+    if executable is None:
+        return ""
+    try:
+        # Only ever called with the fixed arguments below.
+        run = subprocess.run([executable, *args], cwd=ROOT, capture_output=True, text=True, check=True)  # noqa: S603
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return run.stdout.strip()
+
+
+def compare(baseline: dict, results: dict, threshold: float) -> bool:
+    """Print p50 and p95 against the baseline's; return whether any p50 got more than `threshold` slower."""
+    regressed = False
+    print(f"\n{'scenario':<18}{'base p50':>10}{'p50':>10}{'ratio':>8}{'base p95':>10}{'p95':>10}{'ratio':>8}")  # noqa: T201
+    for name, result in results["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            print(f"{name:<18}{'-':>10}{result['p50_ms']:>10.2f}")  # noqa: T201
+            continue
+        p50, p95 = result["p50_ms"] / base["p50_ms"], result["p95_ms"] / base["p95_ms"]
+        flag = "  slower" if p50 > 1 + threshold else ""
+        regressed |= bool(flag)
+        print(  # noqa: T201
+            f"{name:<18}{base['p50_ms']:>10.2f}{result['p50_ms']:>10.2f}{p50:>8.2f}"
+            f"{base['p95_ms']:>10.2f}{result['p95_ms']:>10.2f}{p95:>8.2f}{flag}"
+        )
+    if baseline["dataset"] != results["dataset"]:
+        print("\nThe baseline was run on a different dataset.")  # noqa: T201
+    return regressed
+
+
+def main() -> None:
+    """Run the scenarios, write the results and compare them with the baseline."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", type=Path, default=Path(tempfile.gettempdir()) / "openbook-bench.db")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--scenarios", nargs="+", choices=[scenario.name for scenario in SCENARIOS])
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path, help="results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="p50 slowdown counted as a regression")
+    add_arguments(parser)
+    args = parser.parse_args()
+    dataset = dataset_from_arguments(args)
+    scenarios = [scenario for scenario in SCENARIOS if args.scenarios is None or scenario.name in args.scenarios]
+
+    contents = prepare_database(args.db, dataset)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        shutil.copyfile(args.db, path)
+        scenario_results = asyncio.run(run_suite(path, dataset, scenarios, args.requests, args.warmup))
+
+    results = {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "created": datetime.now(UTC).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "dataset": asdict(dataset),
+        "contents": contents,
+        "scenarios": scenario_results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    if args.baseline and compare(json.loads(args.baseline.read_text()), results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
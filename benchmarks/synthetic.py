@@ -0,0 +1,213 @@
+"""
+Seeded synthetic data for the benchmark suite: users, books, authors and shelves.
+
+Everything is drawn from Zipf-like distributions, as real catalogs and reading
+habits are: a few title words, author surnames and books are very common and
+most are rare, and a few users have very long shelves while most have short
+ones. The same parameters and seed always give the same database.
+
+The catalog goes in through openbook.ingest, after the real migrations, so
+FTS tables, triggers and indexes match production.
+
+    PYTHONPATH=src python benchmarks/synthetic.py bench.db --users 1000 --books 50000 --authors 5000
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+from collections.abc import Iterable
+from contextlib import closing
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import numpy as np
+from openbook.ingest import Record, ingest
+from sqlalchemy import Engine, create_engine
+
+from alembic import command
+from alembic.config import Config
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Shelf statuses and how often users set them.
+STATUSES = {"COMPLETED": 0.6, "READING": 0.3, "RECOMMENDED": 0.1}
+
+
+@dataclass(frozen=True)
+class Dataset:
+    """Parameters of a synthetic database."""
+
+    users: int = 1_000
+    books: int = 50_000
+    authors: int = 5_000
+    # Distinct title words and author surnames; both are drawn Zipf-distributed.
+    words: int = 20_000
+    surnames: int = 2_000
+    # Median shelf length; lengths are log-normal around it.
+    shelf_median: int = 20
+    # Exponent of the Zipf law over book popularity and words. Around 1 is typical.
+    zipf: float = 1.0
+    seed: int = 0
+
+    def title_word(self, rank: int) -> str:
+        """The title word of the given frequency rank, 0 being the most common."""
+        return f"w{rank}"
+
+    def surname(self, rank: int) -> str:
+        """The author surname of the given frequency rank."""
+        return f"s{rank}"
+
+    def user_id(self, index: int) -> str:
+        """The id of the user with the given index."""
+        return f"user-{index}"
+
+    def user(self, index: int) -> dict[str, str]:
+        """The columns of the user with the given index."""
+        return {"id": self.user_id(index), "email": f"{self.user_id(index)}@example.com", "name": f"User {index}"}
+
+
+def zipf_weights(n: int, exponent: float) -> np.ndarray:
+    """Return normalized weights 1 / rank ** exponent for ranks 1..n."""
+    weights = 1 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def migrated_engine(path: Path) -> Engine:
+    """Return an autocommit engine on a freshly migrated database."""
+    engine = create_engine(f"sqlite:///{path}", isolation_level="AUTOCOMMIT")
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "alembic"))
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+    return engine
+
+
+def catalog(dataset: Dataset, rng: np.random.Generator) -> list[Record]:
+    """Return the books, each with a four to six word title and one to three authors."""
+    firsts = [f"f{i}" for i in range(500)]
+    surnames = rng.choice(dataset.surnames, size=dataset.authors, p=zipf_weights(dataset.surnames, dataset.zipf))
+    authors = [f"{firsts[i % len(firsts)]} {dataset.surname(rank)}" for i, rank in enumerate(surnames)]
+    # Prolific authors: popularity among authors is Zipf-distributed too.
+    author_weights = zipf_weights(dataset.authors, dataset.zipf)
+    word_weights = zipf_weights(dataset.words, dataset.zipf)
+
+    lengths = rng.integers(4, 7, size=dataset.books)
+    words = rng.choice(dataset.words, size=int(lengths.sum()), p=word_weights)
+    counts = rng.integers(1, 4, size=dataset.books)
+    picks = rng.choice(dataset.authors, size=int(counts.sum()), p=author_weights)
+
+    records = []
+    word_at = author_at = 0
+    for i in range(dataset.books):
+        title = " ".join(dataset.title_word(rank) for rank in words[word_at : word_at + lengths[i]])
+        names = list(dict.fromkeys(authors[a] for a in picks[author_at : author_at + counts[i]]))
+        records.append(Record(isbn=f"979{i:010d}", title=title, authors=names))
+        word_at += lengths[i]
+        author_at += counts[i]
+    return records
+
+
+def shelves(dataset: Dataset, book_ids: np.ndarray, rng: np.random.Generator) -> list[tuple[str, int, str]]:
+    """Return (user id, book id, status) rows: log-normal shelf lengths, Zipf-popular books."""
+    # Which books are popular is random, not the ingest order.
+    popularity = rng.permutation(book_ids)
+    weights = zipf_weights(len(popularity), dataset.zipf)
+    lengths = rng.lognormal(np.log(dataset.shelf_median), 1.0, size=dataset.users).astype(int)
+    lengths = np.minimum(lengths, len(book_ids))
+    # All shelves are drawn at once: drawing with weights costs a pass over them per call.
+    books = rng.choice(popularity, size=int(lengths.sum()), p=weights)
+    statuses = rng.choice(list(STATUSES), size=books.size, p=list(STATUSES.values()))
+
+    rows = []
+    start = 0
+    for user, length in enumerate(lengths):
+        # Drawn with replacement; dropping repeats leaves popular books on more shelves.
+        shelf, first = np.unique(books[start : start + length], return_index=True)
+        for book_id, status in zip(shelf, statuses[start + first], strict=True):
+            rows.append((dataset.user_id(user), int(book_id), str(status)))
+        start += length
+    return rows
+
+
+def generate(path: Path, dataset: Dataset) -> dict[str, int]:
+    """Build the database at `path`, which must not exist, and return what it holds."""
+    rng = np.random.default_rng(dataset.seed)
+    engine = migrated_engine(path)
+    stats = ingest(engine, catalog(dataset, rng))
+    with engine.connect() as connection:
+        book_ids = np.array(connection.exec_driver_sql("SELECT id FROM book ORDER BY id").scalars().all())
+        rows = shelves(dataset, book_ids, rng)
+        users = [tuple(dataset.user(i).values()) for i in range(dataset.users)]
+        connection.exec_driver_sql("BEGIN")
+        connection.exec_driver_sql("INSERT INTO user (id, email, name) VALUES (?, ?, ?)", users)
+        connection.exec_driver_sql("INSERT INTO user_book (user_id, book_id, status) VALUES (?, ?, ?)", rows)
+        connection.exec_driver_sql("CREATE TABLE bench_dataset (parameters TEXT NOT NULL)")
+        connection.exec_driver_sql("INSERT INTO bench_dataset VALUES (?)", (json.dumps(asdict(dataset)),))
+        connection.exec_driver_sql("COMMIT")
+        connection.exec_driver_sql("ANALYZE")
+    engine.dispose()
+    return {
+        "users": dataset.users,
+        "books": stats.books,
+        "authors": stats.authors,
+        "shelf_rows": len(rows),
+    }
+
+
+def clear_shelves(path: Path) -> None:
+    """Take every book off every shelf."""
+    with closing(sqlite3.connect(path)) as db, db:
+        db.execute("DELETE FROM user_book")
+
+
+def shelve(path: Path, user_id: str, book_ids: Iterable[int], status: str = "READING") -> None:
+    """Put the books on the user's shelf with the given status."""
+    with closing(sqlite3.connect(path)) as db, db:
+        db.executemany(
+            "INSERT INTO user_book (user_id, book_id, status) VALUES (?, ?, ?)"
+            " ON CONFLICT (user_id, book_id) DO UPDATE SET status = excluded.status",
+            ((user_id, book_id, status) for book_id in book_ids),
+        )
+
+
+def stored_dataset(path: Path) -> Dataset | None:
+    """Return the parameters a database at `path` was generated with, if it is one."""
+    if not path.exists():
+        return None
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        with engine.connect() as connection:
+            parameters = connection.exec_driver_sql("SELECT parameters FROM bench_dataset").scalar()
+    except Exception:
+        return None
+    finally:
+        engine.dispose()
+    return Dataset(**json.loads(parameters))
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add an option for every Dataset parameter."""
+    for name, default in asdict(Dataset()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+
+
+def dataset_from_arguments(args: argparse.Namespace) -> Dataset:
+    """Return the Dataset the options of add_arguments describe."""
+    return Dataset(**{name: getattr(args, name) for name in asdict(Dataset())})
+
+
+def main() -> None:
+    """Build a database with the given parameters and print what it holds."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path)
+    add_arguments(parser)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    contents = generate(args.path, dataset_from_arguments(args))
+    print(json.dumps({**contents, "seconds": round(time.perf_counter() - start, 1)}))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,2 @@
 #!/bin/sh
-python -m alembic upgrade head && python -m fastapi run src/openbook/server.py
+python -m alembic upgrade head && exec python -m gunicorn -c python:openbook.gunicorn_conf
@@ -1,22 +1,23 @@
+import base64
 import datetime
 import hashlib
-import os
-from typing import Annotated
+import json
+from typing import Annotated, NamedTuple
 
 from authlib.integrations.starlette_client import OAuth
 from authlib.jose import JWTClaims, jwt
 from fastapi import Depends, Request
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from openbook.cache import LRUCache
 from openbook.constants import settings
 from openbook.database import get_db
-from openbook.exceptions import UnauthenticatedError
+from openbook.exceptions import ForbiddenError, UnauthenticatedError
+from openbook.jwks import JWKSCache
+from openbook.metrics import AUTH_SECONDS
 from openbook.models.orm import User
 
-session_secret_key = hashlib.sha256(os.urandom(1024)).hexdigest()
-
-
 oauth = OAuth()
 oauth.register(
     name="google",
@@ -26,15 +27,58 @@ oauth.register(
     client_kwargs={"scope": "openid profile email"},
 )
 
+jwks_cache = JWKSCache(discovery_url=settings.oauth_discovery_url)
 
-async def verify_token(id_token: str) -> JWTClaims:
-    """Verify JWT."""
-    jwks = await oauth.google.fetch_jwk_set()  # pyright: ignore [reportOptionalMemberAccess]
+
+class UserSnapshot(NamedTuple):
+    """The user columns needed to serve a request, kept alongside a verified token."""
+
+    id: str
+    email: str
+    name: str
+
+
+class VerifiedToken(NamedTuple):
+    """Claims of a token that passed verification and the user it belongs to."""
+
+    claims: JWTClaims
+    user: UserSnapshot
+
+
+token_cache: LRUCache[bytes, VerifiedToken] = LRUCache(maxsize=settings.token_cache_size)
+
+
+def token_digest(id_token: str) -> bytes:
+    """Cache key for a token, so raw tokens are never kept in memory longer than needed."""
+    return hashlib.sha256(id_token.encode()).digest()
+
+
+def forget_token(id_token: str) -> None:
+    """Drop a token from the verified-token cache, e.g. on logout."""
+    token_cache.pop(token_digest(id_token))
+
+
+def _unverified_kid(id_token: str) -> str | None:
+    """Read the key id from a JWT header without verifying anything."""
     try:
-        decoded_jwt = jwt.decode(s=id_token, key=jwks)
+        header = id_token.split(".", 1)[0]
+        kid = json.loads(base64.urlsafe_b64decode(header + "=" * (-len(header) % 4))).get("kid")
     except Exception:
         raise UnauthenticatedError
-    metadata = await oauth.google.load_server_metadata()  # pyright: ignore [reportOptionalMemberAccess]
+    return kid if isinstance(kid, str) else None
+
+
+async def verify_token(id_token: str) -> JWTClaims:
+    """Verify JWT."""
+    with AUTH_SECONDS.labels("jwks").time():
+        jwks = await jwks_cache.key_set(kid=_unverified_kid(id_token))
+    with AUTH_SECONDS.labels("jwt").time():
+        try:
+            decoded_jwt = jwt.decode(s=id_token, key=jwks)
+        except Exception:
+            raise UnauthenticatedError
+    with AUTH_SECONDS.labels("discovery").time():
+        metadata = await jwks_cache.metadata()
     if decoded_jwt["iss"] != metadata["issuer"]:
         raise UnauthenticatedError
     if decoded_jwt["aud"] != settings.oauth_client_id:
@@ -45,7 +89,7 @@ async def verify_token(id_token: str) -> JWTClaims:
     return decoded_jwt
 
 
-async def verify_user(request: Request, db: Annotated[Session, Depends(get_db)]) -> User:
+async def verify_user(request: Request, db: Annotated[AsyncSession, Depends(get_db)]) -> User:
     """
     Verify that a user is logged in.
 
@@ -58,11 +102,54 @@ async def verify_user(request: Request, db: Annotated[Session, Depends(get_db)])
     id_token = request.session.get("id_token")
     if id_token is None:
         raise UnauthenticatedError
+
+    key = token_digest(id_token)
+    cached = token_cache.get(key)
+    if cached is not None:
+        return User(**cached.user._asdict())
+
     decoded_jwt = await verify_token(id_token=id_token)
     user_id = decoded_jwt["sub"]
 
-    user = db.scalar(select(User).filter(User.id == user_id))
+    user = await db.scalar(select(User).filter(User.id == user_id))
     if user is None:
         raise UnauthenticatedError
 
+    snapshot = UserSnapshot(id=user.id, email=user.email, name=user.name)
+    token_cache.set(key, VerifiedToken(claims=decoded_jwt, user=snapshot), expires_at=decoded_jwt["exp"])
+    return user
+
+
+async def optional_user(request: Request, db: Annotated[AsyncSession, Depends(get_db)]) -> User | None:
+    """
+    Identify the logged-in user, for endpoints that also serve anonymous requests.
+
+    Returns:
+        The User if logged in, else None.
+    """
+    if request.session.get("id_token") is None:
+        return None
+    try:
+        return await verify_user(request, db)
+    except UnauthenticatedError:
+        return None
+
+
+def is_admin(user: User) -> bool:
+    """Whether the user may use admin endpoints, per ADMIN_EMAILS."""
+    return user.email in settings.admin_emails
+
+
+async def verify_admin(user: Annotated[User, Depends(verify_user)]) -> User:
+    """
+    Verify that an administrator is logged in.
+
+    Returns:
+        The User if an administrator
+
+    Raises:
+        UnauthenticatedError if unauthenticated, ForbiddenError if not an administrator.
+    """
+    if not is_admin(user):
+        raise ForbiddenError
     return user
@@ -0,0 +1,144 @@
+"""
+Book metadata cached in each worker, so listings only have to look up book ids.
+
+Books and their authors rarely change once ingested. Shelf listings, search
+and recommendations select just the ids of the books they show and hydrate
+them here, from an LRU of BOOK_CACHE_SIZE compact BookRecord tuples, with one
+IN query for whichever are missing.
+
+The cache is emptied whenever the catalog_version row, bumped by triggers on
+the catalog tables, moves on. Databases that do not keep one (made with
+create_all rather than the migrations) are never cached.
+"""
+
+from typing import NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from openbook.cache import LRUCache
+from openbook.constants import settings
+from openbook.models.orm import Author, AuthorBook, Book, BookStatus, catalog_version
+from openbook.responses import BookJSON, author_json, book_json
+
+
+class BookRecord(NamedTuple):
+    """A book and its authors, as (id, name) pairs."""
+
+    id: int
+    isbn: str
+    title: str
+    authors: tuple[tuple[int, str], ...]
+
+
+class BookCache:
+    """BookRecords by book id, for one catalog version at a time."""
+
+    def __init__(self, maxsize: int) -> None:
+        self._records: LRUCache[int, BookRecord] = LRUCache(maxsize=maxsize)
+        self.version: int | None = None
+
+    def get_many(self, book_ids: list[int], version: int) -> dict[int, BookRecord]:
+        """
+        Return the cached records of the given books, first dropping every record if the version moved on.
+
+        A caller that read an older version than the cache holds, racing a
+        catalog change, gets nothing and bypasses the cache, rather than
+        emptying it for everyone at the newer version.
+        """
+        if self.version is not None and version < self.version:
+            return {}
+        if version != self.version:
+            self._records.clear()
+            self.version = version
+        records = {}
+        for book_id in book_ids:
+            record = self._records.get(book_id)
+            if record is not None:
+                records[book_id] = record
+        return records
+
+    def set_many(self, records: list[BookRecord], version: int) -> None:
+        """Cache records read at `version`, unless another request has seen the catalog move on since."""
+        if version != self.version:
+            return
+        for record in records:
+            self._records.set(record.id, record)
+
+    def clear(self) -> None:
+        """Remove every record."""
+        self._records.clear()
+        self.version = None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+
+book_cache = BookCache(maxsize=settings.book_cache_size)
+
+
+async def current_catalog_version(db: AsyncSession) -> int | None:
+    """
+    Return the catalog version, or None if the database does not keep one.
+
+    Read it before the catalog rows it guards: a change landing in between
+    files newer rows under the older version, which is harmless, never the
+    reverse.
+    """
+    return await db.scalar(select(catalog_version.c.version))
+
+
+async def load_books(db: AsyncSession, book_ids: list[int]) -> dict[int, BookRecord]:
+    """Read the given books and their authors from the database, in one query."""
+    stmt = (
+        select(Book.id, Book.isbn, Book.title, Author.id, Author.name)
+        .outerjoin(AuthorBook, AuthorBook.book_id == Book.id)
+        .outerjoin(Author, Author.id == AuthorBook.author_id)
+        .filter(Book.id.in_(book_ids))
+    )
+    books: dict[int, tuple[str, str, list[tuple[int, str]]]] = {}
+    for book_id, isbn, title, author_id, author_name in await db.execute(stmt):
+        _, _, authors = books.setdefault(book_id, (isbn, title, []))
+        if author_id is not None:
+            authors.append((author_id, author_name))
+    return {
+        book_id: BookRecord(book_id, isbn, title, tuple(authors)) for book_id, (isbn, title, authors) in books.items()
+    }
+
+
+async def book_records(db: AsyncSession, book_ids: list[int], version: int | None) -> dict[int, BookRecord]:
+    """Return the records of the given books, from the cache where it has them at catalog `version`."""
+    if not book_ids:
+        return {}
+    if version is None:
+        return await load_books(db, book_ids)
+    records = book_cache.get_many(book_ids, version)
+    missing = [book_id for book_id in book_ids if book_id not in records]
+    if missing:
+        loaded = await load_books(db, missing)
+        book_cache.set_many(list(loaded.values()), version)
+        records.update(loaded)
+    return records
+
+
+async def hydrate_books(
+    db: AsyncSession, book_ids: list[int], statuses: dict[int, BookStatus], version: int | None
+) -> list[BookJSON]:
+    """
+    Return the given books in the shape of schemas.Book, in order, skipping any that no longer exist.
+
+    Statuses are looked up in `statuses`; books missing from it are UNREAD.
+    `version` is the current_catalog_version, read before the ids were.
+    """
+    records = await book_records(db, book_ids, version)
+    return [
+        book_json(
+            record.id,
+            record.isbn,
+            record.title,
+            [author_json(author_id, name) for author_id, name in record.authors],
+            statuses.get(record.id, BookStatus.UNREAD),
+        )
+        for record in (records.get(book_id) for book_id in book_ids)
+        if record is not None
+    ]
@@ -0,0 +1,148 @@
+"""
+Command line tasks for OpenBook.
+
+    python -m openbook.cli train-als --output models/als
+    python -m openbook.cli build-similar --output models/similar
+    python -m openbook.cli ingest editions.jsonl.gz
+"""
+
+import argparse
+import asyncio
+import gzip
+import logging
+import os
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+from openbook.constants import settings
+from openbook.database import SessionLocal, configure_sqlite, sqlite_pragmas
+from openbook.ingest import DEFAULT_BATCH_SIZE, READERS, ingest
+from openbook.recommend.als import train_als
+from openbook.recommend.service import build_similar_index, load_books, load_interactions
+
+logger = logging.getLogger("openbook.cli")
+
+
+async def _load_interactions() -> tuple[list[str], list[int]]:
+    async with SessionLocal() as db:
+        return await load_interactions(db)
+
+
+async def _load_books() -> dict[int, tuple[str, list[str]]]:
+    async with SessionLocal() as db:
+        return await load_books(db)
+
+
+def train_als_command(args: argparse.Namespace) -> None:
+    """Train ALS factors on the user_book table and write them for the server to memory-map."""
+    users, books = asyncio.run(_load_interactions())
+    logger.info("Training on %d interactions", len(users))
+    start = time.perf_counter()
+    model = train_als(
+        users,
+        books,
+        factors=args.factors,
+        regularization=args.regularization,
+        alpha=args.alpha,
+        iterations=args.iterations,
+    )
+    model.save(args.output)
+    logger.info(
+        "Wrote %d users x %d books to %s in %.1fs",
+        model.user_ids.size,
+        model.item_ids.size,
+        args.output,
+        time.perf_counter() - start,
+    )
+
+
+def build_similar_command(args: argparse.Namespace) -> None:
+    """Build the "books like this one" index over the book table and write it for the server to memory-map."""
+    books = asyncio.run(_load_books())
+    start = time.perf_counter()
+    index = build_similar_index(books)
+    index.save(args.output)
+    logger.info(
+        "Indexed %d books in %d lists to %s in %.1fs",
+        len(index),
+        index.centroids.shape[0],
+        args.output,
+        time.perf_counter() - start,
+    )
+
+
+def ingest_command(args: argparse.Namespace) -> None:
+    """Bulk load books and authors from a JSONL or CSV catalog dump, optionally gzipped."""
+    path = Path(args.path)
+    suffixes = [suffix for suffix in path.suffixes if suffix != ".gz"]
+    fmt = args.format or (suffixes[-1].lstrip(".") if suffixes else "")
+    if fmt not in READERS:
+        raise SystemExit(f"Cannot tell the format of {path}; pass --format {' or '.join(READERS)}.")
+    opener = gzip.open if path.suffix == ".gz" else open
+    engine = create_engine(settings.database_url, isolation_level="AUTOCOMMIT")
+    if engine.dialect.name == "sqlite":
+        # busy_timeout in particular, so a load waits out the server's writes instead of failing.
+        configure_sqlite(engine, sqlite_pragmas())
+    start = time.perf_counter()
+    with opener(path, "rt", encoding="utf-8", newline="") as stream:
+        stats = ingest(engine, READERS[fmt](stream, args.workers), batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "Read %d records: %d new books, %d new authors, %d skipped in %.1fs (%.0f books/s)",
+        stats.read,
+        stats.books,
+        stats.authors,
+        stats.skipped,
+        elapsed,
+        stats.books / elapsed if elapsed else 0.0,
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Entry point."""
+    parser = argparse.ArgumentParser(prog="openbook", description=__doc__)
+    commands = parser.add_subparsers(required=True)
+
+    train = commands.add_parser("train-als", help=train_als_command.__doc__)
+    train.add_argument(
+        "--output",
+        default=settings.recommend_factors_path,
+        required=not settings.recommend_factors_path,
+        help="Directory for the factor files. Defaults to the RECOMMEND_FACTORS_PATH setting.",
+    )
+    train.add_argument("--factors", type=int, default=64)
+    train.add_argument("--regularization", type=float, default=0.1)
+    train.add_argument("--alpha", type=float, default=40.0)
+    train.add_argument("--iterations", type=int, default=15)
+    train.set_defaults(func=train_als_command)
+
+    similar = commands.add_parser("build-similar", help=build_similar_command.__doc__)
+    similar.add_argument(
+        "--output",
+        default=settings.similar_index_path,
+        required=not settings.similar_index_path,
+        help="Directory for the index files. Defaults to the SIMILAR_INDEX_PATH setting.",
+    )
+    similar.set_defaults(func=build_similar_command)
+
+    load = commands.add_parser("ingest", help=ingest_command.__doc__)
+    load.add_argument("path", help="Catalog dump: .jsonl or .csv, optionally .gz.")
+    load.add_argument("--format", choices=list(READERS), help="Input format. Defaults to the file extension.")
+    load.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Books per transaction.")
+    load.add_argument(
+        "--workers",
+        type=int,
+        default=max((os.cpu_count() or 1) - 1, 1),
+        help="Processes parsing JSONL. Defaults to one per CPU besides the one writing.",
+    )
+    load.set_defaults(func=ingest_command)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 
@@ -5,11 +7,58 @@ class Settings(BaseSettings):
     """Settings function."""
 
     database_url: str = "sqlite:///bookclub.db"
+    database_pool_size: int = 10
+    database_max_overflow: int = 10
+
+    # Applied to every new SQLite connection; see benchmarks/bench_sqlite.py.
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size_kib: int = 64 * 1024
+    sqlite_temp_store: Literal["DEFAULT", "FILE", "MEMORY"] = "MEMORY"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_foreign_keys: bool = True
+    sqlite_statement_cache_size: int = 512
+
+    # Production server (openbook.gunicorn_conf). 0 workers means one per CPU.
+    server_bind: str = "0.0.0.0:8000"
+    server_workers: int = 0
+    server_keepalive: int = 5
+    server_timeout: int = 60
+    server_graceful_timeout: int = 30
+    server_max_requests: int = 0
+
+    # Request and SQL instrumentation served on /metrics (openbook.metrics). Statements taking at least
+    # slow_query_ms are logged; 0 turns the log off.
+    metrics_enabled: bool = True
+    slow_query_ms: float = 0
+
+    # Users allowed at admin endpoints, by the email their ID token carries.
+    admin_emails: list[str] = []
+    # Admin-only ?profile=1 and stack sampling (openbook.profiling); sample files go to profile_dir, or a temp dir.
+    profiling_enabled: bool = False
+    profile_dir: str = ""
+
+    # Session cookie signing keys, newest first; older ones are still accepted. A JSON list in the environment.
+    session_secret_keys: list[str] = []
 
     oauth_client_id: str = ""
     oauth_client_secret: str = ""
     oauth_discovery_url: str = ""
 
+    token_cache_size: int = 10_000
+
+    # Per-user shelf version counters behind ETags (8 bytes each), cached search pages, and cached books
+    # (a few hundred bytes each; see openbook.catalog).
+    etag_slots: int = 65_536
+    search_cache_size: int = 10_000
+    book_cache_size: int = 50_000
+
+    recommend_neighbors: int = 50
+    # Seconds between reloads of the recommendation model from the database (see Recommender).
+    recommend_rebuild_interval: float = 600.0
+    recommend_factors_path: str = ""
+    similar_index_path: str = ""
+
     class Config:
         """Environment config."""
 
@@ -1,30 +1,223 @@
-from collections.abc import Generator
+import asyncio
+import contextvars
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from typing import Any, TypeVar
 
-from sqlalchemy import create_engine, event
+from sqlalchemy import Insert, URL, event, make_url
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.engine import Engine
 from sqlalchemy.engine.interfaces import DBAPIConnection
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.pool import ConnectionPoolEntry
 
-from openbook.constants import settings
+from openbook.constants import Settings, settings
+from openbook.metrics import RequestStats, instrument_engine, request_stats
 
-engine = create_engine(settings.database_url, connect_args={"check_same_thread": False})
+# settings.database_url is shared with Alembic, which runs synchronously, so it names
+# the sync driver and the application swaps in the asyncio driver for the same database.
+# psycopg (3) is both, so postgresql+psycopg:// URLs are used as they are.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+psycopg",
+    "postgresql+psycopg2": "postgresql+psycopg",
+}
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# INSERT constructs with ON CONFLICT support, by dialect.
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
 
+T = TypeVar("T")
 
-def get_db() -> Generator[Session, None, None]:
-    """Dependency Function."""
-    db = SessionLocal()
+# A queued write, the future its submitter waits on, and the stats of the request that submitted it.
+QueuedWrite = tuple[Callable[[AsyncSession], Awaitable[Any]], asyncio.Future, RequestStats | None]
+
+
+def async_database_url(database_url: str | URL) -> URL:
+    """Return the URL for the asyncio driver of the given database."""
+    url = make_url(database_url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+def sqlite_pragmas(config: Settings = settings) -> dict[str, str | int]:
+    """Return the pragmas every SQLite connection is opened with, in the order they are set."""
+    return {
+        "journal_mode": "WAL",
+        "synchronous": config.sqlite_synchronous,
+        "busy_timeout": config.sqlite_busy_timeout_ms,
+        "foreign_keys": "ON" if config.sqlite_foreign_keys else "OFF",
+        "temp_store": config.sqlite_temp_store,
+        "mmap_size": config.sqlite_mmap_size,
+        # A negative cache_size is in KiB rather than pages.
+        "cache_size": -config.sqlite_cache_size_kib,
+    }
+
+
+def configure_sqlite(engine: Engine, pragmas: dict[str, str | int]) -> None:
+    """Set the given pragmas on every connection the engine opens."""
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection: DBAPIConnection, _connection_record: ConnectionPoolEntry) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+def sqlite_connect_args(config: Settings = settings) -> dict[str, object]:
+    """Return the sqlite3.connect arguments for the configured profile."""
+    # cached_statements is the size of the per-connection LRU of prepared statements (default 128).
+    return {"check_same_thread": False, "cached_statements": config.sqlite_statement_cache_size}
+
+
+def create_database_engine(
+    database_url: str | URL, config: Settings = settings, *, read_only: bool = False
+) -> AsyncEngine:
+    """
+    Create an engine for the application, applying the SQLite profile from the settings to SQLite databases.
+
+    SQLite allows one writer at a time, so a read-write SQLite engine holds a
+    single connection. A read-only one opens the file with mode=ro and pools
+    as many connections as the settings allow. Other databases get a pool of
+    the configured size either way; on PostgreSQL a read-only engine runs its
+    transactions READ ONLY. Unless metrics are off, statements are counted
+    and timed per request (see openbook.metrics).
+    """
+    url = async_database_url(database_url)
+    if url.get_backend_name() != "sqlite":
+        pool = {"pool_size": config.database_pool_size, "max_overflow": config.database_max_overflow}
+        engine = create_async_engine(url, **pool)
+        if config.metrics_enabled:
+            instrument_engine(engine, config)
+        if read_only and url.get_backend_name() == "postgresql":
+            engine = engine.execution_options(postgresql_readonly=True)
+        return engine
+    pragmas = sqlite_pragmas(config)
+    # In-memory databases get a single shared connection, which takes no pool sizing.
+    if url.database in (None, "", ":memory:"):
+        pool = {}
+    elif read_only:
+        url = url.set(database=f"file:{url.database}", query={**url.query, "mode": "ro", "uri": "true"})
+        pool = {"pool_size": config.database_pool_size, "max_overflow": config.database_max_overflow}
+        # The journal mode is the writer's to set; it is stored in the file.
+        del pragmas["journal_mode"]
+    else:
+        pool = {"pool_size": 1, "max_overflow": 0}
+    engine = create_async_engine(url, connect_args=sqlite_connect_args(config), **pool)
+    configure_sqlite(engine.sync_engine, pragmas)
+    if config.metrics_enabled:
+        instrument_engine(engine, config)
+    return engine
+
+
+def upsert(db: AsyncSession, model: type, values: dict | list[dict], index_elements: list, update: list[str]) -> Insert:
+    """
+    Build an INSERT of `values` into `model` that updates the `update` columns of rows that already exist.
+
+    Existing rows are matched on `index_elements`, which must be covered by a
+    unique index. The statement is built for the dialect `db` is bound to.
+    """
+    stmt = UPSERT_INSERTS[db.get_bind().dialect.name](model).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements, set_={column: stmt.excluded[column] for column in update}
+    )
+
+
+class WriteQueue:
+    """
+    Runs writes one transaction at a time, committing whatever has queued up together.
+
+    A write is an async function taking a session. Writes submitted while a
+    transaction is in progress wait and then share the next one, so under load
+    many requests pay for one commit. If any write in a group fails, the group
+    is rolled back and its writes are retried in a transaction each, so one bad
+    write only fails its own request. Each write runs with its submitter's
+    request stats, so its statements count toward the request that asked for it.
+    """
+
+    def __init__(self, sessionmaker: async_sessionmaker[AsyncSession]) -> None:
+        self.sessionmaker = sessionmaker
+        self._pending: list[QueuedWrite] = []
+        self._drain_task: asyncio.Task | None = None
+
+    async def submit(self, write: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        """Queue a write and return its result once it is committed."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((write, future, request_stats.get()))
+        if self._drain_task is None:
+            # A fresh context, or the task would keep the first submitter's request stats for good.
+            self._drain_task = asyncio.create_task(self._drain(), context=contextvars.Context())
+        return await future
+
+    async def _drain(self) -> None:
+        try:
+            while self._pending:
+                group, self._pending = self._pending, []
+                await self._commit_group(group)
+        finally:
+            # Only reached with writes left over if this task itself was cancelled.
+            for _, future, _ in self._pending:
+                future.cancel()
+            self._pending = []
+            self._drain_task = None
+
+    async def _commit_group(self, group: list[QueuedWrite]) -> None:
+        try:
+            async with self.sessionmaker() as session, session.begin():
+                results = [await _run_write(write, session, stats) for write, _, stats in group]
+        except Exception as exc:
+            if len(group) == 1:
+                _resolve(group[0][1], exception=exc)
+            else:
+                for item in group:
+                    await self._commit_group([item])
+            return
+        except BaseException:
+            for _, future, _ in group:
+                future.cancel()
+            raise
+        for (_, future, _), result in zip(group, results, strict=True):
+            _resolve(future, result)
+
+
+async def _run_write(
+    write: Callable[[AsyncSession], Awaitable[T]], session: AsyncSession, stats: RequestStats | None
+) -> T:
+    token = request_stats.set(stats)
     try:
-        yield db
+        return await write(session)
     finally:
-        db.close()
+        request_stats.reset(token)
+
+
+def _resolve(future: asyncio.Future, result: object = None, exception: Exception | None = None) -> None:
+    # The submitter may have been cancelled while its write was in flight.
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+write_engine = create_database_engine(settings.database_url)
+# Separate read-only connections only make sense for a database file other connections can open.
+read_engine = (
+    write_engine
+    if make_url(settings.database_url).database in (None, "", ":memory:")
+    else create_database_engine(settings.database_url, read_only=True)
+)
+
+SessionLocal = async_sessionmaker(bind=read_engine, autoflush=False, expire_on_commit=False)
+WriteSessionLocal = async_sessionmaker(bind=write_engine, autoflush=False, expire_on_commit=False)
+
+writer = WriteQueue(WriteSessionLocal)
+
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    """Dependency Function, yielding a session on the read-only engine."""
+    async with SessionLocal() as db:
+        yield db
 
 
-@event.listens_for(Engine, "connect")
-def set_sqlite_pragma(dbapi_connection: DBAPIConnection, _connection_record: ConnectionPoolEntry) -> None:
-    """Event to turn on WAL mode for every connection."""
-    cursor = dbapi_connection.cursor()
-    cursor.execute("PRAGMA journal_mode=WAL;")
-    cursor.close()
+def get_writer() -> WriteQueue:
+    """Dependency Function, returning the queue all writes go through."""
+    return writer
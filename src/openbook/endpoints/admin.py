@@ -0,0 +1,53 @@
+import asyncio
+import itertools
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+
+from openbook.auth import verify_admin
+from openbook.constants import settings
+from openbook.profiling import sample_stacks, write_collapsed
+
+router = APIRouter(tags=["admin"], dependencies=[Depends(verify_admin)])
+
+# Seconds between stack samples: often enough for a useful profile in a few seconds,
+# rarely enough that the sampler thread does not slow the worker down by much.
+SAMPLE_INTERVAL = 0.005
+
+# Numbers this worker's sample files, so runs started within the same second do not overwrite each other.
+_sample_numbers = itertools.count(1)
+
+
+class StackSamples(BaseModel):
+    """Where a stack sampling run was written, and how many samples it took."""
+
+    path: str
+    samples: int
+    pid: int
+
+
+@router.post("/admin/profile/sample", include_in_schema=False)
+async def sample_worker(seconds: Annotated[float, Query(gt=0, le=60)] = 10) -> StackSamples:
+    """
+    Sample the stack of this worker's event loop for a while and save the counts for a flame graph.
+
+    The worker keeps serving requests meanwhile; those are what gets sampled.
+    See openbook.profiling.
+
+    Args:
+        seconds: How long to sample. Max is 60.
+    """
+    if not settings.profiling_enabled:
+        raise HTTPException(status_code=404)
+    loop_thread = threading.get_ident()
+    stacks = await asyncio.to_thread(sample_stacks, loop_thread, seconds, SAMPLE_INTERVAL)
+    directory = Path(settings.profile_dir or Path(tempfile.gettempdir()) / "openbook-profiles")
+    path = directory / f"{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}-{next(_sample_numbers)}.collapsed"
+    await asyncio.to_thread(write_collapsed, stacks, path)
+    return StackSamples(path=str(path), samples=sum(stacks.values()), pid=os.getpid())
@@ -1,206 +1,311 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import text
-from sqlalchemy.dialects.sqlite import insert
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
+from sqlalchemy import literal, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from openbook.auth import verify_user
-from openbook.database import get_db
-from openbook.models import orm
-from openbook.models.orm import AuthorBook, Book, BookStatus, User, UserBook
-from openbook.models.schemas import Author as AuthorSchema, Book as BookSchema, BookRequest
+from openbook.auth import optional_user, verify_user
+from openbook.catalog import current_catalog_version, hydrate_books
+from openbook.database import WriteQueue, get_db, get_writer, upsert
+from openbook.etags import check_shelf_etag, shelf_versions
+from openbook.exceptions import BookNotFoundError, InvalidCursorError
+from openbook.models.orm import Book, BookStatus, User, UserBook
+from openbook.models.schemas import BookPage, BookRequest, ShelfUpdate, ShelfUpdateResult
+from openbook.pagination import decode_cursor, encode_cursor
+from openbook.recommend.service import recommender
+from openbook.responses import BookJSONResponse, book_page_response
+from openbook.search import SearchMode, search_backend, search_cache, typeahead
 
 router = APIRouter(tags=["books"])
 
+SHELF_PAGE_LIMIT = 500
 
-@router.get("/books")
+# Most entries accepted by POST /books/batch, and rows per INSERT statement within it.
+# SQLite allows 32766 bound parameters per statement and each row binds three.
+BATCH_LIMIT = 10_000
+BATCH_CHUNK = 1_000
+
+# Columns identifying a user_book row, for upserts.
+SHELF_KEY = [UserBook.user_id, UserBook.book_id]
+
+# Statuses a user can put a book in themselves.
+SHELF_STATUSES = (BookStatus.COMPLETED, BookStatus.READING)
+
+
+async def _user_books(
+    db: AsyncSession,
+    response: Response,
+    user: User,
+    status: BookStatus | None,
+    cursor: str | None,
+    limit: int,
+    version: int | None,
+) -> BookJSONResponse:
+    """
+    Load a page of the books on a user's list, optionally only those with the given status.
+
+    The list is ordered by (status, book_id), which idx_user_book_user_status_book
+    serves directly, so each page is an index range scan starting after the
+    cursor. Only book ids and statuses are read from the list; the books
+    come from openbook.catalog, with at most one more query however long the
+    page is, and go straight into the response (see openbook.responses),
+    which also takes the ETag headers from `response`. `version` is the
+    catalog version check_shelf_etag made the tag from.
+    """
+    limit = min(limit, SHELF_PAGE_LIMIT)
+    page = select(UserBook.book_id, UserBook.status).filter(UserBook.user_id == user.id)
+    if status is not None:
+        page = page.filter(UserBook.status == status)
+    if cursor is not None:
+        after_status, after_book_id = decode_cursor(cursor, str, int)
+        if after_status not in BookStatus.__members__:
+            raise InvalidCursorError
+        after = tuple_(literal(BookStatus[after_status], UserBook.status.type), literal(after_book_id))
+        page = page.filter(tuple_(UserBook.status, UserBook.book_id) > after)
+    # Fetch one extra book to learn whether there is a next page.
+    page = page.order_by(UserBook.status, UserBook.book_id).limit(limit + 1)
+
+    rows = (await db.execute(page)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].status.name, rows[-1].book_id)
+    books = await hydrate_books(db, [book_id for book_id, _ in rows], dict(rows), version)
+    return book_page_response(books, next_cursor, response.headers)
+
+
+async def _shelve_book(db: AsyncSession, writer: WriteQueue, user: User, book_id: int, status: BookStatus) -> None:
+    """
+    Put a book on the user's list with the given status.
+
+    The book is looked up on the read connection first, as in update_books,
+    so an unknown id is a 404 rather than a foreign key failure in the writer.
+    """
+    if await db.scalar(select(Book.id).filter(Book.id == book_id)) is None:
+        raise BookNotFoundError
+    row = {"user_id": user.id, "book_id": book_id, "status": status}
+    await writer.submit(lambda db: db.execute(upsert(db, UserBook, row, SHELF_KEY, ["status"])))
+    shelf_versions.bump(user.id)
+    recommender.publish(user.id, book_id, status)
+
+
+@router.get("/books", response_model=BookPage)
 async def get_books(
-    user: Annotated[User, Depends(verify_user)], db: Annotated[Session, Depends(get_db)]
-) -> list[BookSchema]:
-    """Retrieve the user's book list."""
-    user_books = (
-        db.query(Book)
-        .join(UserBook, Book.id == UserBook.book_id)
-        .join(AuthorBook, AuthorBook.book_id == Book.id)
-        .filter(UserBook.user_id == user.id)
-        .all()
-    )
-    return [
-        BookSchema(
-            id=book.id,
-            isbn=book.isbn,
-            title=book.title,
-            authors=[AuthorSchema(id=author.author_id, name=author.author.name, books=[]) for author in book.author],
-            status=book.user[0].status,
-        )
-        for book in user_books
-    ]
-
-
-@router.get("/books/completed")
+    response: Response,
+    user: Annotated[User, Depends(verify_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    version: Annotated[int | None, Depends(check_shelf_etag)],
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1)] = 100,
+) -> BookJSONResponse:
+    """
+    Retrieve the user's book list.
+
+    Args:
+        cursor: The next_cursor of the previous page, if any.
+        limit: Number of books to return. Max is 500.
+    """
+    return await _user_books(db, response, user, None, cursor, limit, version)
+
+
+@router.get("/books/completed", response_model=BookPage)
 async def get_completed_books(
-    user: Annotated[User, Depends(verify_user)], db: Annotated[Session, Depends(get_db)]
-) -> list[BookSchema]:
+    response: Response,
+    user: Annotated[User, Depends(verify_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    version: Annotated[int | None, Depends(check_shelf_etag)],
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1)] = 100,
+) -> BookJSONResponse:
     """Retrieve the user's completed book list."""
-    user_books = (
-        db.query(Book)
-        .join(UserBook, Book.id == UserBook.book_id)
-        .join(AuthorBook, AuthorBook.book_id == Book.id)
-        .filter(UserBook.user_id == user.id, UserBook.status == BookStatus.COMPLETED)
-    )
-
-    return [
-        BookSchema(
-            id=book.id,
-            isbn=book.isbn,
-            title=book.title,
-            authors=[AuthorSchema(id=author.author_id, name=author.author.name, books=[]) for author in book.author],
-            status=book.user[0].status,
-        )
-        for book in user_books
-    ]
+    return await _user_books(db, response, user, BookStatus.COMPLETED, cursor, limit, version)
 
 
 @router.post("/books/completed")
 async def add_completed_book(
-    book: BookRequest, user: Annotated[User, Depends(verify_user)], db: Annotated[Session, Depends(get_db)]
+    book: BookRequest,
+    user: Annotated[User, Depends(verify_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    writer: Annotated[WriteQueue, Depends(get_writer)],
 ) -> None:
     """Add a book to the user's list of completed books."""
-    stmt = (
-        insert(UserBook)
-        .values(user_id=user.id, book_id=book.id, status=BookStatus.COMPLETED)
-        .on_conflict_do_update(
-            index_elements=[UserBook.user_id, UserBook.book_id], set_={"status": BookStatus.COMPLETED}
-        )
-    )
-    db.execute(stmt)
-    db.commit()
+    await _shelve_book(db, writer, user, book.id, BookStatus.COMPLETED)
 
 
-@router.get("/books/recommended")
+@router.get("/books/recommended", response_model=BookPage)
 async def get_recommended_book(
-    user: Annotated[User, Depends(verify_user)], db: Annotated[Session, Depends(get_db)]
-) -> list[BookSchema]:
+    response: Response,
+    user: Annotated[User, Depends(verify_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    version: Annotated[int | None, Depends(check_shelf_etag)],
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1)] = 100,
+) -> BookJSONResponse:
     """Retrieve the user's completed book list."""
-    user_books = (
-        db.query(Book)
-        .join(UserBook, Book.id == UserBook.book_id)
-        .join(AuthorBook, AuthorBook.book_id == Book.id)
-        .filter(UserBook.user_id == user.id, UserBook.status == BookStatus.RECOMMENDED)
-    )
-
-    return [
-        BookSchema(
-            id=book.id,
-            isbn=book.isbn,
-            title=book.title,
-            authors=[AuthorSchema(id=author.author_id, name=author.author.name, books=[]) for author in book.author],
-            status=book.user[0].status,
-        )
-        for book in user_books
-    ]
+    return await _user_books(db, response, user, BookStatus.RECOMMENDED, cursor, limit, version)
 
 
-@router.get("/books/reading")
+@router.get("/books/reading", response_model=BookPage)
 async def get_reading_book(
-    user: Annotated[User, Depends(verify_user)], db: Annotated[Session, Depends(get_db)]
-) -> list[BookSchema]:
+    response: Response,
+    user: Annotated[User, Depends(verify_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    version: Annotated[int | None, Depends(check_shelf_etag)],
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1)] = 100,
+) -> BookJSONResponse:
     """Retrieve the user's reading book list."""
-    user_books = (
-        db.query(Book)
-        .join(UserBook, Book.id == UserBook.book_id)
-        .join(AuthorBook, AuthorBook.book_id == Book.id)
-        .filter(UserBook.user_id == user.id, UserBook.status == BookStatus.READING)
-    )
-
-    return [
-        BookSchema(
-            id=book.id,
-            isbn=book.isbn,
-            title=book.title,
-            authors=[AuthorSchema(id=author.author_id, name=author.author.name, books=[]) for author in book.author],
-            status=book.user[0].status,
-        )
-        for book in user_books
-    ]
+    return await _user_books(db, response, user, BookStatus.READING, cursor, limit, version)
 
 
 @router.post("/books/reading")
 async def add_reading_book(
-    book: BookRequest, user: Annotated[User, Depends(verify_user)], db: Annotated[Session, Depends(get_db)]
+    book: BookRequest,
+    user: Annotated[User, Depends(verify_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    writer: Annotated[WriteQueue, Depends(get_writer)],
 ) -> None:
     """Add a book to the user's list of reading books."""
-    stmt = (
-        insert(UserBook)
-        .values(user_id=user.id, book_id=book.id, status=BookStatus.READING)
-        .on_conflict_do_update(index_elements=[UserBook.user_id, UserBook.book_id], set_={"status": BookStatus.READING})
-    )
-    db.execute(stmt)
-    db.commit()
+    await _shelve_book(db, writer, user, book.id, BookStatus.READING)
+
+
+@router.post("/books/batch")
+async def update_books(
+    updates: Annotated[list[ShelfUpdate], Body(max_length=BATCH_LIMIT)],
+    user: Annotated[User, Depends(verify_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    writer: Annotated[WriteQueue, Depends(get_writer)],
+) -> list[ShelfUpdateResult]:
+    """
+    Put many books on the user's reading or completed lists at once.
+
+    All valid entries are written in one transaction, as multi-row upserts.
+    The existence checks run on a read connection, before the write is queued.
+    Entries for unknown books or other statuses are skipped; if a book appears
+    more than once, the last entry wins.
+
+    Returns:
+        One result per entry, in order.
+    """
+    ids = list({update.id for update in updates})
+    existing = set()
+    for start in range(0, len(ids), BATCH_CHUNK):
+        chunk = ids[start : start + BATCH_CHUNK]
+        existing.update((await db.scalars(select(Book.id).filter(Book.id.in_(chunk)))).all())
 
+    results = [ShelfUpdateResult(id=update.id, status=update.status, ok=True) for update in updates]
+    latest: dict[int, BookStatus] = {}
+    for result in results:
+        if result.status not in SHELF_STATUSES:
+            result.ok, result.detail = False, "Only reading and completed can be set."
+        elif result.id not in existing:
+            result.ok, result.detail = False, "Book not found."
+        else:
+            latest[result.id] = result.status
+    for result in results:
+        if result.ok and latest[result.id] != result.status:
+            result.ok, result.detail = False, "Superseded by a later entry for the same book."
 
-@router.get("/books/search")
+    rows = [{"user_id": user.id, "book_id": book_id, "status": status} for book_id, status in latest.items()]
+
+    async def write(db: AsyncSession) -> None:
+        for start in range(0, len(rows), BATCH_CHUNK):
+            await db.execute(upsert(db, UserBook, rows[start : start + BATCH_CHUNK], SHELF_KEY, ["status"]))
+
+    if rows:
+        await writer.submit(write)
+        shelf_versions.bump(user.id)
+
+    for book_id, status in latest.items():
+        recommender.publish(user.id, book_id, status)
+    return results
+
+
+@router.get("/books/search", response_model=BookPage)
 async def search_books(
-    session: Annotated[Session, Depends(get_db)],
+    session: Annotated[AsyncSession, Depends(get_db)],
+    user: Annotated[User | None, Depends(optional_user)],
     author: str | None = None,
     title: str | None = None,
-    skip: int = 0,
+    cursor: str | None = None,
     limit: int = 10,
-) -> list[BookSchema]:
+    mode: SearchMode = SearchMode.EXACT,
+) -> BookJSONResponse:
     """
     Search the database for books by title or author.
 
-    Only one of title, author may be provided.
+    Only one of title, author may be provided. Result pages are cached until
+    the catalog next changes; shelf status is looked up on every request.
 
     Args:
         author: Search by book author.
         title: Search by book title.
-        skip: Number of books to skip in the results.
+        cursor: The next_cursor of the previous page, if any.
         limit: Number of books to return. Max is 100.
+        mode: exact matches whole words and pages through every match;
+            typeahead also matches word prefixes and misspellings, for
+            partial input, and returns a single page (see openbook.search).
 
     Returns:
-        A list of books that match the query, sorted in descending order by
-        relevance.
+        A page of books that match the query, each once with all its authors,
+        sorted in descending order by relevance (ascending rank, see
+        openbook.search). Statuses are the logged-in user's; anonymous
+        requests see every book as unread.
 
     Raises:
-        If author and title are given, or neither author nor title are given.
+        If author and title are given, or neither author nor title are given,
+        or a type-ahead search is given a cursor.
     """
-    limit = min(limit, 100)
+    limit = max(1, min(limit, 100))
 
-    if author and title:
+    if (author and title) or not (author or title):
         raise HTTPException(status_code=400)
-
-    if title:
-        stmt = text("""\
-select fts_book.id, isbn, title, status, author.id, author.name from fts_book
-left join user_book on user_book.book_id = fts_book.id
-left join user on user_book.user_id = user.id
-join author_book on author_book.book_id = fts_book.id
-join author on author_book.author_id = author.id
-where fts_book = :title limit :limit offset :skip
-""")
-        params = dict(title=title, limit=limit, skip=skip)
-    elif author:
-        stmt = text("""\
-select book.id, isbn, title, status, fts_author.id, fts_author.name from fts_author
-join author_book on author_book.author_id = fts_author.id
-join book on book.id = author_book.book_id
-left join user_book on user_book.book_id = book.id
-where fts_author = :author limit :limit offset :skip
-""")
-        params = dict(author=author, limit=limit, skip=skip)
-    else:
+    if mode is SearchMode.TYPEAHEAD and cursor is not None:
         raise HTTPException(status_code=400)
 
-    results = session.execute(stmt, params=params)
-    return [
-        BookSchema(
-            id=r[0],
-            isbn=r[1],
-            title=r[2],
-            authors=[AuthorSchema(id=r[4], name=r[5], books=[])],
-            status=orm.BookStatus.UNREAD if r[3] is None else r[3],
-        )
-        for r in results
-    ]
+    field, query = ("title", title) if title else ("author", author)
+    # FTS5 operators are case sensitive, so only whitespace is normalized.
+    query = " ".join(query.split())
+    version = await current_catalog_version(session)
+    cache_key = (mode, field, query, cursor, limit, version)
+    page = search_cache.get(cache_key) if version is not None else None
+    if page is None:
+        if mode is SearchMode.TYPEAHEAD:
+            page = await typeahead(session, field, query, limit, version), None
+        else:
+            page = await _search(session, field, query, cursor, limit)
+        if version is not None:
+            search_cache.set(cache_key, page)
+    book_ids, next_cursor = page
+    statuses = await _shelf_statuses(session, user, book_ids) if user is not None else {}
+    return book_page_response(await hydrate_books(session, book_ids, statuses, version), next_cursor)
+
+
+async def _search(
+    db: AsyncSession, field: str, query: str, cursor: str | None, limit: int
+) -> tuple[list[int], str | None]:
+    """Run a title or author search, returning the book ids of one page of results and its cursor."""
+    backend = search_backend(db)
+    stmt = backend.title_query(keyset=bool(cursor)) if field == "title" else backend.author_query(keyset=bool(cursor))
+    params: dict = {field: query}
+    if cursor:
+        params["after_0"], params["after_1"] = decode_cursor(cursor, float, int)
+    # One extra hit tells us whether there is a next page.
+    params["limit"] = limit + 1
+
+    rows = (await db.execute(stmt, params=params)).all()
+    book_ids = [book_id for book_id, _ in rows]
+    if len(rows) > limit:
+        book_id, rank = rows[limit - 1]
+        return book_ids[:limit], encode_cursor(rank, book_id)
+    return book_ids, None
+
+
+async def _shelf_statuses(db: AsyncSession, user: User, book_ids: list[int]) -> dict[int, BookStatus]:
+    """Return the user's status for those of the books that are on their lists."""
+    if not book_ids:
+        return {}
+    rows = await db.execute(
+        select(UserBook.book_id, UserBook.status).filter(UserBook.user_id == user.id, UserBook.book_id.in_(book_ids))
+    )
+    return dict(rows.all())
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, HTTPException, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from openbook.constants import settings
+from openbook.metrics import metrics_registry
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """Serve the metrics of every worker in Prometheus text format."""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404)
+    return Response(generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,75 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from openbook.auth import verify_user
+from openbook.catalog import current_catalog_version, hydrate_books
+from openbook.database import get_db
+from openbook.exceptions import BookNotFoundError
+from openbook.models.orm import User, UserBook
+from openbook.models.schemas import Book as BookSchema
+from openbook.recommend.service import POSITIVE_STATUSES, recommender, similar_books
+from openbook.responses import BookJSONResponse
+
+router = APIRouter(tags=["recommendations"])
+
+
+@router.get("/recommendations", response_model=list[BookSchema])
+async def get_recommendations(
+    user: Annotated[User, Depends(verify_user)], db: Annotated[AsyncSession, Depends(get_db)], limit: int = 20
+) -> BookJSONResponse:
+    """
+    Recommend books similar to the ones the user is reading or has completed.
+
+    Args:
+        limit: Number of books to return. Max is 100.
+
+    Returns:
+        Books not yet on the user's list, most relevant first.
+    """
+    limit = max(1, min(limit, 100))
+    version = await current_catalog_version(db)
+    shelf = (await db.execute(select(UserBook.book_id, UserBook.status).filter(UserBook.user_id == user.id))).all()
+    exclude = [book_id for book_id, _ in shelf]
+
+    # Users the factors were trained on get ALS; everyone else, including users
+    # who joined since, falls back to the neighbour model which is always current.
+    factors = recommender.factors()
+    ranked = factors.recommend(user.id, exclude=exclude, n=limit) if factors is not None else []
+    if not ranked:
+        model = await recommender.get_model(db)
+        seeds = [book_id for book_id, status in shelf if status in POSITIVE_STATUSES]
+        ranked = model.recommend(seeds, exclude=exclude, n=limit)
+    return BookJSONResponse(await hydrate_books(db, [book_id for book_id, _ in ranked], {}, version))
+
+
+@router.get("/books/{book_id}/similar", response_model=list[BookSchema])
+async def get_similar_books(
+    book_id: int,
+    user: Annotated[User, Depends(verify_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    limit: int = 10,
+) -> BookJSONResponse:
+    """
+    Find books like the given one, by title words and authors.
+
+    Args:
+        limit: Number of books to return. Max is 100.
+
+    Returns:
+        The most similar books, best first, with the user's status for each.
+    """
+    limit = max(1, min(limit, 100))
+    version = await current_catalog_version(db)
+    index = await similar_books.get_index(db)
+    try:
+        ranked = index.similar(book_id, n=limit)
+    except KeyError:
+        raise BookNotFoundError
+    book_ids = [similar_id for similar_id, _ in ranked]
+    shelf = await db.execute(
+        select(UserBook.book_id, UserBook.status).filter(UserBook.user_id == user.id, UserBook.book_id.in_(book_ids))
+    )
+    return BookJSONResponse(await hydrate_books(db, book_ids, dict(shelf.all()), version))
@@ -4,11 +4,11 @@ from authlib.integrations.starlette_client import OAuthError
 from fastapi import APIRouter, Depends
 from fastapi.responses import RedirectResponse
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 
-from openbook.auth import oauth, verify_user
-from openbook.database import get_db
+from openbook.auth import forget_token, oauth, verify_user
+from openbook.database import WriteQueue, get_writer
 from openbook.exceptions import UnauthenticatedError
 from openbook.models.orm import User
 
@@ -23,7 +23,7 @@ async def login(request: Request) -> RedirectResponse:
 
 
 @router.get("/auth")
-async def auth(request: Request, db: Annotated[Session, Depends(get_db)]) -> RedirectResponse:
+async def auth(request: Request, writer: Annotated[WriteQueue, Depends(get_writer)]) -> RedirectResponse:
     """OAuth Redirect URL."""
     try:
         token = await oauth.google.authorize_access_token(request)  # pyright: ignore [reportOptionalMemberAccess]
@@ -41,13 +41,15 @@ async def auth(request: Request, db: Annotated[Session, Depends(get_db)]) -> Red
     name = user_dict["name"]
     email = user_dict["email"]
 
-    with db.begin():
-        user = db.scalar(select(User).filter(User.id == id))
+    async def add_user(db: AsyncSession) -> None:
+        user = await db.scalar(select(User).filter(User.id == id))
 
         if user is None:
             user = User(id=id, name=name, email=email)
             db.add(user)
 
+    await writer.submit(add_user)
+
     request.session["id_token"] = token.get("id_token")
     return RedirectResponse(url="/home")
 
@@ -55,7 +57,7 @@ async def auth(request: Request, db: Annotated[Session, Depends(get_db)]) -> Red
 @router.get("/logout")
 async def logout(request: Request, user: Annotated[User, Depends(verify_user)]) -> RedirectResponse:
     """Log out the current user."""
-    request.session.pop("id_token")
+    forget_token(request.session.pop("id_token"))
     return RedirectResponse(url="/home")
 
 
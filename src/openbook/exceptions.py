@@ -6,3 +6,33 @@ class UnauthenticatedError(HTTPException):
 
     def __init__(self) -> None:
         super().__init__(status_code=401, detail="You are not authenticated.")
+
+
+class ForbiddenError(HTTPException):
+    """Raised when an authenticated user attempts to access an endpoint reserved for administrators."""
+
+    def __init__(self) -> None:
+        super().__init__(status_code=403, detail="Administrators only.")
+
+
+class InvalidCursorError(HTTPException):
+    """Raised when a pagination cursor cannot be decoded."""
+
+    def __init__(self) -> None:
+        super().__init__(status_code=400, detail="Invalid cursor.")
+
+
+class BookNotFoundError(HTTPException):
+    """Raised when a book referenced in the path does not exist."""
+
+    def __init__(self) -> None:
+        super().__init__(status_code=404, detail="Book not found.")
+
+
+class NotModifiedError(HTTPException):
+    """Raised to answer a conditional request whose If-None-Match matches the current ETag."""
+
+    def __init__(self, etag: str) -> None:
+        super().__init__(
+            status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Cookie"}
+        )
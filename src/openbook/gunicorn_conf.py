@@ -0,0 +1,65 @@
+"""
+Gunicorn settings for running the API in production with uvicorn workers.
+
+    gunicorn -c python:openbook.gunicorn_conf
+
+The app is imported, and its recommendation model and indexes built, once in
+the master before it forks the workers, which then share them copy-on-write.
+Workers, keep-alive and timeouts come from Settings (SERVER_* in the
+environment). Send the master HUP to replace the workers gracefully with the
+same code, or USR2 and then QUIT to the old master to start a new master on
+new code without dropping connections (not when the master is a container's
+PID 1).
+"""
+
+import asyncio
+import gc
+import os
+import shutil
+import tempfile
+
+from gunicorn.arbiter import Arbiter
+
+from openbook.constants import settings
+
+# Where workers keep their metrics for /metrics to add up (see openbook.metrics). It has
+# to be set before prometheus_client is imported, which preloading the app does.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "openbook-metrics"))
+
+wsgi_app = "openbook.server:app"
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+bind = settings.server_bind
+workers = settings.server_workers or os.cpu_count() or 1
+keepalive = settings.server_keepalive
+timeout = settings.server_timeout
+graceful_timeout = settings.server_graceful_timeout
+max_requests = settings.server_max_requests
+max_requests_jitter = settings.server_max_requests // 10
+
+
+async def _warm_up() -> None:
+    from openbook.database import read_engine, write_engine
+    from openbook.server import warm_up
+
+    await warm_up()
+    # Connections must not be shared across the fork; each worker opens its own.
+    await read_engine.dispose()
+    await write_engine.dispose()
+
+
+def on_starting(server: Arbiter) -> None:
+    """Start from empty metrics; files left by a previous master would be added in."""
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def when_ready(server: Arbiter) -> None:
+    """Warm up in the master, after the app is loaded and before the first fork."""
+    server.log.info("Warming up")
+    asyncio.run(_warm_up())
+    # Moves everything allocated so far out of the collector's reach, so collections
+    # in the workers do not write to, and so copy, the pages shared with the master.
+    gc.freeze()
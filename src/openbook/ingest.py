@@ -0,0 +1,265 @@
+"""
+Bulk loading of catalog dumps into the book, author and author_book tables.
+
+Rows are written with executemany in large transactions on a plain sync
+connection, bypassing the ORM. Maintaining the FTS5 tables and secondary
+indexes row by row is what makes naive inserts slow, so for the duration of
+the load the triggers and non-unique indexes on the loaded tables are
+dropped, then the FTS5 tables are rebuilt and the indexes recreated in one
+pass each. The dropped definitions are kept in the suspended_schema table,
+so a load that dies midway is repaired by the next one.
+"""
+
+import csv
+import json
+import logging
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, IO, NamedTuple
+
+from sqlalchemy import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# Books written per transaction.
+DEFAULT_BATCH_SIZE = 50_000
+
+# Lines handed to a parser process at a time.
+PARSE_CHUNK = 10_000
+
+# Chunks queued per parser process, bounding how far ahead of the loader the dump is read.
+CHUNKS_PER_WORKER = 2
+
+# Page cache for the loading connection, in KiB, so index pages stay resident across a batch.
+LOAD_CACHE_KIB = 256 * 1024
+
+# Tables whose triggers and indexes are suspended during a load.
+LOADED_TABLES = ("book", "author", "author_book")
+
+
+class Record(NamedTuple):
+    """One edition from a catalog dump, normalized by the reader."""
+
+    isbn: str
+    title: str
+    authors: list[str]
+
+
+@dataclass
+class IngestStats:
+    """Counts reported by `ingest`."""
+
+    read: int = 0
+    books: int = 0
+    authors: int = 0
+    skipped: int = 0
+
+
+def normalize_isbn(isbn: str) -> str:
+    """Strip separators from an ISBN so the same edition always gets the same key."""
+    if isbn.isalnum():
+        return isbn.upper()
+    return "".join(c for c in isbn if c.isalnum()).upper()
+
+
+def normalize_name(name: str) -> str:
+    """Collapse whitespace in a name."""
+    return " ".join(name.split())
+
+
+def _record(isbn: str, title: str, authors: Iterable[str]) -> Record:
+    return Record(normalize_isbn(isbn), title.strip(), [name for name in map(normalize_name, authors) if name])
+
+
+def _author_name(author: Any) -> str:
+    return author.get("name", "") if isinstance(author, dict) else str(author)
+
+
+def parse_jsonl(lines: list[str]) -> list[Record]:
+    """
+    Parse OpenLibrary-style editions, one JSON object per line.
+
+    The ISBN is taken from `isbn`, or the first of `isbn_13` / `isbn_10`.
+    `authors` is a list of names or of objects with a `name`.
+    """
+    records = []
+    for line in lines:
+        if not line.strip():
+            continue
+        edition = json.loads(line)
+        isbn = edition.get("isbn") or next(iter(edition.get("isbn_13") or edition.get("isbn_10") or []), "")
+        authors = [_author_name(author) for author in edition.get("authors") or []]
+        records.append(_record(isbn, edition.get("title") or "", authors))
+    return records
+
+
+def read_jsonl(stream: IO[str], workers: int = 1) -> Iterator[Record]:
+    """Read a JSONL dump, parsing chunks of lines in `workers` processes if more than one."""
+    chunks = iter(lambda: list(islice(stream, PARSE_CHUNK)), [])
+    if workers <= 1:
+        for chunk in chunks:
+            yield from parse_jsonl(chunk)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        # Executor.map would submit every chunk at once, reading the whole dump into memory first.
+        pending = deque(pool.submit(parse_jsonl, chunk) for chunk in islice(chunks, CHUNKS_PER_WORKER * workers))
+        while pending:
+            records = pending.popleft().result()
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending.append(pool.submit(parse_jsonl, chunk))
+            yield from records
+
+
+def read_csv(stream: IO[str], workers: int = 1) -> Iterator[Record]:
+    """
+    Read a CSV with isbn, title and authors columns; multiple authors are separated by semicolons.
+
+    Quoted fields may span lines, so the file is always parsed in this process.
+    """
+    for row in csv.DictReader(stream):
+        yield _record(row.get("isbn") or "", row.get("title") or "", (row.get("authors") or "").split(";"))
+
+
+READERS: dict[str, Callable[[IO[str], int], Iterator[Record]]] = {"jsonl": read_jsonl, "csv": read_csv}
+
+
+class CatalogLoader:
+    """
+    Dedupes records against each other and the database and writes them in batches.
+
+    Books are deduped by ISBN and authors by case-folded name. Every ISBN and
+    author name already in the database or seen in the input is kept in
+    memory; records are streamed one batch at a time.
+    """
+
+    def __init__(self, connection: Connection) -> None:
+        self.connection = connection
+        self.isbns: set[str] = set(connection.exec_driver_sql("SELECT isbn FROM book").scalars().all())
+        authors = connection.exec_driver_sql("SELECT id, name FROM author").all()
+        self.authors: dict[str, int] = {name.casefold(): author_id for author_id, name in authors}
+        self.stats = IngestStats()
+
+    def load(self, records: Iterable[Record], batch_size: int = DEFAULT_BATCH_SIZE) -> IngestStats:
+        """Write every new record, committing once per batch."""
+        records = iter(records)
+        while batch := list(islice(records, batch_size)):
+            self.stats.read += len(batch)
+            self._write(batch)
+            logger.info("Loaded %d books, %d authors", self.stats.books, self.stats.authors)
+        return self.stats
+
+    def _write(self, batch: list[Record]) -> None:
+        # Ids are assigned here rather than by the database so author_book rows
+        # can be built without reading anything back. BEGIN IMMEDIATE takes the
+        # write lock before max(id) is read, so no other writer can take them.
+        self.connection.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            max_book = self.connection.exec_driver_sql("SELECT coalesce(max(id), 0) FROM book").scalar_one()
+            max_author = self.connection.exec_driver_sql("SELECT coalesce(max(id), 0) FROM author").scalar_one()
+            next_book, next_author = max_book + 1, max_author + 1
+            isbns, known_authors = self.isbns, self.authors
+            books, authors, links = [], [], []
+            for isbn, title, names in batch:
+                if not isbn or not title or isbn in isbns:
+                    self.stats.skipped += 1
+                    continue
+                isbns.add(isbn)
+                book_id, next_book = next_book, next_book + 1
+                books.append((book_id, isbn, title))
+                linked = set()
+                for name in names:
+                    key = name.casefold()
+                    author_id = known_authors.get(key)
+                    if author_id is None:
+                        author_id, next_author = next_author, next_author + 1
+                        known_authors[key] = author_id
+                        authors.append((author_id, name))
+                    if author_id not in linked:
+                        linked.add(author_id)
+                        links.append((book_id, author_id))
+
+            _executemany(self.connection, "INSERT INTO author (id, name) VALUES (?, ?)", authors)
+            _executemany(self.connection, "INSERT INTO book (id, isbn, title) VALUES (?, ?, ?)", books)
+            _executemany(self.connection, "INSERT INTO author_book (book_id, author_id) VALUES (?, ?)", links)
+            self.connection.exec_driver_sql("COMMIT")
+        except BaseException:
+            self.connection.exec_driver_sql("ROLLBACK")
+            raise
+        self.stats.books += len(books)
+        self.stats.authors += len(authors)
+
+
+def _executemany(connection: Connection, sql: str, rows: list[tuple]) -> None:
+    # An empty parameter list would run the statement once without parameters.
+    if rows:
+        connection.exec_driver_sql(sql, rows)
+
+
+def suspend_schema(connection: Connection, tables: Iterable[str]) -> None:
+    """Drop the triggers and non-unique indexes on the given tables, saving their definitions in suspended_schema."""
+    tables = list(tables)
+    placeholders = ", ".join("?" * len(tables))
+    # Indexes backing UNIQUE and PRIMARY KEY constraints have no sql and stay.
+    rows = connection.exec_driver_sql(
+        "SELECT type, name, sql FROM sqlite_master"  # noqa: S608
+        f" WHERE type IN ('trigger', 'index') AND sql IS NOT NULL AND tbl_name IN ({placeholders})",
+        tuple(tables),
+    ).all()
+    saved = [tuple(r) for r in rows]
+    _executemany(connection, "INSERT INTO suspended_schema (type, name, sql) VALUES (?, ?, ?)", saved)
+    for kind, name, _ in rows:
+        connection.exec_driver_sql(f'DROP {kind.upper()} "{name}"')
+
+
+def restore_schema(connection: Connection) -> None:
+    """
+    Recreate what suspend_schema dropped, first rebuilding the FTS5 tables the triggers kept in sync.
+
+    The catalog version is bumped once for the whole load, in place of the
+    triggers that would have bumped it on every row.
+    """
+    definitions = connection.exec_driver_sql("SELECT sql FROM suspended_schema").scalars().all()
+    if not definitions:
+        return
+    rebuild_fts(connection)
+    for sql in definitions:
+        connection.exec_driver_sql(sql)
+    connection.exec_driver_sql("DELETE FROM suspended_schema")
+    connection.exec_driver_sql("UPDATE catalog_version SET version = version + 1")
+
+
+def rebuild_fts(connection: Connection) -> None:
+    """Rebuild every FTS5 table from its content table."""
+    tables = connection.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE 'CREATE VIRTUAL TABLE%USING fts5%'"
+    ).scalars()
+    for table in tables.all():
+        # The table names come from sqlite_master, not from input.
+        connection.exec_driver_sql(f'INSERT INTO "{table}"("{table}") VALUES (\'rebuild\')')  # noqa: S608
+
+
+def ingest(engine: Engine, records: Iterable[Record], batch_size: int = DEFAULT_BATCH_SIZE) -> IngestStats:
+    """
+    Load records into the catalog.
+
+    The engine must be in autocommit mode, since transactions are managed
+    explicitly with BEGIN IMMEDIATE / COMMIT.
+    """
+    if engine.dialect.name != "sqlite":
+        raise ValueError(f"Bulk ingestion is only supported on SQLite, not {engine.dialect.name}.")
+    with engine.connect() as connection:
+        connection.exec_driver_sql(f"PRAGMA cache_size = -{LOAD_CACHE_KIB}")
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        restore_schema(connection)
+        suspend_schema(connection, LOADED_TABLES)
+        connection.exec_driver_sql("COMMIT")
+        try:
+            return CatalogLoader(connection).load(records, batch_size)
+        finally:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            restore_schema(connection)
+            connection.exec_driver_sql("COMMIT")
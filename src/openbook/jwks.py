@@ -0,0 +1,175 @@
+import asyncio
+import contextlib
+import re
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+from authlib.jose import JsonWebKey, KeySet
+
+_MAX_AGE_RE = re.compile(r"(?:^|,)\s*(?:s-)?max-age\s*=\s*\"?(\d+)\"?", re.IGNORECASE)
+_NO_CACHE_RE = re.compile(r"(?:^|,)\s*(?:no-cache|no-store)\b", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class FetchResult:
+    """A JSON document fetched from the identity provider."""
+
+    data: dict[str, Any]
+    max_age: float | None = None
+
+
+Fetcher = Callable[[str], Awaitable[FetchResult]]
+
+
+def parse_max_age(cache_control: str | None) -> float | None:
+    """
+    Extract the freshness lifetime from a Cache-Control header.
+
+    Returns:
+        The max-age in seconds, 0 for no-cache/no-store, or None if the header
+        does not say.
+    """
+    if not cache_control:
+        return None
+    if _NO_CACHE_RE.search(cache_control):
+        return 0.0
+    match = _MAX_AGE_RE.search(cache_control)
+    if match is None:
+        return None
+    return float(match.group(1))
+
+
+async def httpx_fetcher(url: str) -> FetchResult:
+    """Fetch a JSON document over HTTPS."""
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        response = await client.get(url)
+        response.raise_for_status()
+    return FetchResult(data=response.json(), max_age=parse_max_age(response.headers.get("cache-control")))
+
+
+@dataclass
+class _Entry:
+    value: Any
+    refresh_at: float
+    expires_at: float
+
+
+@dataclass
+class _CachedDocument:
+    """A single cached document with stale-while-revalidate semantics."""
+
+    load: Callable[[], Awaitable[tuple[Any, float | None]]]
+    cache: "JWKSCache"
+    entry: _Entry | None = None
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    background: asyncio.Task | None = None
+
+    async def get(self) -> Any:
+        entry = self.entry
+        now = time.monotonic()
+        if entry is None or now >= entry.expires_at:
+            return await self.refresh(stale=entry)
+        if now >= entry.refresh_at and (self.background is None or self.background.done()):
+            self.background = asyncio.create_task(self._refresh_in_background())
+        return entry.value
+
+    async def refresh(self, stale: _Entry | None = None) -> Any:
+        async with self.lock:
+            # Another coroutine may have refreshed while we waited for the lock.
+            if self.entry is not None and self.entry is not stale and time.monotonic() < self.entry.expires_at:
+                return self.entry.value
+            value, max_age = await self.load()
+            ttl = self.cache.ttl_for(max_age)
+            now = time.monotonic()
+            self.entry = _Entry(value=value, refresh_at=now + ttl * self.cache.refresh_ratio, expires_at=now + ttl)
+            return value
+
+    async def _refresh_in_background(self) -> None:
+        # Keep serving the cached copy; the first request after expiry refreshes in the foreground.
+        with contextlib.suppress(Exception):
+            await self.refresh(stale=self.entry)
+
+
+class JWKSCache:
+    """
+    Cache of the identity provider's discovery metadata and signing keys.
+
+    Documents are kept for as long as the provider's Cache-Control allows
+    (clamped to [min_ttl, max_ttl]) and are refreshed in the background once
+    `refresh_ratio` of that lifetime has passed, so requests only wait on the
+    network when the cache is cold or fully expired. A token signed with an
+    unknown key id triggers at most one forced JWKS refetch per
+    `unknown_kid_interval` seconds, which picks up key rotations without letting
+    forged tokens hammer the provider.
+    """
+
+    def __init__(
+        self,
+        discovery_url: str,
+        fetcher: Fetcher = httpx_fetcher,
+        *,
+        default_ttl: float = 3600.0,
+        min_ttl: float = 60.0,
+        max_ttl: float = 86400.0,
+        refresh_ratio: float = 0.8,
+        unknown_kid_interval: float = 30.0,
+    ) -> None:
+        self.discovery_url = discovery_url
+        self.fetcher = fetcher
+        self.default_ttl = default_ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.refresh_ratio = refresh_ratio
+        self.unknown_kid_interval = unknown_kid_interval
+        self._last_forced_refresh = float("-inf")
+        self._metadata = _CachedDocument(load=self._load_metadata, cache=self)
+        self._jwks = _CachedDocument(load=self._load_jwks, cache=self)
+
+    def ttl_for(self, max_age: float | None) -> float:
+        """Clamp the provider's max-age into the configured TTL bounds."""
+        if max_age is None:
+            return self.default_ttl
+        return min(max(max_age, self.min_ttl), self.max_ttl)
+
+    async def _load_metadata(self) -> tuple[dict[str, Any], float | None]:
+        result = await self.fetcher(self.discovery_url)
+        return result.data, result.max_age
+
+    async def _load_jwks(self) -> tuple[KeySet, float | None]:
+        metadata = await self.metadata()
+        result = await self.fetcher(metadata["jwks_uri"])
+        return JsonWebKey.import_key_set(result.data), result.max_age
+
+    async def metadata(self) -> dict[str, Any]:
+        """Return the OpenID Connect discovery document."""
+        return await self._metadata.get()
+
+    async def key_set(self, kid: str | None = None) -> KeySet:
+        """
+        Return the provider's signing keys.
+
+        Args:
+            kid: Key id the caller is about to verify with. If it is not in the
+                cached set, the set is refetched once (rate limited).
+        """
+        keys = await self._jwks.get()
+        if kid is None or _has_kid(keys, kid):
+            return keys
+        now = time.monotonic()
+        if now - self._last_forced_refresh < self.unknown_kid_interval:
+            return keys
+        self._last_forced_refresh = now
+        return await self._jwks.refresh(stale=self._jwks.entry)
+
+    def clear(self) -> None:
+        """Drop all cached documents."""
+        self._metadata.entry = None
+        self._jwks.entry = None
+        self._last_forced_refresh = float("-inf")
+
+
+def _has_kid(keys: KeySet, kid: str) -> bool:
+    return any(key.kid == kid for key in keys.keys)
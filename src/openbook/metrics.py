@@ -0,0 +1,143 @@
+"""
+Request instrumentation, exposed in Prometheus text format on /metrics.
+
+MetricsMiddleware times every request by route template and gives it a
+RequestStats, which the SQL event listeners (see instrument_engine) and
+BookJSONResponse add to, so each request also records how many statements
+it ran, how long they took and how long encoding took. Token verification
+is timed in openbook.auth.
+
+Under gunicorn (openbook.gunicorn_conf) every worker writes its metrics to
+files in PROMETHEUS_MULTIPROC_DIR, and /metrics adds them all up, whichever
+worker serves it. There are only histograms, so the files of workers that
+have exited keep counting, as they should.
+"""
+
+import logging
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+from prometheus_client import CollectorRegistry, Histogram, REGISTRY, multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from openbook.constants import Settings, settings
+
+logger = logging.getLogger(__name__)
+
+# Requests that match no route share a label, so scanners cannot blow up the label set.
+UNMATCHED_ROUTE = "unmatched"
+
+REQUEST_SECONDS = Histogram(
+    "openbook_request_duration_seconds", "Time to serve a request.", ["method", "route", "status"]
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "openbook_request_sql_statements",
+    "SQL statements run to serve a request.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, float("inf")),
+)
+REQUEST_SQL_SECONDS = Histogram("openbook_request_sql_seconds", "Time spent in SQL statements per request.", ["route"])
+SERIALIZATION_SECONDS = Histogram("openbook_serialization_seconds", "Time to encode a response body.", ["route"])
+AUTH_SECONDS = Histogram(
+    "openbook_auth_seconds",
+    "Time to verify an ID token, by step: jwks and discovery (fetching keys and issuer metadata), jwt (checking it).",
+    ["step"],
+)
+
+
+@dataclass(slots=True)
+class RequestStats:
+    """What a request spent its time on, besides running the endpoint."""
+
+    statements: int = 0
+    sql_seconds: float = 0.0
+    serialization_seconds: float = 0.0
+
+
+request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def record_serialization(seconds: float) -> None:
+    """Add encoding time to the current request's stats."""
+    stats = request_stats.get()
+    if stats is not None:
+        stats.serialization_seconds += seconds
+
+
+def instrument_engine(engine: AsyncEngine | Engine, config: Settings = settings) -> None:
+    """
+    Count and time the statements `engine` runs, towards the stats of the request running them.
+
+    Statements taking at least SLOW_QUERY_MS are logged if it is set. Only
+    the statement is, never its parameters, which hold user ids, emails and
+    whatever else the request carried.
+    """
+    if isinstance(engine, AsyncEngine):
+        engine = engine.sync_engine
+
+    # A connection runs one statement at a time, and one that fails is just overwritten by the next.
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        conn.info["statement_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        elapsed = time.perf_counter() - conn.info["statement_started"]
+        stats = request_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.sql_seconds += elapsed
+        if config.slow_query_ms and elapsed * 1000 >= config.slow_query_ms:
+            logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, statement)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the latency, SQL and encoding time of every HTTP request by route."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Serve the request, then record its metrics under its route template."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            request_stats.reset(token)
+            # The router leaves the matched route in the scope; its path is the template, e.g. /books/{book_id}/similar.
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(elapsed)
+            REQUEST_SQL_STATEMENTS.labels(route).observe(stats.statements)
+            REQUEST_SQL_SECONDS.labels(route).observe(stats.sql_seconds)
+            if stats.serialization_seconds:
+                SERIALIZATION_SECONDS.labels(route).observe(stats.serialization_seconds)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Return the registry to expose: this process's, or that of all workers under gunicorn."""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
@@ -1,10 +1,11 @@
 import enum
 
-from sqlalchemy import ForeignKey, Index
+from sqlalchemy import Column, ForeignKey, Index, Integer, Table
+from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped, MappedAsDataclass, mapped_column, relationship
 
 
-class Base(MappedAsDataclass, DeclarativeBase, kw_only=True):
+class Base(AsyncAttrs, MappedAsDataclass, DeclarativeBase, kw_only=True):
     """Base class for all models, using MappedAsDataclass and DeclarativeBase in SQLAlchemy 2.0."""
 
 
@@ -29,6 +30,8 @@ class UserBook(Base):
     user_id: Mapped[str] = mapped_column(ForeignKey("user.id"), primary_key=True)
     status: Mapped[BookStatus] = mapped_column(default=BookStatus.RECOMMENDED)
 
+    __table_args__ = (Index("idx_user_book_user_status_book", "user_id", "status", "book_id"),)
+
 
 class AuthorBook(Base):
     """Represents the association between authors and books."""
@@ -41,6 +44,8 @@ class AuthorBook(Base):
     book_id: Mapped[int] = mapped_column(ForeignKey("book.id"), primary_key=True)
     author_id: Mapped[int] = mapped_column(ForeignKey("author.id"), primary_key=True)
 
+    __table_args__ = (Index("idx_author_book_author", "author_id"),)
+
 
 class User(Base):
     """Represents a user in the system."""
@@ -81,3 +86,7 @@ class Author(Base):
     name: Mapped[str] = mapped_column(nullable=False)
 
     __table_args__ = (Index("idx_author_name", "name"),)
+
+
+# One row, bumped by triggers on every change to book, author and author_book (see the add_catalog_version migration).
+catalog_version = Table("catalog_version", Base.metadata, Column("version", Integer, nullable=False))
@@ -23,7 +23,30 @@ class Book(BaseModel):
     status: BookStatus
 
 
+class BookPage(BaseModel):
+    """A page of books and the cursor to fetch the next one."""
+
+    books: list[Book]
+    next_cursor: str | None
+
+
 class BookRequest(BaseModel):
     """Model for requests that specify a book."""
 
     id: int
+
+
+class ShelfUpdate(BaseModel):
+    """One entry of a batch of shelf changes."""
+
+    id: int
+    status: BookStatus
+
+
+class ShelfUpdateResult(BaseModel):
+    """Outcome of one entry of a batch of shelf changes."""
+
+    id: int
+    status: BookStatus
+    ok: bool
+    detail: str | None = None
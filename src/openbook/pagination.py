@@ -0,0 +1,38 @@
+import base64
+import binascii
+import json
+
+from openbook.exceptions import InvalidCursorError
+
+Key = str | int | float
+
+
+def encode_cursor(*key: Key) -> str:
+    """Encode the sort key of the last row on a page as an opaque cursor."""
+    raw = json.dumps(key, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, *types: type) -> tuple:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Args:
+        cursor: The opaque cursor sent by the client.
+        types: Expected type of each element of the sort key.
+
+    Raises:
+        InvalidCursorError if the cursor is malformed or does not match types.
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursorError
+    if not isinstance(key, list) or len(key) != len(types):
+        raise InvalidCursorError
+    for value, expected in zip(key, types, strict=True):
+        # bool is an int subclass, and JSON may encode a whole float as an int.
+        allowed = (float, int) if expected is float else expected
+        if isinstance(value, bool) or not isinstance(value, allowed):
+            raise InvalidCursorError
+    return tuple(key)
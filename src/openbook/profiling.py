@@ -0,0 +1,164 @@
+"""
+Profiling a live worker, for administrators, when PROFILING_ENABLED is set.
+
+- Any request with ?profile=1 from an admin runs under cProfile and is
+  answered with the report, as text, instead of its own response. cProfile
+  sees everything the worker's event loop runs meanwhile, other requests
+  included, so profile a quiet worker or read the report with that in mind.
+  One request per worker is profiled at a time.
+- POST /admin/profile/sample?seconds=N samples the stack of the worker's
+  event loop thread for N seconds and writes the counts in collapsed form,
+  one "outer;...;inner count" line per stack, for flamegraph.pl or
+  speedscope. Only the worker serving that request is sampled.
+
+With profiling disabled, neither ProfilingMiddleware nor
+check_profile_access is installed and requests do no extra work.
+"""
+
+import cProfile
+import io
+import pstats
+import sys
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from types import FrameType
+from urllib.parse import parse_qs
+
+from fastapi import Request
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from openbook.auth import is_admin, optional_user
+from openbook.database import SessionLocal
+from openbook.exceptions import ForbiddenError
+
+# Functions listed in a ?profile=1 report, by cumulative time.
+REPORT_LINES = 40
+
+
+@dataclass(slots=True)
+class ProfileRequest:
+    """A request asking to be profiled, and whether check_profile_access let it."""
+
+    allowed: bool = False
+
+
+profile_request: ContextVar[ProfileRequest | None] = ContextVar("profile_request", default=None)
+
+
+def _asks_for_profile(query_string: bytes) -> bool:
+    return b"profile=" in query_string and parse_qs(query_string.decode("latin-1")).get("profile") == ["1"]
+
+
+async def check_profile_access(request: Request) -> None:
+    """
+    App-wide dependency letting admins' ?profile=1 requests be profiled.
+
+    Other requests return at once. Only those asking for a profile are
+    authenticated here, on a session of their own, so the rest pay for no
+    user lookup they do not need themselves.
+
+    Raises:
+        ForbiddenError if anyone but an admin asks.
+    """
+    profile = profile_request.get()
+    if profile is None:
+        return
+    async with SessionLocal() as db:
+        user = await optional_user(request, db)
+    if user is None or not is_admin(user):
+        raise ForbiddenError
+    profile.allowed = True
+
+
+def profile_report(profiler: cProfile.Profile, title: str) -> str:
+    """Return the cProfile statistics, heaviest cumulative time first."""
+    out = io.StringIO()
+    out.write(f"{title}\n")
+    pstats.Stats(profiler, stream=out).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(REPORT_LINES)
+    return out.getvalue()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware running ?profile=1 requests under cProfile.
+
+    The response is held back until the request is done. If check_profile_access
+    allowed the request, the report replaces it; otherwise it is sent as it was.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._busy = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Serve the request, profiling it if it asks to be."""
+        if scope["type"] != "http" or not _asks_for_profile(scope["query_string"]):
+            await self.app(scope, receive, send)
+            return
+        if self._busy:
+            await PlainTextResponse("Another request is being profiled.", status_code=409)(scope, receive, send)
+            return
+
+        messages: list[Message] = []
+
+        async def hold(message: Message) -> None:
+            messages.append(message)
+
+        request = ProfileRequest()
+        token = profile_request.set(request)
+        profiler = cProfile.Profile()
+        self._busy = True
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, hold)
+            finally:
+                profiler.disable()
+        finally:
+            self._busy = False
+            profile_request.reset(token)
+        elapsed = time.perf_counter() - start
+
+        if not request.allowed:
+            for message in messages:
+                await send(message)
+            return
+        status = next(message["status"] for message in messages if message["type"] == "http.response.start")
+        title = f"{scope['method']} {scope['path']} -> {status} in {elapsed * 1000:.1f} ms"
+        await PlainTextResponse(profile_report(profiler, title))(scope, receive, send)
+
+
+def collapse_stack(frame: FrameType | None) -> str:
+    """Return a stack as "outer;...;inner", naming each function by qualified name and where it is defined."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_qualname} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def sample_stacks(thread_id: int, seconds: float, interval: float) -> Counter[str]:
+    """Count the collapsed stacks of a thread, sampled every `interval` seconds for `seconds` seconds."""
+    stacks: Counter[str] = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            stacks[collapse_stack(frame)] += 1
+        del frame
+        time.sleep(interval)
+    return stacks
+
+
+def write_collapsed(stacks: Counter[str], path: Path) -> None:
+    """Write stack counts in the collapsed format flame graph tools read."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
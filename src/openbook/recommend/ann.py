@@ -0,0 +1,249 @@
+import copy
+import os
+import re
+import zlib
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+
+# Length of the hashed title/author feature vectors.
+DEFAULT_DIMENSIONS = 256
+
+# Rows scored at once when assigning vectors to lists.
+ASSIGN_CHUNK = 65_536
+
+# Vectors `extended` keeps in the buffer of added vectors before merging them into the lists.
+MERGE_THRESHOLD = 10_000
+
+FILES = ("centroids", "offsets", "ids", "vectors")
+
+_WORD = re.compile(r"\w+")
+
+
+def embed_book(title: str, authors: Sequence[str], dimensions: int = DEFAULT_DIMENSIONS) -> np.ndarray:
+    """
+    Embed a book as a unit vector of hashed title words and author names.
+
+    Uses the signed hashing trick with CRC32, which unlike `hash` is stable
+    across processes, so vectors built offline match ones computed at runtime.
+    Each author's full name is one feature, weighted above any single word.
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    features = [(word, 1.0) for word in _WORD.findall(title.lower())]
+    features += [("author:" + " ".join(_WORD.findall(name.lower())), 2.0) for name in authors]
+    for feature, weight in features:
+        h = zlib.crc32(feature.encode())
+        vector[(h >> 1) % dimensions] += weight if h & 1 else -weight
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+@dataclass
+class IVFIndex:
+    """
+    An inverted-file index for approximate cosine nearest neighbours.
+
+    Vectors are clustered around `centroids`; list l holds `ids` and `vectors`
+    rows `offsets[l]:offsets[l + 1]`. A query scores only the `nprobe` lists
+    whose centroids are closest to it. Loaded indexes are memory-mapped.
+
+    Vectors added with `add` after the build are kept in a small in-memory
+    buffer that every query scans for its probed lists; `merge` folds them into
+    the sorted arrays. `extended` adds them to a copy instead, merging once the
+    buffer holds more than MERGE_THRESHOLD.
+    """
+
+    centroids: np.ndarray
+    offsets: np.ndarray
+    ids: np.ndarray
+    vectors: np.ndarray
+    nprobe: int = 8
+    position: dict[int, int] = field(init=False, repr=False)
+    added_ids: list[int] = field(init=False, repr=False, default_factory=list)
+    added_lists: list[int] = field(init=False, repr=False, default_factory=list)
+    added_vectors: list[np.ndarray] = field(init=False, repr=False, default_factory=list)
+    added_position: dict[int, int] = field(init=False, repr=False, default_factory=dict)
+    max_id: int = field(init=False, default=0)
+
+    def __post_init__(self) -> None:
+        self.position = {int(book_id): i for i, book_id in enumerate(self.ids)}
+        self.max_id = max(self.max_id, int(self.ids.max(initial=0)))
+
+    def __len__(self) -> int:
+        return len(self.position) + len(self.added_position)
+
+    def __contains__(self, book_id: int) -> bool:
+        return book_id in self.position or book_id in self.added_position
+
+    def vector(self, book_id: int) -> np.ndarray:
+        """Return the stored vector of a book. Raises KeyError if it is not indexed."""
+        if book_id in self.added_position:
+            return self.added_vectors[self.added_position[book_id]]
+        return self.vectors[self.position[book_id]]
+
+    def add(self, book_id: int, vector: np.ndarray) -> None:
+        """Index one more vector, assigning it to its nearest list."""
+        self._append(book_id, vector, int(np.argmax(self.centroids @ vector)))
+
+    def extended(self, ids: Sequence[int], vectors: np.ndarray) -> "IVFIndex":
+        """
+        Return a copy of the index with more vectors added, leaving this one unchanged.
+
+        The copy shares the sorted arrays and gets its own buffer, so it can be
+        built in another thread while this index goes on serving queries.
+        """
+        index = copy.copy(self)
+        index.added_ids, index.added_lists = list(self.added_ids), list(self.added_lists)
+        index.added_vectors, index.added_position = list(self.added_vectors), dict(self.added_position)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        for book_id, vector, list_ in zip(ids, vectors, assign(vectors, self.centroids), strict=True):
+            index._append(int(book_id), vector, int(list_))
+        if len(index.added_ids) > MERGE_THRESHOLD:
+            index.merge()
+        return index
+
+    def _append(self, book_id: int, vector: np.ndarray, list_: int) -> None:
+        if book_id in self:
+            return
+        self.added_position[book_id] = len(self.added_ids)
+        self.added_ids.append(book_id)
+        self.added_lists.append(list_)
+        self.added_vectors.append(np.asarray(vector, dtype=np.float32))
+        self.max_id = max(self.max_id, book_id)
+
+    def merge(self) -> None:
+        """Fold vectors added since the build into the sorted list arrays."""
+        if not self.added_ids:
+            return
+        built = np.repeat(np.arange(self.centroids.shape[0]), np.diff(self.offsets))
+        lists = np.concatenate([built, self.added_lists])
+        ids = np.concatenate([self.ids, np.array(self.added_ids, dtype=self.ids.dtype)])
+        vectors = np.concatenate([self.vectors, np.stack(self.added_vectors)])
+        order = np.argsort(lists, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=self.centroids.shape[0]))])
+        self.ids, self.vectors = ids[order], vectors[order]
+        self.added_ids, self.added_lists, self.added_vectors, self.added_position = [], [], [], {}
+        self.__post_init__()
+
+    def search(self, vector: np.ndarray, n: int, exclude: Iterable[int] = ()) -> list[tuple[int, float]]:
+        """
+        Find the approximate n nearest neighbours of a unit vector.
+
+        Returns:
+            Up to n (book id, cosine similarity) pairs, best first.
+        """
+        if n <= 0 or len(self) == 0:
+            return []
+        centroid_scores = self.centroids @ vector
+        nprobe = min(self.nprobe, centroid_scores.size)
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        # Lists are contiguous, so each is scored as a slice without copying it.
+        spans = [slice(self.offsets[i], self.offsets[i + 1]) for i in probe]
+        ids = np.concatenate([self.ids[span] for span in spans])
+        scores = np.concatenate([self.vectors[span] @ vector for span in spans])
+        added = np.flatnonzero(np.isin(self.added_lists, probe))
+        if added.size:
+            ids = np.concatenate([ids, np.array(self.added_ids, dtype=ids.dtype)[added]])
+            scores = np.concatenate([scores, np.stack([self.added_vectors[i] for i in added]) @ vector])
+
+        keep = ~np.isin(ids, np.fromiter(exclude, dtype=np.int64))
+        ids, scores = ids[keep], scores[keep]
+        if ids.size > n:
+            top = np.argpartition(-scores, n - 1)[:n]
+            ids, scores = ids[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(i), float(s)) for i, s in zip(ids[order], scores[order], strict=True)]
+
+    def similar(self, book_id: int, n: int) -> list[tuple[int, float]]:
+        """Find books similar to an indexed one. Raises KeyError if it is not indexed."""
+        return self.search(self.vector(book_id), n, exclude=[book_id])
+
+    def save(self, path: str | os.PathLike[str]) -> None:
+        """Write the index, including added vectors, to a directory as .npy files."""
+        self.merge()
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in FILES:
+            tmp = path / f"{name}.tmp.npy"
+            np.save(tmp, getattr(self, name), allow_pickle=False)
+            tmp.replace(path / f"{name}.npy")
+
+    @classmethod
+    def load(cls, path: str | os.PathLike[str], nprobe: int = 8) -> "IVFIndex":
+        """Load an index written by `save`, memory-mapping the vectors."""
+        path = Path(path)
+        return cls(
+            centroids=np.load(path / "centroids.npy", allow_pickle=False),
+            offsets=np.load(path / "offsets.npy", allow_pickle=False),
+            ids=np.load(path / "ids.npy", allow_pickle=False),
+            vectors=np.load(path / "vectors.npy", mmap_mode="r", allow_pickle=False),
+            nprobe=nprobe,
+        )
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Return the list of each row of vectors: the one whose centroid is closest."""
+    rows = vectors.shape[0]
+    if rows == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(
+        [np.argmax(vectors[i : i + ASSIGN_CHUNK] @ centroids.T, axis=1) for i in range(0, rows, ASSIGN_CHUNK)]
+    )
+
+
+def build_ivf(
+    ids: Sequence[int],
+    vectors: np.ndarray,
+    lists: int | None = None,
+    iterations: int = 10,
+    sample: int = 64,
+    nprobe: int = 8,
+    seed: int = 0,
+) -> IVFIndex:
+    """
+    Cluster unit vectors with spherical k-means and build an IVF index over them.
+
+    Args:
+        ids: Book id of each row of vectors.
+        vectors: Unit-length rows.
+        lists: Number of clusters. Defaults to sqrt(len(ids)).
+        iterations: k-means iterations.
+        sample: Centroids are trained on at most `sample` vectors per list.
+        nprobe: Lists scanned per query.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if ids.size == 0:
+        # A single empty list; books added later all land in it until the next build.
+        centroids = np.zeros((1, vectors.shape[1]), dtype=np.float32)
+        offsets = np.zeros(2, dtype=np.int64)
+        return IVFIndex(centroids=centroids, offsets=offsets, ids=ids, vectors=vectors, nprobe=nprobe)
+    if lists is None:
+        lists = int(np.sqrt(ids.size))
+    lists = max(1, min(lists, ids.size))
+
+    rng = np.random.default_rng(seed)
+    training = vectors[rng.choice(ids.size, size=min(ids.size, lists * sample), replace=False)]
+    centroids = training[rng.choice(training.shape[0], size=lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(training @ centroids.T, axis=1)
+        members = sp.csr_matrix(
+            (np.ones(assignment.size, dtype=np.float32), (assignment, np.arange(assignment.size))),
+            shape=(lists, assignment.size),
+        )
+        sums = members @ training
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms == 0
+        # Re-seed empty clusters with random training points.
+        sums[empty] = training[rng.choice(training.shape[0], size=int(empty.sum()))]
+        centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True).clip(min=1e-12)
+
+    assignment = assign(vectors, centroids)
+    order = np.argsort(assignment, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=lists))])
+    return IVFIndex(centroids=centroids, offsets=offsets, ids=ids[order], vectors=vectors[order], nprobe=nprobe)
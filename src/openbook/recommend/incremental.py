@@ -0,0 +1,122 @@
+import math
+import threading
+from collections import defaultdict
+from collections.abc import Iterable
+
+import numpy as np
+
+from openbook.recommend.similarity import ItemSimilarity, build_item_similarity
+
+
+class IncrementalSimilarity:
+    """
+    An item similarity model that absorbs shelf changes one at a time.
+
+    Alongside the top-K model it keeps every positive shelf and every book's
+    readers, so a single (user, book) change only recomputes the cosine of the
+    book against the rest of that user's shelf and patches the affected
+    neighbour lists. Those updates do not revisit other pairs whose score
+    shifted because a book's reader count changed; the Recommender folds that
+    drift back in when it rebuilds the model from the database (see
+    openbook.recommend.service).
+
+    Only one thread may call `apply`; `recommend` may be called from any
+    thread.
+    """
+
+    def __init__(self, shelves: dict[str, set[int]], k: int) -> None:
+        self.k = k
+        self.shelves = shelves
+        self.readers: defaultdict[int, set[str]] = defaultdict(set)
+        for user_id, books in shelves.items():
+            for book_id in books:
+                self.readers[book_id].add(user_id)
+        self._lock = threading.Lock()
+        self.model = self._build()
+
+    @classmethod
+    def from_interactions(cls, user_ids: Iterable[str], book_ids: Iterable[int], k: int) -> "IncrementalSimilarity":
+        """Build the model from parallel lists of positive interactions."""
+        shelves: dict[str, set[int]] = {}
+        for user_id, book_id in zip(user_ids, book_ids, strict=True):
+            shelves.setdefault(user_id, set()).add(book_id)
+        return cls(shelves, k)
+
+    def _build(self) -> ItemSimilarity:
+        users = [user_id for user_id, books in self.shelves.items() for _ in books]
+        books = [book_id for books in self.shelves.values() for book_id in books]
+        return build_item_similarity(users, books, k=self.k)
+
+    def recommend(self, seeds: Iterable[int], exclude: Iterable[int], n: int) -> list[tuple[int, float]]:
+        """See ItemSimilarity.recommend."""
+        with self._lock:
+            return self.model.recommend(seeds, exclude, n)
+
+    def reset_lock(self) -> None:
+        """Replace the lock, which a fork may have copied while another thread held it."""
+        self._lock = threading.Lock()
+
+    def apply(self, user_id: str, book_id: int, positive: bool) -> None:
+        """Record that a user started (positive) or stopped liking a book and update the neighbour lists."""
+        shelf = self.shelves.setdefault(user_id, set())
+        if positive == (book_id in shelf):
+            return
+        if positive:
+            shelf.add(book_id)
+            self.readers[book_id].add(user_id)
+        else:
+            shelf.discard(book_id)
+            self.readers[book_id].discard(user_id)
+
+        updates = [(other, self._cosine(book_id, other)) for other in shelf if other != book_id]
+        with self._lock:
+            row = self._row(book_id)
+            for other, sim in updates:
+                other_row = self._row(other)
+                self._set_neighbor(row, other_row, sim)
+                self._set_neighbor(other_row, row, sim)
+
+    def _cosine(self, a: int, b: int) -> float:
+        readers_a, readers_b = self.readers[a], self.readers[b]
+        if not readers_a or not readers_b:
+            return 0.0
+        if len(readers_a) > len(readers_b):
+            readers_a, readers_b = readers_b, readers_a
+        common = sum(1 for user_id in readers_a if user_id in readers_b)
+        return common / math.sqrt(len(readers_a) * len(readers_b))
+
+    def _row(self, book_id: int) -> int:
+        """Return the model row of a book, adding one (and growing the arrays) if it is new."""
+        model = self.model
+        row = model.index.get(book_id)
+        if row is not None:
+            return row
+        row = len(model.index)
+        if row == model.item_ids.shape[0]:
+            capacity = max(2 * row, 16)
+            item_ids = np.full(capacity, -1, dtype=model.item_ids.dtype)
+            neighbors = np.full((capacity, self.k), -1, dtype=np.int32)
+            scores = np.zeros((capacity, self.k), dtype=np.float32)
+            item_ids[:row], neighbors[:row], scores[:row] = model.item_ids, model.neighbors, model.scores
+            model.item_ids, model.neighbors, model.scores = item_ids, neighbors, scores
+        model.item_ids[row] = book_id
+        model.index[book_id] = row
+        return row
+
+    def _set_neighbor(self, row: int, col: int, sim: float) -> None:
+        """Put col in row's neighbour list with the given score, if it ranks among the top K."""
+        neighbors, scores = self.model.neighbors[row], self.model.scores[row]
+        present = np.flatnonzero(neighbors == col)
+        if present.size:
+            slot = present[0]
+            if sim > 0:
+                scores[slot] = sim
+            else:
+                neighbors[slot], scores[slot] = -1, 0.0
+            return
+        if sim <= 0:
+            return
+        # Empty slots (-1) sort below every real neighbour.
+        slot = int(np.argmin(np.where(neighbors >= 0, scores, -1.0)))
+        if neighbors[slot] < 0 or scores[slot] < sim:
+            neighbors[slot], scores[slot] = col, sim
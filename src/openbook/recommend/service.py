@@ -0,0 +1,284 @@
+import asyncio
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from openbook.constants import settings
+from openbook.models.orm import Author, AuthorBook, Book, BookStatus, UserBook
+from openbook.recommend.als import FactorModel
+from openbook.recommend.ann import DEFAULT_DIMENSIONS, IVFIndex, build_ivf, embed_book
+from openbook.recommend.incremental import IncrementalSimilarity
+
+logger = logging.getLogger(__name__)
+
+# Statuses that count as a user liking a book.
+POSITIVE_STATUSES = (BookStatus.COMPLETED, BookStatus.READING)
+
+
+async def load_interactions(db: AsyncSession) -> tuple[list[str], list[int]]:
+    """Load every positive (user, book) interaction as two parallel lists."""
+    result = await db.execute(select(UserBook.user_id, UserBook.book_id).filter(UserBook.status.in_(POSITIVE_STATUSES)))
+    rows = result.all()
+    return [row[0] for row in rows], [row[1] for row in rows]
+
+
+async def load_books(db: AsyncSession, after_id: int = 0) -> dict[int, tuple[str, list[str]]]:
+    """Load the title and author names of every book with an id above after_id."""
+    result = await db.execute(
+        select(Book.id, Book.title, Author.name)
+        .outerjoin(AuthorBook, AuthorBook.book_id == Book.id)
+        .outerjoin(Author, Author.id == AuthorBook.author_id)
+        .filter(Book.id > after_id)
+        .order_by(Book.id)
+    )
+    books: dict[int, tuple[str, list[str]]] = {}
+    for book_id, title, author in result:
+        _, authors = books.setdefault(book_id, (title, []))
+        if author is not None:
+            authors.append(author)
+    return books
+
+
+def embed_books(books: dict[int, tuple[str, list[str]]]) -> tuple[list[int], np.ndarray]:
+    """Embed books loaded by load_books as rows of a matrix."""
+    vectors = np.zeros((len(books), DEFAULT_DIMENSIONS), dtype=np.float32)
+    for i, (title, authors) in enumerate(books.values()):
+        vectors[i] = embed_book(title, authors)
+    return list(books), vectors
+
+
+def build_similar_index(books: dict[int, tuple[str, list[str]]], nprobe: int = 8) -> IVFIndex:
+    """Build the "books like this one" index over books loaded by load_books."""
+    ids, vectors = embed_books(books)
+    return build_ivf(ids, vectors, nprobe=nprobe)
+
+
+def extend_similar_index(index: IVFIndex, books: dict[int, tuple[str, list[str]]]) -> IVFIndex:
+    """Return a copy of the index with books loaded by load_books added to it."""
+    ids, vectors = embed_books(books)
+    return index.extended(ids, vectors)
+
+
+class _Rebuild(NamedTuple):
+    """Positive interactions read from the database, for the update thread to build a new model from."""
+
+    users: list[str]
+    books: list[int]
+    # Changes applied since the interactions started loading, which they may not include.
+    replay: list[tuple[str, int, bool]]
+
+
+class Recommender:
+    """
+    Holds the item similarity model and keeps it current.
+
+    The model is built from the user_book table on first use. After that, the
+    write endpoints publish shelf changes into a queue which a background
+    thread applies incrementally. Every `rebuild_interval` seconds the next
+    request also starts reading user_book again in the background, and the
+    thread swaps in a model built from that, with the changes published in
+    the meantime applied on top. Changes only reach the model of the process
+    they were made in until then, so with several workers they all converge
+    on the database every `rebuild_interval`.
+
+    If `factors_path` points at a directory written by `openbook.cli train-als`,
+    the ALS factors in it are memory-mapped on first use and preferred for the
+    users they were trained on.
+    """
+
+    def __init__(self, k: int, rebuild_interval: float, factors_path: str = "") -> None:
+        self.k = k
+        self.rebuild_interval = rebuild_interval
+        self.factors_path = factors_path
+        self.model: IncrementalSimilarity | None = None
+        self._factors: FactorModel | None = None
+        self._building = False
+        self._lock = asyncio.Lock()
+        self._updates: queue.Queue[tuple[str, int, bool] | _Rebuild] = queue.Queue()
+        self._worker: threading.Thread | None = None
+        self._loaded_at = 0.0
+        self._rebuild_task: asyncio.Task | None = None
+        self._replay: list[tuple[str, int, bool]] | None = None
+        # A model built before a preforking server forks is inherited by every
+        # worker, but the thread applying updates to it is not; each starts its own.
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    async def load(self, db: AsyncSession) -> IncrementalSimilarity:
+        """
+        Return the model, building it from the database first if needed.
+
+        Unlike get_model, this starts no thread, so a preforking server can
+        call it in the master (see server.warm_up); every worker starts its
+        own after the fork.
+        """
+        if self.model is None:
+            async with self._lock:
+                if self.model is None:
+                    await self._build(db)
+        assert self.model is not None  # noqa: S101
+        return self.model
+
+    async def get_model(self, db: AsyncSession) -> IncrementalSimilarity:
+        """Return the model, building it first if needed, and start rebuilding it in the background if it is due."""
+        model = await self.load(db)
+        self._start_worker()
+        if self._rebuild_task is None and time.monotonic() - self._loaded_at >= self.rebuild_interval:
+            # A fresh context, so the rebuild's statements are not counted toward this request.
+            self._rebuild_task = asyncio.create_task(
+                self._rebuild_in_background(db.bind), context=contextvars.Context()
+            )
+        return model
+
+    def factors(self) -> FactorModel | None:
+        """Return the trained ALS factors, or None if none are configured."""
+        if self._factors is None and self.factors_path and os.path.exists(self.factors_path):
+            self._factors = FactorModel.load(self.factors_path)
+        return self._factors
+
+    async def _build(self, db: AsyncSession) -> None:
+        # Changes published while the interactions are loading are queued and
+        # replayed on top; applying one twice is harmless.
+        self._building = True
+        try:
+            users, books = await load_interactions(db)
+            self.model = await asyncio.to_thread(IncrementalSimilarity.from_interactions, users, books, self.k)
+        finally:
+            self._building = False
+        self._loaded_at = time.monotonic()
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        """Read the interactions again and queue them for the update thread to replace the model with."""
+        self._replay = replay = []
+        try:
+            users, books = await load_interactions(db)
+        except BaseException:
+            self._replay = None
+            raise
+        self._updates.put(_Rebuild(users, books, replay))
+        self._start_worker()
+
+    async def _rebuild_in_background(self, bind: AsyncEngine | AsyncConnection | None) -> None:
+        try:
+            async with AsyncSession(bind) as db:
+                await self.rebuild(db)
+        except Exception:
+            logger.exception("Failed to reload the recommendation model")
+        finally:
+            self._loaded_at = time.monotonic()
+            self._rebuild_task = None
+
+    def _start_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="recommend-updates", daemon=True)
+            self._worker.start()
+
+    def _after_fork(self) -> None:
+        self._updates = queue.Queue()
+        self._worker = None
+        self._lock = asyncio.Lock()
+        self._rebuild_task = None
+        self._replay = None
+        if self.model is not None:
+            self.model.reset_lock()
+            self._start_worker()
+
+    def publish(self, user_id: str, book_id: int, status: BookStatus) -> None:
+        """Queue a shelf change for the model. Cheap enough to call from request handlers."""
+        if self.model is None and not self._building:
+            # Nothing to update yet; the first build reads the change from the database.
+            return
+        self._updates.put((user_id, book_id, status in POSITIVE_STATUSES))
+        if self.model is not None:
+            self._start_worker()
+
+    def flush(self) -> None:
+        """Block until every queued change, and rebuild, has been applied."""
+        self._updates.join()
+
+    def invalidate(self) -> None:
+        """Forget the current models so the next request reloads them."""
+        self.model = None
+        self._factors = None
+
+    def _run(self) -> None:
+        while True:
+            update = self._updates.get()
+            try:
+                if isinstance(update, _Rebuild):
+                    self._swap(update)
+                elif self.model is not None:
+                    self.model.apply(*update)
+                    if self._replay is not None:
+                        self._replay.append(update)
+            except Exception:
+                logger.exception("Failed to apply recommendation update %r", update)
+            finally:
+                self._updates.task_done()
+
+    def _swap(self, rebuild: _Rebuild) -> None:
+        model = IncrementalSimilarity.from_interactions(rebuild.users, rebuild.books, self.k)
+        for update in rebuild.replay:
+            model.apply(*update)
+        if self._replay is rebuild.replay:
+            self._replay = None
+        # Unless the model was invalidated meanwhile.
+        if self.model is not None:
+            self.model = model
+
+
+class SimilarBooks:
+    """
+    Holds the approximate nearest-neighbour index behind "books like this one".
+
+    The index is memory-mapped from `path` if it exists there (see
+    `openbook.cli build-similar`) and built from the book table otherwise.
+    Books created since are embedded and added to it as they are first seen,
+    in a thread, into a copy that replaces the index once it is ready.
+    """
+
+    def __init__(self, path: str = "", nprobe: int = 8) -> None:
+        self.path = path
+        self.nprobe = nprobe
+        self.index: IVFIndex | None = None
+        self._lock = asyncio.Lock()
+
+    async def get_index(self, db: AsyncSession) -> IVFIndex:
+        """Return the index, loading or building it first if needed, with every book in the database added."""
+        if self.index is None:
+            async with self._lock:
+                if self.index is None:
+                    if self.path and os.path.exists(self.path):
+                        self.index = IVFIndex.load(self.path, nprobe=self.nprobe)
+                    else:
+                        books = await load_books(db)
+                        self.index = await asyncio.to_thread(build_similar_index, books, self.nprobe)
+        index = self.index
+        assert index is not None  # noqa: S101
+        books = await load_books(db, after_id=index.max_id)
+        if books:
+            async with self._lock:
+                # Another request may have added them while this one waited.
+                if self.index is index:
+                    self.index = await asyncio.to_thread(extend_similar_index, index, books)
+                index = self.index or index
+        return index
+
+    def invalidate(self) -> None:
+        """Forget the current index so the next request reloads it."""
+        self.index = None
+
+
+recommender = Recommender(
+    k=settings.recommend_neighbors,
+    rebuild_interval=settings.recommend_rebuild_interval,
+    factors_path=settings.recommend_factors_path,
+)
+similar_books = SimilarBooks(path=settings.similar_index_path)
@@ -0,0 +1,133 @@
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+import numpy as np
+import scipy.sparse as sp
+
+# Upper bound on co-occurrence entries materialized at once while building.
+DEFAULT_BLOCK_BUDGET = 8_000_000
+
+
+@dataclass
+class ItemSimilarity:
+    """
+    Top-K item-to-item cosine similarities.
+
+    Row i of `neighbors`/`scores` holds the K most similar items to the book
+    `item_ids[i]`, as indices into `item_ids`, best first. Rows with fewer than
+    K neighbours are padded with -1 and a score of 0. Memory is O(items * K).
+    """
+
+    item_ids: np.ndarray
+    neighbors: np.ndarray
+    scores: np.ndarray
+    index: dict[int, int] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.index = {int(book_id): i for i, book_id in enumerate(self.item_ids)}
+
+    @property
+    def k(self) -> int:
+        """Number of neighbours kept per item."""
+        return self.neighbors.shape[1]
+
+    def indices(self, book_ids: Iterable[int]) -> np.ndarray:
+        """Map book ids to row indices, dropping books the model has never seen."""
+        index = self.index
+        return np.fromiter((index[b] for b in book_ids if b in index), dtype=np.int64)
+
+    def recommend(self, seeds: Iterable[int], exclude: Iterable[int], n: int) -> list[tuple[int, float]]:
+        """
+        Score books by summing their similarity to each seed book.
+
+        Args:
+            seeds: Book ids the user has shown interest in.
+            exclude: Book ids never to recommend, e.g. the user's whole shelf.
+            n: Number of recommendations.
+
+        Returns:
+            Up to n (book id, score) pairs, best first.
+        """
+        rows = self.indices(seeds)
+        if rows.size == 0 or n <= 0:
+            return []
+        candidates = self.neighbors[rows].ravel()
+        weights = self.scores[rows].ravel()
+        valid = candidates >= 0
+        candidates, inverse = np.unique(candidates[valid], return_inverse=True)
+        totals = np.bincount(inverse, weights=weights[valid], minlength=candidates.size)
+
+        excluded = self.indices(exclude)
+        keep = ~np.isin(candidates, excluded)
+        candidates, totals = candidates[keep], totals[keep]
+        if candidates.size > n:
+            top = np.argpartition(-totals, n - 1)[:n]
+            candidates, totals = candidates[top], totals[top]
+        order = np.argsort(-totals, kind="stable")
+        return [(int(self.item_ids[c]), float(s)) for c, s in zip(candidates[order], totals[order], strict=True)]
+
+
+def build_item_similarity(
+    user_ids: Iterable[str], book_ids: Iterable[int], k: int = 50, block_budget: int = DEFAULT_BLOCK_BUDGET
+) -> ItemSimilarity:
+    """
+    Build top-K cosine similarities between books from (user, book) interactions.
+
+    The user x book incidence matrix X is binary, so X^T X counts co-readers and
+    cosine(i, j) = co(i, j) / sqrt(n_i * n_j). Rows of X^T X are computed a block
+    of books at a time, with blocks sized so that no more than roughly
+    `block_budget` co-occurrence entries exist at once, and only the top K of
+    each row survive the block.
+    """
+    user_index: dict[str, int] = {}
+    users = np.fromiter((user_index.setdefault(u, len(user_index)) for u in user_ids), dtype=np.int64)
+    books = np.fromiter(book_ids, dtype=np.int64)
+    item_ids, items = np.unique(books, return_inverse=True)
+    n_items = item_ids.size
+    neighbors = np.full((n_items, k), -1, dtype=np.int32)
+    scores = np.zeros((n_items, k), dtype=np.float32)
+    if n_items == 0:
+        return ItemSimilarity(item_ids=item_ids, neighbors=neighbors, scores=scores)
+
+    x = sp.csr_matrix(
+        (np.ones(users.size, dtype=np.float32), (users, items)), shape=(len(user_index), n_items), dtype=np.float32
+    )
+    x.sum_duplicates()
+    x.data[:] = 1.0
+    xt = x.T.tocsr()
+    counts = np.diff(xt.indptr).astype(np.float64)
+    inv_norms = np.zeros(n_items, dtype=np.float32)
+    np.divide(1.0, np.sqrt(counts), out=inv_norms, where=counts > 0, casting="unsafe")
+
+    # Entries row i contributes to X^T X is at most the sum of its readers' shelf sizes.
+    user_degree = np.diff(x.indptr).astype(np.float64)
+    work = np.cumsum(xt @ user_degree)
+    start = 0
+    while start < n_items:
+        done = work[start - 1] if start else 0.0
+        stop = int(np.searchsorted(work, done + block_budget, side="right"))
+        stop = min(max(stop, start + 1), n_items)
+        _top_k_block(xt[start:stop] @ x, start, inv_norms, neighbors, scores)
+        start = stop
+    return ItemSimilarity(item_ids=item_ids, neighbors=neighbors, scores=scores)
+
+
+def _top_k_block(
+    co: sp.csr_matrix, offset: int, inv_norms: np.ndarray, neighbors: np.ndarray, scores: np.ndarray
+) -> None:
+    """Keep the K best cosine neighbours of each row of a co-occurrence block."""
+    co = co.tocsr()
+    k = neighbors.shape[1]
+    rows = np.repeat(np.arange(co.shape[0]), np.diff(co.indptr))
+    cols = co.indices
+    sims = co.data * inv_norms[rows + offset] * inv_norms[cols]
+    sims[cols == rows + offset] = 0.0  # a book is not its own neighbour
+    # Sort each row's entries best first (sims are in [0, 1], so one float key
+    # orders by row and then by descending similarity); an entry's rank is its
+    # position within its row.
+    order = np.argsort(rows * 2.0 - sims)
+    rank = np.arange(order.size) - co.indptr[rows[order]]
+    selected = (rank < k) & (sims[order] > 0)
+    keep, rank = order[selected], rank[selected]
+    neighbors[rows[keep] + offset, rank] = cols[keep]
+    scores[rows[keep] + offset, rank] = sims[keep]
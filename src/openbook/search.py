@@ -0,0 +1,370 @@
+"""
+Full-text search over book titles and author names, per database dialect.
+
+Each backend supplies the `hits` CTE, and any it builds on: one page of
+matching books, one row each, in ascending rank order, starting after an
+optional keyset cursor. The query around it only selects the book ids and
+ranks; the books themselves come from openbook.catalog. Ranks sort
+ascending, best first, on every backend, so cursors and ordering work the
+same.
+
+Results depend on the catalog alone, so pages are cached until the
+catalog_version row, bumped by triggers on the catalog tables, changes.
+
+SQLite uses the FTS5 tables kept in sync by triggers; PostgreSQL matches
+to_tsvector over the columns themselves, served by GIN expression indexes.
+Both are created by the add_fts migration.
+
+Type-ahead search (see typeahead) takes partial and misspelled input and
+answers in one request, with no further pages. It collects a bounded number
+of candidates from each of three matches: whole words, word prefixes (from
+the FTS5 prefix indexes, or tsquery prefixes on PostgreSQL) and, if those
+fall short of a page, shared trigrams (the trigram FTS5 tables, or
+pg_trgm). Each kind keeps its best candidates, by bm25 on FTS5 and by
+ts_rank or trigram similarity on PostgreSQL, so the books matching best
+are not cut in favour of whichever come first in the index. Only the first
+TYPEAHEAD_SCAN matches are ranked, though: ranking all of them takes time
+in proportion to their number, which for a two-letter prefix can be a good
+part of the catalog, so the cost of a query stays bounded however large
+the catalog is. The candidates are then scored on their text, blending the
+three kinds of match. The indexes are created by the add_typeahead_indexes
+migration.
+"""
+
+import abc
+import enum
+import functools
+import re
+import unicodedata
+
+from sqlalchemy import TextClause, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from openbook.cache import LRUCache
+from openbook.catalog import book_records
+from openbook.constants import settings
+
+# Text search configuration for PostgreSQL. "simple" neither stems nor drops stop
+# words, like FTS5's default unicode61 tokenizer. The GIN indexes are built on
+# this exact expression, so changing it needs a migration.
+POSTGRES_CONFIG = "simple"
+
+# Candidates collected per kind of type-ahead match: the best ranked of up to TYPEAHEAD_SCAN matches.
+TYPEAHEAD_CANDIDATES = 100
+TYPEAHEAD_SCAN = 1_000
+# Shorter words are left out of prefix matches: FTS5 indexes prefixes of 2 to 4 characters only.
+MIN_PREFIX = 2
+# Words with a lower trigram similarity to a query word do not count as matching it.
+MIN_SIMILARITY = 0.3
+
+SEARCH = """with {hits}
+select rowid, rank from hits
+order by rank, rowid
+"""
+
+
+class SearchMode(enum.Enum):
+    """How GET /books/search matches its query."""
+
+    EXACT = "exact"
+    TYPEAHEAD = "typeahead"
+
+
+class Match(enum.Enum):
+    """The kinds of type-ahead match, in the order they are looked for."""
+
+    WORD = "word"
+    PREFIX = "prefix"
+    TRIGRAM = "trigram"
+
+
+class SearchBackend(abc.ABC):
+    """
+    Builds the title and author search queries for one dialect.
+
+    Title queries take :title, author queries :author, and both :limit and,
+    after the first page, :after_0 and :after_1 for the (rank, book id) of the
+    last hit. Rows are (book id, rank).
+
+    The queries are formatted from fixed SQL fragments only; everything from
+    the request is a bound parameter.
+    """
+
+    @abc.abstractmethod
+    def title_hits(self, keyset: bool) -> str:
+        """Return the hits CTE for a title search, with columns rowid (the book id) and rank."""
+
+    @abc.abstractmethod
+    def author_hits(self, keyset: bool) -> str:
+        """
+        Return the hits CTE for an author search, with columns rowid (the book id) and rank.
+
+        A book ranks as well as the best of its matching authors.
+        """
+
+    def _query(self, hits: str) -> TextClause:
+        return text(SEARCH.format(hits=hits))
+
+    def title_query(self, keyset: bool) -> TextClause:
+        """Return the title search query."""
+        return self._query(self.title_hits(keyset))
+
+    def author_query(self, keyset: bool) -> TextClause:
+        """Return the author search query."""
+        return self._query(self.author_hits(keyset))
+
+    @abc.abstractmethod
+    def typeahead_terms(self, match: Match, words: list[str]) -> str | None:
+        """Return the :query parameter matching `words` the given way, or None if they are too short for it."""
+
+    @abc.abstractmethod
+    def typeahead_query(self, field: str, match: Match) -> TextClause:
+        """
+        Return a query for the ids of up to :candidates books whose title or author name matches :query.
+
+        They are the best of the first :scan matches in index order, by the
+        backend's own rank, and come best first.
+        """
+
+
+class Fts5Search(SearchBackend):
+    """FTS5 search; ranks are bm25 scores, lower is better."""
+
+    def title_hits(self, keyset: bool) -> str:
+        """Return the hits CTE for a title search."""
+        # Pages are keyed on the FTS5 rank (bm25) and rowid of the last hit, so
+        # deeper pages never make SQLite produce and discard the earlier matches.
+        after = "and (rank, rowid) > (:after_0, :after_1)" if keyset else ""
+        return f"""\
+hits as (
+    select rowid, rank from fts_book
+    where fts_book = :title {after}
+    order by rank, rowid limit :limit
+)"""  # noqa: S608
+
+    def author_hits(self, keyset: bool) -> str:
+        """Return the hits CTE for an author search."""
+        # fts_author has a rank column of its own, so HAVING spells out the aggregate.
+        after = "having (min(fts_author.rank), author_book.book_id) > (:after_0, :after_1)" if keyset else ""
+        return f"""\
+hits as (
+    select author_book.book_id as rowid, min(fts_author.rank) as rank
+    from fts_author
+    join author_book on author_book.author_id = fts_author.id
+    where fts_author = :author
+    group by author_book.book_id {after}
+    order by rank, rowid limit :limit
+)"""  # noqa: S608
+
+    def typeahead_terms(self, match: Match, words: list[str]) -> str | None:
+        """Return an FTS5 query: all words, all prefixes, or some trigram of every word."""
+        if match is Match.WORD:
+            terms = [f'"{word}"' for word in words]
+        elif match is Match.PREFIX:
+            terms = [f'"{word}"*' for word in words if len(word) >= MIN_PREFIX]
+        else:
+            grams = [" OR ".join(f'"{gram}"' for gram in trigrams(word)) for word in words if len(word) >= 3]
+            terms = [f"({any_gram})" for any_gram in grams]
+        return " AND ".join(terms) or None
+
+    def typeahead_query(self, field: str, match: Match) -> TextClause:
+        """Return the type-ahead candidates query."""
+        table = f"fts_{'book' if field == 'title' else 'author'}{'_trigram' if match is Match.TRIGRAM else ''}"
+        # The rank of the trigram tables is bm25 over trigrams, so sharing more of them ranks better.
+        matches = f"""\
+with scanned as (
+    select rowid as id, rank from {table} where {table} = :query limit :scan
+),
+matches as (
+    select id, rank from scanned order by rank limit :candidates
+)"""  # noqa: S608
+        if field == "title":
+            return text(f"{matches}\nselect id from matches order by rank")
+        return text(f"""\
+{matches}
+select author_book.book_id from matches
+join author_book on author_book.author_id = matches.id
+order by matches.rank
+limit :candidates""")
+
+
+class PostgresSearch(SearchBackend):
+    """tsvector search; ranks are negated ts_rank scores, so lower is better here too."""
+
+    @staticmethod
+    def _match(column: str, param: str) -> tuple[str, str]:
+        vector = f"to_tsvector('{POSTGRES_CONFIG}', {column})"
+        query = f"plainto_tsquery('{POSTGRES_CONFIG}', :{param})"
+        # ts_rank returns real; as double precision it round-trips exactly through a cursor.
+        return f"{vector} @@ {query}", f"-ts_rank({vector}, {query})::float8"
+
+    def title_hits(self, keyset: bool) -> str:
+        """Return the hits CTE for a title search."""
+        match, rank = self._match("title", "title")
+        after = "where (rank, rowid) > (:after_0, :after_1)" if keyset else ""
+        return f"""\
+matches as (
+    select id as rowid, {rank} as rank from book where {match}
+),
+hits as (
+    select rowid, rank from matches
+    {after}
+    order by rank, rowid limit :limit
+)"""  # noqa: S608
+
+    def author_hits(self, keyset: bool) -> str:
+        """Return the hits CTE for an author search."""
+        match, rank = self._match("name", "author")
+        after = "where (rank, rowid) > (:after_0, :after_1)" if keyset else ""
+        return f"""\
+matches as (
+    select author_book.book_id as rowid, min({rank}) as rank
+    from author
+    join author_book on author_book.author_id = author.id
+    where {match}
+    group by author_book.book_id
+),
+hits as (
+    select rowid, rank from matches
+    {after}
+    order by rank, rowid limit :limit
+)"""  # noqa: S608
+
+    def typeahead_terms(self, match: Match, words: list[str]) -> str | None:
+        """Return a tsquery of all words or all prefixes, or the words themselves for pg_trgm."""
+        if match is Match.WORD:
+            return " & ".join(words) or None
+        if match is Match.PREFIX:
+            return " & ".join(f"{word}:*" for word in words if len(word) >= MIN_PREFIX) or None
+        return " ".join(words) if any(len(word) >= 3 for word in words) else None
+
+    def typeahead_query(self, field: str, match: Match) -> TextClause:
+        """Return the type-ahead candidates query."""
+        table, column = ("book", "title") if field == "title" else ("author", "name")
+        if match is Match.TRIGRAM:
+            condition, rank = f"{column} % :query", f"-similarity({column}, :query)"
+        else:
+            vector = f"to_tsvector('{POSTGRES_CONFIG}', {column})"
+            query = f"to_tsquery('{POSTGRES_CONFIG}', :query)"
+            condition, rank = f"{vector} @@ {query}", f"-ts_rank({vector}, {query})"
+        matches = f"""\
+with scanned as (
+    select id, {rank} as rank from {table} where {condition} limit :scan
+),
+matches as (
+    select id, rank from scanned order by rank limit :candidates
+)"""  # noqa: S608
+        if field == "title":
+            return text(f"{matches}\nselect id from matches order by rank")
+        return text(f"""\
+{matches}
+select author_book.book_id from matches
+join author_book on author_book.author_id = matches.id
+order by matches.rank
+limit :candidates""")
+
+
+BACKENDS: dict[str, SearchBackend] = {"sqlite": Fts5Search(), "postgresql": PostgresSearch()}
+
+
+def search_backend(db: AsyncSession) -> SearchBackend:
+    """Return the search backend for the database `db` is bound to."""
+    dialect = db.get_bind().dialect.name
+    try:
+        return BACKENDS[dialect]
+    except KeyError:
+        raise ValueError(f"Full-text search is not supported on {dialect}.") from None
+
+
+# Pages of search results, as book ids, and their next cursors, keyed by (mode,
+# field, query, cursor, limit, catalog version). Entries for older versions are
+# never asked for again and age out.
+search_cache: LRUCache[tuple, tuple[list[int], str | None]] = LRUCache(maxsize=settings.search_cache_size)
+
+
+def fold(value: str) -> str:
+    """Lowercase and strip diacritics, as the FTS5 unicode61 tokenizer does."""
+    value = value.lower()
+    if value.isascii():
+        return value
+    return "".join(c for c in unicodedata.normalize("NFKD", value) if not unicodedata.combining(c))
+
+
+def words(value: str) -> list[str]:
+    """Split text into folded words, on anything not a letter or digit."""
+    return re.findall(r"[^\W_]+", fold(value))
+
+
+def trigrams(word: str) -> list[str]:
+    """Return the three-character substrings of a word, in order."""
+    return [word[i : i + 3] for i in range(len(word) - 2)]
+
+
+# Catalog words repeat a lot, so their trigrams and similarities are worth keeping.
+@functools.lru_cache(maxsize=65_536)
+def _padded_trigrams(word: str) -> frozenset[str]:
+    # Padded as pg_trgm pads them, so the ends of words count.
+    return frozenset(trigrams(f"  {word} "))
+
+
+@functools.lru_cache(maxsize=65_536)
+def _similarity(query_word: str, word: str) -> float:
+    query_grams, word_grams = _padded_trigrams(query_word), _padded_trigrams(word)
+    shared = len(query_grams & word_grams)
+    return shared / (len(query_grams) + len(word_grams) - shared)
+
+
+def _word_score(query_word: str, text_words: list[str]) -> float:
+    if query_word in text_words:
+        return 1.0
+    # A prefix scores 0.6 to 0.9, higher the more of the word is typed.
+    prefixed = [len(word) for word in text_words if word.startswith(query_word)]
+    if prefixed:
+        return 0.6 + 0.3 * len(query_word) / min(prefixed)
+    # Anything else only by similarity, and below any prefix.
+    similarity = max((_similarity(query_word, word) for word in text_words), default=0.0)
+    return 0.6 * similarity if similarity >= MIN_SIMILARITY else 0.0
+
+
+def typeahead_score(query_words: list[str], text: str) -> float:
+    """
+    Score how well a title or author name matches type-ahead input, from 0 to 1.
+
+    Each query word scores 1 for an equal word in the text, 0.6 to 0.9 for a
+    word it is a prefix of, and less for a word it shares enough trigrams
+    with (as pg_trgm's similarity counts them); the score is their mean.
+    """
+    text_words = words(text)
+    return sum(_word_score(word, text_words) for word in query_words) / len(query_words)
+
+
+async def typeahead(db: AsyncSession, field: str, query: str, limit: int, version: int | None) -> list[int]:
+    """
+    Return the ids of the books best matching partial or misspelled input, best first.
+
+    Whole-word and prefix candidates are always collected; trigram ones only
+    if those number fewer than `limit`. `version` is the current catalog
+    version, for book_records.
+    """
+    query_words = words(query)
+    if not query_words:
+        return []
+    backend = search_backend(db)
+    candidates: dict[int, None] = {}
+    for match in Match:
+        if match is Match.TRIGRAM and len(candidates) >= limit:
+            break
+        terms = backend.typeahead_terms(match, query_words)
+        if terms is None:
+            continue
+        params = {"query": terms, "candidates": TYPEAHEAD_CANDIDATES, "scan": TYPEAHEAD_SCAN}
+        candidates.update(dict.fromkeys((await db.execute(backend.typeahead_query(field, match), params)).scalars()))
+
+    records = await book_records(db, list(candidates), version)
+    scored = []
+    for record in records.values():
+        texts = [record.title] if field == "title" else [name for _, name in record.authors]
+        score, text = max(((typeahead_score(query_words, text), text) for text in texts), default=(0.0, ""))
+        if score > 0:
+            scored.append((-score, len(text), record.id))
+    return [book_id for _, _, book_id in sorted(scored)[:limit]]
@@ -1,11 +1,44 @@
-from fastapi import FastAPI
-from starlette.middleware.sessions import SessionMiddleware
+import logging
 
-from openbook.auth import session_secret_key
+from fastapi import Depends, FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from openbook.constants import settings
+from openbook.database import SessionLocal
 from openbook.endpoints import routers
+from openbook.metrics import MetricsMiddleware
+from openbook.profiling import ProfilingMiddleware, check_profile_access
+from openbook.recommend.service import recommender, similar_books
+from openbook.sessions import KeyRingSessionMiddleware, session_secret_keys
 
-app = FastAPI(title="BookClub")
-app.add_middleware(SessionMiddleware, secret_key=session_secret_key, https_only=True)
+# Nothing of profiling is installed unless it is enabled, so it costs nothing otherwise.
+app = FastAPI(title="BookClub", dependencies=[Depends(check_profile_access)] if settings.profiling_enabled else None)
+app.add_middleware(KeyRingSessionMiddleware, secret_keys=session_secret_keys(), https_only=True)
+if settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware)
+if settings.metrics_enabled:
+    # Added last, so it is outermost and times the whole request.
+    app.add_middleware(MetricsMiddleware)
 
 for router in routers:
     app.include_router(router)
+
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_up(sessionmaker: async_sessionmaker[AsyncSession] = SessionLocal) -> None:
+    """
+    Build the recommendation model and similar-books index and map the ALS factors now rather than on first use.
+
+    A preforking server calls this before forking, so the workers share the
+    result copy-on-write instead of each building its own.
+    """
+    try:
+        async with sessionmaker() as db:
+            await recommender.load(db)
+            await similar_books.get_index(db)
+        recommender.factors()
+    except Exception:
+        # A worker builds whatever is missing on first use, as without warm-up.
+        logger.exception("Warm-up failed")
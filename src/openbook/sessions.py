@@ -0,0 +1,43 @@
+import logging
+import secrets
+from collections.abc import Sequence
+from typing import Any
+
+import itsdangerous
+from starlette.middleware.sessions import SessionMiddleware
+from starlette.types import ASGIApp
+
+from openbook.constants import Settings, settings
+
+logger = logging.getLogger(__name__)
+
+
+def session_secret_keys(config: Settings = settings) -> list[str]:
+    """
+    Return the configured session signing keys, newest first.
+
+    Without any, a random key is made up, so sessions only survive within this
+    one process.
+    """
+    if config.session_secret_keys:
+        return list(config.session_secret_keys)
+    logger.warning("SESSION_SECRET_KEYS is not set; sessions will not be shared with other workers.")
+    return [secrets.token_hex(32)]
+
+
+class KeyRingSessionMiddleware(SessionMiddleware):
+    """
+    Starlette's SessionMiddleware, signing with the first of several keys and accepting any of them.
+
+    Every worker and node given the same keys reads every other's cookies. To
+    rotate, put a new key in front; cookies signed with the old one stay valid
+    and are re-signed with the new one on the next response that sets them, so
+    the old key can be dropped once the session max_age has passed.
+    """
+
+    def __init__(self, app: ASGIApp, secret_keys: Sequence[str], **kwargs: Any) -> None:
+        if not secret_keys:
+            raise ValueError("At least one session secret key is required.")
+        super().__init__(app, secret_key=secret_keys[0], **kwargs)
+        # itsdangerous signs with the last key of the list and verifies with all of them.
+        self.signer = itsdangerous.TimestampSigner(list(reversed(secret_keys)))
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+import pytest
+from openbook.server import app
+from sqlalchemy import create_engine
+
+from alembic import command
+from alembic.config import Config
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def dependency_overrides():
+    """The app's dependency overrides, put back as they were once the test is done."""
+    previous = dict(app.dependency_overrides)
+    yield app.dependency_overrides
+    app.dependency_overrides.clear()
+    app.dependency_overrides.update(previous)
+
+
+@pytest.fixture
+def migrated_db(tmp_path):
+    """The path of a SQLite database built by the Alembic migrations, so the FTS5 tables and triggers exist."""
+    path = tmp_path / "migrated.db"
+    engine = create_engine(f"sqlite:///{path}")
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "alembic"))
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+    engine.dispose()
+    return path
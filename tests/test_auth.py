@@ -0,0 +1,168 @@
+import asyncio
+import time
+
+import pytest
+from authlib.jose import JsonWebKey, jwt
+from openbook import auth
+from openbook.constants import settings
+from openbook.exceptions import UnauthenticatedError
+from openbook.jwks import FetchResult, JWKSCache, parse_max_age
+from openbook.models.orm import User
+from openbook.sessions import KeyRingSessionMiddleware
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+ISSUER = "https://idp.example.com"
+DISCOVERY_URL = f"{ISSUER}/.well-known/openid-configuration"
+JWKS_URL = f"{ISSUER}/jwks"
+
+
+class FakeIdentityProvider:
+    """Local stand-in for the OpenID provider that counts document fetches."""
+
+    def __init__(self, max_age=3600):
+        self.max_age = max_age
+        self.fetches = {DISCOVERY_URL: 0, JWKS_URL: 0}
+        self.keys = [self._new_key("key-1")]
+
+    @staticmethod
+    def _new_key(kid):
+        return JsonWebKey.generate_key("RSA", 2048, options={"kid": kid}, is_private=True)
+
+    def rotate(self, kid):
+        self.keys.append(self._new_key(kid))
+
+    async def fetch(self, url):
+        self.fetches[url] += 1
+        if url == DISCOVERY_URL:
+            return FetchResult(data={"issuer": ISSUER, "jwks_uri": JWKS_URL}, max_age=self.max_age)
+        return FetchResult(data={"keys": [key.as_dict() for key in self.keys]}, max_age=self.max_age)
+
+    def issue(self, sub="user-1", key=None):
+        key = key or self.keys[-1]
+        claims = {"iss": ISSUER, "aud": settings.oauth_client_id, "sub": sub, "exp": int(time.time()) + 3600}
+        return jwt.encode({"alg": "RS256", "kid": key.kid}, claims, key).decode()
+
+
+class CountingSession:
+    """Stands in for the database session and counts user lookups."""
+
+    def __init__(self):
+        self.lookups = 0
+
+    async def scalar(self, _stmt):
+        self.lookups += 1
+        return User(id="user-1", email="reader@example.com", name="Reader")
+
+
+@pytest.fixture
+def idp(monkeypatch):
+    provider = FakeIdentityProvider()
+    monkeypatch.setattr(auth, "jwks_cache", JWKSCache(DISCOVERY_URL, fetcher=provider.fetch))
+    auth.token_cache.clear()
+    return provider
+
+
+def test_verify_token_fetches_documents_once(idp):
+    token = idp.issue()
+
+    async def verify_many():
+        for _ in range(20):
+            claims = await auth.verify_token(token)
+            assert claims["sub"] == "user-1"
+
+    asyncio.run(verify_many())
+    assert idp.fetches == {DISCOVERY_URL: 1, JWKS_URL: 1}
+
+
+def test_unknown_kid_refetches_once(idp):
+    asyncio.run(auth.verify_token(idp.issue()))
+
+    idp.rotate("key-2")
+    rotated = idp.issue()
+    assert asyncio.run(auth.verify_token(rotated))["sub"] == "user-1"
+    assert idp.fetches[JWKS_URL] == 2
+
+    # Unknown key ids only force a refetch once per interval, so forged tokens cannot hammer the provider.
+    forged = idp.issue(key=FakeIdentityProvider._new_key("key-forged"))
+    for _ in range(5):
+        with pytest.raises(UnauthenticatedError):
+            asyncio.run(auth.verify_token(forged))
+    assert idp.fetches[JWKS_URL] == 2
+
+
+def test_expired_documents_are_refetched(idp):
+    cache = JWKSCache(DISCOVERY_URL, fetcher=idp.fetch, min_ttl=0)
+    idp.max_age = 0
+
+    async def fetch_twice():
+        await cache.metadata()
+        await cache.metadata()
+
+    asyncio.run(fetch_twice())
+    assert idp.fetches[DISCOVERY_URL] == 2
+
+
+def test_verify_user_caches_verified_tokens(idp, monkeypatch):
+    token = idp.issue()
+    request = Request({"type": "http", "session": {"id_token": token}})
+    db = CountingSession()
+    decodes = 0
+    decode = auth.jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        nonlocal decodes
+        decodes += 1
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth.jwt, "decode", counting_decode)
+
+    for _ in range(10):
+        user = asyncio.run(auth.verify_user(request, db))
+        assert (user.id, user.name) == ("user-1", "Reader")
+    assert (decodes, db.lookups) == (1, 1)
+
+    auth.forget_token(token)
+    asyncio.run(auth.verify_user(request, db))
+    assert (decodes, db.lookups) == (2, 2)
+
+
+def test_parse_max_age():
+    assert parse_max_age("public, max-age=21600, must-revalidate") == 21600
+    assert parse_max_age("no-store") == 0
+    assert parse_max_age("private") is None
+    assert parse_max_age(None) is None
+
+
+def session_app(keys):
+    async def set_session(request):
+        request.session["user"] = request.query_params["user"]
+        return JSONResponse(None)
+
+    async def get_session(request):
+        return JSONResponse(request.session.get("user"))
+
+    app = Starlette(routes=[Route("/set", set_session), Route("/get", get_session)])
+    app.add_middleware(KeyRingSessionMiddleware, secret_keys=keys)
+    return app
+
+
+def test_session_keys_are_shared_and_rotate():
+    with TestClient(session_app(["old"])) as old_worker:
+        cookie = old_worker.get("/set", params={"user": "reader"}).cookies["session"]
+
+    # Any worker with the same key reads the cookie, and a rotated one still accepts it.
+    for keys in (["old"], ["new", "old"]):
+        with TestClient(session_app(keys), cookies={"session": cookie}) as worker:
+            assert worker.get("/get").json() == "reader"
+
+    # The rotated worker signs with the new key, which workers still on the old one reject.
+    with TestClient(session_app(["new", "old"]), cookies={"session": cookie}) as rotated:
+        resigned = rotated.get("/set", params={"user": "writer"}).cookies["session"]
+    with TestClient(session_app(["new"]), cookies={"session": resigned}) as worker:
+        assert worker.get("/get").json() == "writer"
+    with TestClient(session_app(["old"]), cookies={"session": resigned}) as worker:
+        assert worker.get("/get").json() is None
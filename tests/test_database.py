@@ -1,10 +1,24 @@
+import asyncio
+import os
+import signal
+import threading
+import traceback
+from types import SimpleNamespace
+
 import pytest
 from fastapi.testclient import TestClient
 from openbook.auth import verify_user
-from openbook.database import get_db
-from openbook.models.orm import Author, AuthorBook, Base, Book, BookStatus, User, UserBook
-from openbook.server import app  # Assuming this is where the FastAPI app is created
-from sqlalchemy import create_engine
+from openbook.constants import Settings, settings
+from openbook.database import WriteQueue, create_database_engine, get_db, get_writer, upsert
+from openbook.metrics import RequestStats, request_stats
+from openbook.models.orm import Author, AuthorBook, Base, Book, BookStatus, User, UserBook, catalog_version
+from openbook.models.schemas import BookPage
+from openbook.recommend.service import recommender, similar_books
+from openbook.server import app, warm_up  # Assuming this is where the FastAPI app is created
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 # SQLite database URL for testing
@@ -12,14 +26,15 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", connect_args={"check_same_thread": False})
+AsyncTestingSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+test_writer = WriteQueue(AsyncTestingSessionLocal)
+
 
 # Override the database dependency for FastAPI
-def override_get_db():
-    db = TestingSessionLocal()
-    try:
+async def override_get_db():
+    async with AsyncTestingSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 def verify_user_override() -> User:
@@ -27,6 +42,7 @@ def verify_user_override() -> User:
 
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_writer] = lambda: test_writer
 app.dependency_overrides[verify_user] = verify_user_override
 
 
@@ -90,7 +106,7 @@ def test_get_books(setup_database):
 
     # Assert the response
     assert response.status_code == 200
-    assert len(response.json()) == 3  # We added 3 books for the user
+    assert len(response.json()["books"]) == 3  # We added 3 books for the user
 
     # The expected response should include books with authors and their status
     expected_books = [
@@ -108,7 +124,7 @@ def test_get_books(setup_database):
         for i, book in enumerate(books)
     ]
 
-    assert response.json() == expected_books
+    assert response.json() == {"books": expected_books, "next_cursor": None}
 
 
 def test_get_completed_books(setup_database):
@@ -164,7 +180,7 @@ def test_get_completed_books(setup_database):
     response = client.get(f"/books/completed?user_id={user.id}")
 
     assert response.status_code == 200
-    assert len(response.json()) == 2
+    assert len(response.json()["books"]) == 2
 
     expected_books = [
         {
@@ -182,7 +198,7 @@ def test_get_completed_books(setup_database):
         if i != 1
     ]
 
-    assert response.json() == expected_books
+    assert response.json() == {"books": expected_books, "next_cursor": None}
 
 
 def test_add_completed_book(setup_database):
@@ -212,6 +228,41 @@ def test_add_completed_book(setup_database):
     assert user_book.status == BookStatus.COMPLETED
 
 
+def test_update_books_batch(setup_database):
+    """
+    Test the POST /books/batch route upserts valid entries in one go and reports on each.
+    """
+    db = TestingSessionLocal()
+    user = User(id="", email="testuser@example.com", name="Test User")
+    books = [Book(title=f"Test Book {i}", isbn=f"isbn-{i}") for i in range(3)]
+    db.add_all([user, *books])
+    db.commit()
+    db.add(UserBook(user_id=user.id, book_id=books[0].id, status=BookStatus.READING))
+    db.commit()
+
+    response = client.post(
+        "/books/batch",
+        json=[
+            {"id": books[0].id, "status": "completed"},
+            {"id": books[1].id, "status": "completed"},
+            {"id": books[1].id, "status": "reading"},
+            {"id": books[2].id, "status": "recommended"},
+            {"id": 999, "status": "reading"},
+        ],
+    )
+
+    assert response.status_code == 200
+    assert [(item["ok"], item["detail"]) for item in response.json()] == [
+        (True, None),
+        (False, "Superseded by a later entry for the same book."),
+        (True, None),
+        (False, "Only reading and completed can be set."),
+        (False, "Book not found."),
+    ]
+    shelf = {user_book.book_id: user_book.status for user_book in db.query(UserBook).filter_by(user_id=user.id)}
+    assert shelf == {books[0].id: BookStatus.COMPLETED, books[1].id: BookStatus.READING}
+
+
 def test_get_recommended_books(setup_database):
     """
     Test the GET /books/recommended route to ensure it retrieves all books for a given user.
@@ -265,7 +316,7 @@ def test_get_recommended_books(setup_database):
     response = client.get(f"/books/recommended?user_id={user.id}")
 
     assert response.status_code == 200
-    assert len(response.json()) == 2
+    assert len(response.json()["books"]) == 2
 
     expected_books = [
         {
@@ -283,7 +334,7 @@ def test_get_recommended_books(setup_database):
         if i != 1
     ]
 
-    assert response.json() == expected_books
+    assert response.json() == {"books": expected_books, "next_cursor": None}
 
 
 def test_get_reading_books(setup_database):
@@ -339,7 +390,7 @@ def test_get_reading_books(setup_database):
     response = client.get(f"/books/reading?user_id={user.id}")
 
     assert response.status_code == 200
-    assert len(response.json()) == 2
+    assert len(response.json()["books"]) == 2
 
     expected_books = [
         {
@@ -357,7 +408,7 @@ def test_get_reading_books(setup_database):
         if i != 1
     ]
 
-    assert response.json() == expected_books
+    assert response.json() == {"books": expected_books, "next_cursor": None}
 
 
 def test_add_reading_book(setup_database):
@@ -385,3 +436,505 @@ def test_add_reading_book(setup_database):
     user_book = db.query(UserBook).filter_by(user_id=user.id, book_id=book.id).first()
     assert user_book is not None
     assert user_book.status == BookStatus.READING
+
+
+def test_add_unknown_book(setup_database):
+    """
+    Test that putting a book that does not exist on a list is a 404 and writes nothing.
+    """
+    db = TestingSessionLocal()
+    user = User(id="", email="testuser@example.com", name="Test User")
+    db.add(user)
+    db.commit()
+
+    for path in ("/books/reading", "/books/completed"):
+        response = client.post(path, json={"id": 999})
+        assert response.status_code == 404
+        assert response.json() == {"detail": "Book not found."}
+    assert db.query(UserBook).count() == 0
+
+
+def test_get_books_query_count_is_constant(setup_database):
+    """
+    Test that listing a shelf costs the same number of queries however many books are on it.
+    """
+    db = TestingSessionLocal()
+    user = User(id="", email="testuser@example.com", name="Test User")
+    db.add(user)
+    db.commit()
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        counts = []
+        for shelf_size in (2, 20):
+            authors = [Author(name=f"Author {i}") for i in range(shelf_size)]
+            books = [Book(title=f"Book {shelf_size}-{i}", isbn=f"{shelf_size}-{i}") for i in range(shelf_size)]
+            db.add_all(authors + books)
+            db.commit()
+            # Every book is co-written by two authors and sits on the user's shelf.
+            db.add_all([UserBook(user_id=user.id, book_id=book.id) for book in books])
+            db.add_all(
+                [AuthorBook(book_id=book.id, author_id=authors[i].id) for i, book in enumerate(books)]
+                + [AuthorBook(book_id=book.id, author_id=authors[i - 1].id) for i, book in enumerate(books)]
+            )
+            db.commit()
+
+            statements.clear()
+            response = client.get("/books")
+            assert response.status_code == 200
+            assert all(len(book["authors"]) == 2 for book in response.json()["books"])
+            counts.append(len(statements))
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+
+    # The catalog version, the page of ids, then the books in one IN query.
+    assert counts[0] == counts[1] == 3
+
+
+def test_get_books_pagination(setup_database):
+    """
+    Test that following next_cursor walks the whole shelf exactly once, in (status, id) order.
+    """
+    db = TestingSessionLocal()
+    user = User(id="", email="testuser@example.com", name="Test User")
+    author = Author(name="Test Author")
+    books = [Book(title=f"Test Book {i}", isbn=f"isbn-{i}") for i in range(7)]
+    db.add_all([user, author, *books])
+    db.commit()
+    statuses = [BookStatus.READING, BookStatus.COMPLETED]
+    db.add_all([UserBook(user_id=user.id, book_id=book.id, status=statuses[i % 2]) for i, book in enumerate(books)])
+    db.add_all([AuthorBook(book_id=book.id, author_id=author.id) for book in books])
+    db.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 3} if cursor is None else {"limit": 3, "cursor": cursor}
+        response = client.get("/books", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["books"]) <= 3
+        seen.extend((book["status"], book["id"]) for book in page["books"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    # COMPLETED sorts before READING; within a status books come in id order.
+    assert [book_id for _, book_id in seen] == [b.id for i, b in enumerate(books) if i % 2] + [
+        b.id for i, b in enumerate(books) if not i % 2
+    ]
+
+    response = client.get("/books", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_book_responses_match_the_schemas(setup_database):
+    """
+    Test that book lists encoded without Pydantic have exactly the shape of the declared response models.
+    """
+    db = TestingSessionLocal()
+    user = User(id="", email="testuser@example.com", name="Test User")
+    authors = [Author(name="First Author"), Author(name="Second Author")]
+    book = Book(title="Test Book 1", isbn="1234567890")
+    db.add_all([user, *authors, book])
+    db.commit()
+    db.add_all([AuthorBook(book_id=book.id, author_id=author.id) for author in authors])
+    db.add(UserBook(user_id=user.id, book_id=book.id, status=BookStatus.READING))
+    db.commit()
+
+    response = client.get("/books")
+    assert response.headers["content-type"] == "application/json"
+    page = response.json()
+    assert BookPage.model_validate(page).model_dump(mode="json") == page
+    assert page["books"][0]["status"] == "reading"
+    assert len(page["books"][0]["authors"]) == 2
+
+    schema = app.openapi()["paths"]["/books"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert schema == {"$ref": "#/components/schemas/BookPage"}
+
+
+def test_shelf_etag_answers_304_until_the_shelf_changes(setup_database):
+    """
+    Test that a matching If-None-Match gets a 304 reading only the catalog version, until a write to the shelf or the
+    catalog changes the ETag.
+    """
+    db = TestingSessionLocal()
+    user = User(id="", email="testuser@example.com", name="Test User")
+    books = [Book(title="Test Book 1", isbn="1234567890"), Book(title="Test Book 2", isbn="0987654321")]
+    db.add_all([user, *books])
+    db.execute(catalog_version.insert().values(version=1))
+    db.commit()
+
+    response = client.get("/books/reading")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        response = client.get("/books/reading", headers={"If-None-Match": f'W/"other", {etag}'})
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert len(statements) == 1
+    assert "catalog_version" in statements[0]
+
+    assert client.post("/books/reading", json={"id": books[0].id}).status_code == 200
+    response = client.get("/books/reading", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert [book["id"] for book in response.json()["books"]] == [books[0].id]
+
+    etag = response.headers["etag"]
+    assert client.post("/books/batch", json=[{"id": books[1].id, "status": "completed"}]).status_code == 200
+    assert client.get("/books", headers={"If-None-Match": etag}).status_code == 200
+
+    response = client.get("/books")
+    etag = response.headers["etag"]
+    assert client.get("/books", headers={"If-None-Match": etag}).status_code == 304
+    db.execute(catalog_version.update().values(version=catalog_version.c.version + 1))
+    db.commit()
+    assert client.get("/books", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_get_recommendations(setup_database):
+    """
+    Test the GET /recommendations route recommends books co-read with the user's, excluding their shelf.
+    """
+    db = TestingSessionLocal()
+    user = User(id="", email="testuser@example.com", name="Test User")
+    other = User(id="other", email="other@example.com", name="Other User")
+    author = Author(name="Test Author")
+    books = [Book(title=f"Test Book {i}", isbn=f"isbn-{i}") for i in range(4)]
+    db.add_all([user, other, author, *books])
+    db.commit()
+    db.add_all([AuthorBook(book_id=book.id, author_id=author.id) for book in books])
+    db.add_all(
+        [
+            UserBook(user_id=user.id, book_id=books[0].id, status=BookStatus.COMPLETED),
+            UserBook(user_id=user.id, book_id=books[1].id, status=BookStatus.RECOMMENDED),
+            UserBook(user_id=other.id, book_id=books[0].id, status=BookStatus.COMPLETED),
+            UserBook(user_id=other.id, book_id=books[1].id, status=BookStatus.READING),
+            UserBook(user_id=other.id, book_id=books[2].id, status=BookStatus.READING),
+        ]
+    )
+    db.commit()
+    recommender.invalidate()
+
+    response = client.get("/recommendations")
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {
+            "id": books[2].id,
+            "isbn": books[2].isbn,
+            "title": books[2].title,
+            "authors": [{"id": author.id, "name": author.name, "books": []}],
+            "status": "unread",
+        }
+    ]
+    recommender.invalidate()
+
+
+def test_shelf_changes_update_recommendations(setup_database):
+    """
+    Test that adding a book to the reading list is reflected in recommendations without a rebuild.
+    """
+    db = TestingSessionLocal()
+    user = User(id="", email="testuser@example.com", name="Test User")
+    other = User(id="other", email="other@example.com", name="Other User")
+    books = [Book(title=f"Test Book {i}", isbn=f"isbn-{i}") for i in range(3)]
+    db.add_all([user, other, *books])
+    db.commit()
+    db.add_all(
+        [
+            UserBook(user_id=other.id, book_id=books[0].id, status=BookStatus.COMPLETED),
+            UserBook(user_id=other.id, book_id=books[1].id, status=BookStatus.COMPLETED),
+            UserBook(user_id=other.id, book_id=books[2].id, status=BookStatus.COMPLETED),
+        ]
+    )
+    db.commit()
+    recommender.invalidate()
+
+    assert client.get("/recommendations").json() == []
+    response = client.post("/books/reading", json={"id": books[0].id})
+    assert response.status_code == 200
+    recommender.flush()
+
+    response = client.get("/recommendations")
+    assert sorted(book["id"] for book in response.json()) == [books[1].id, books[2].id]
+    recommender.invalidate()
+
+
+def test_get_similar_books(setup_database):
+    """
+    Test the GET /books/{id}/similar route ranks books sharing title words and authors first, including new books.
+    """
+    db = TestingSessionLocal()
+    user = User(id="", email="testuser@example.com", name="Test User")
+    herbert, austen = Author(name="Frank Herbert"), Author(name="Jane Austen")
+    books = [
+        Book(title="Dune", isbn="isbn-0"),
+        Book(title="Dune Messiah", isbn="isbn-1"),
+        Book(title="Emma", isbn="isbn-2"),
+    ]
+    db.add_all([user, herbert, austen, *books])
+    db.commit()
+    db.add_all(
+        [
+            AuthorBook(book_id=books[0].id, author_id=herbert.id),
+            AuthorBook(book_id=books[1].id, author_id=herbert.id),
+            AuthorBook(book_id=books[2].id, author_id=austen.id),
+            UserBook(user_id=user.id, book_id=books[1].id, status=BookStatus.READING),
+        ]
+    )
+    db.commit()
+    similar_books.invalidate()
+
+    response = client.get(f"/books/{books[0].id}/similar")
+    assert response.status_code == 200
+    assert [(book["id"], book["status"]) for book in response.json()][:1] == [(books[1].id, "reading")]
+
+    # Books created after the index was built are picked up on the next request.
+    children = Book(title="Children of Dune", isbn="isbn-3")
+    db.add(children)
+    db.commit()
+    db.add(AuthorBook(book_id=children.id, author_id=herbert.id))
+    db.commit()
+    response = client.get(f"/books/{children.id}/similar", params={"limit": 2})
+    assert [book["id"] for book in response.json()] == [books[0].id, books[1].id]
+
+    assert client.get("/books/999/similar").status_code == 404
+    similar_books.invalidate()
+
+
+def test_sqlite_profile_is_applied_per_connection(tmp_path):
+    """
+    Test that connections get the configured SQLite pragmas, reads a read-only pool and writes a single connection.
+    """
+    url = f"sqlite:///{tmp_path / 'profile.db'}"
+    config = Settings(
+        sqlite_synchronous="OFF", sqlite_busy_timeout_ms=1234, sqlite_cache_size_kib=2048, database_pool_size=2
+    )
+    write_engine = create_database_engine(url, config)
+    read_engine = create_database_engine(url, config, read_only=True)
+    names = ("journal_mode", "synchronous", "busy_timeout", "foreign_keys", "temp_store", "cache_size")
+
+    async def pragmas():
+        async with write_engine.connect() as connection:
+            values = [(await connection.exec_driver_sql(f"PRAGMA {name}")).scalar_one() for name in names]
+        async with read_engine.connect() as connection:
+            with pytest.raises(OperationalError, match="readonly"):
+                await connection.exec_driver_sql("CREATE TABLE t (x)")
+        await write_engine.dispose()
+        await read_engine.dispose()
+        return values
+
+    assert asyncio.run(pragmas()) == ["wal", 0, 1234, 1, 2, -2048]
+    assert write_engine.pool.size() == 1
+    assert read_engine.pool.size() == 2
+
+
+def write_queue(path):
+    """A WriteQueue on a new database with table t, the engine, and a list that grows by one per commit."""
+    engine = create_database_engine(f"sqlite:///{path}")
+    queue = WriteQueue(async_sessionmaker(bind=engine))
+    commits = []
+    event.listen(engine.sync_engine, "commit", commits.append)
+    return queue, engine, commits
+
+
+def insert_row(x):
+    return lambda db: db.execute(text("INSERT INTO t (x) VALUES (:x)"), {"x": x})
+
+
+def test_write_queue_group_commits(tmp_path):
+    """
+    Test that writes submitted to the WriteQueue concurrently are committed together, in one transaction.
+    """
+    queue, engine, commits = write_queue(tmp_path / "queue.db")
+
+    async def run():
+        await queue.submit(lambda db: db.execute(text("CREATE TABLE t (x)")))
+        await asyncio.gather(*(queue.submit(insert_row(x)) for x in range(20)))
+        await engine.dispose()
+
+    asyncio.run(run())
+    # One commit for the table, one for all twenty concurrent inserts.
+    assert len(commits) == 2
+
+
+def test_write_queue_isolates_failures(tmp_path):
+    """
+    Test that a failing write in a group only fails its own submitter, and the others are retried and committed.
+    """
+    queue, engine, commits = write_queue(tmp_path / "queue.db")
+
+    async def run():
+        await queue.submit(lambda db: db.execute(text("CREATE TABLE t (x UNIQUE)")))
+        commits.clear()
+        results = await asyncio.gather(*(queue.submit(insert_row(x)) for x in [1, 2, 2, 3]), return_exceptions=True)
+        async with engine.connect() as connection:
+            rows = (await connection.exec_driver_sql("SELECT x FROM t ORDER BY x")).scalars().all()
+        await engine.dispose()
+        return results, rows
+
+    results, rows = asyncio.run(run())
+    # The group fails on the duplicate and is rolled back, then each write is retried on its own.
+    assert [isinstance(result, IntegrityError) for result in results] == [False, False, True, False]
+    assert rows == [1, 2, 3]
+    assert len(commits) == 3
+
+
+def test_write_queue_counts_writes_toward_their_submitters(tmp_path):
+    """
+    Test that the statements of queued writes count toward the request that submitted them, not the first one.
+    """
+    queue, engine, _ = write_queue(tmp_path / "queue.db")
+
+    async def request(values):
+        stats = RequestStats()
+        request_stats.set(stats)
+        for x in values:
+            await queue.submit(insert_row(x))
+        return stats
+
+    async def run():
+        await queue.submit(lambda db: db.execute(text("CREATE TABLE t (x)")))
+        results = await asyncio.gather(request([1]), request([2, 3, 4]))
+        await engine.dispose()
+        return results
+
+    first, second = asyncio.run(run())
+    assert (first.statements, second.statements) == (1, 3)
+    assert first.sql_seconds > 0 and second.sql_seconds > 0
+
+
+@pytest.mark.parametrize("dialect", [sqlite, postgresql], ids=["sqlite", "postgresql"])
+def test_upsert_is_built_for_the_session_dialect(dialect):
+    """
+    Test that upsert builds an ON CONFLICT update for both SQLite and PostgreSQL sessions.
+    """
+    db = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=dialect.dialect()))
+    rows = [{"user_id": "u", "book_id": 1, "status": BookStatus.READING}]
+    stmt = upsert(db, UserBook, rows, ["user_id", "book_id"], ["status"])
+    sql = str(stmt.compile(dialect=dialect.dialect()))
+    assert "ON CONFLICT (user_id, book_id) DO UPDATE SET status = excluded.status" in sql
+
+
+def run_forked(function):
+    """Run `function` in a child process and return its exit code, 1 if it raised."""
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            signal.alarm(10)
+            code = function() or 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status)
+
+
+def update_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "recommend-updates"]
+
+
+def test_warm_up_builds_models_that_keep_updating_after_fork(setup_database):
+    """
+    Test that the models warm_up builds before a fork keep taking shelf updates in the forked workers.
+    """
+    db = TestingSessionLocal()
+    user = User(id="", email="testuser@example.com", name="Test User")
+    books = [Book(title=f"Test Book {i}", isbn=f"isbn-{i}") for i in range(2)]
+    db.add_all([user, *books])
+    db.commit()
+    db.add(UserBook(user_id=user.id, book_id=books[0].id, status=BookStatus.COMPLETED))
+    db.commit()
+    recommender.invalidate()
+    similar_books.invalidate()
+
+    def worker():
+        # Each worker starts the thread applying updates to the model it inherited.
+        assert len(update_threads()) == 1
+        recommender.publish(user.id, books[1].id, BookStatus.READING)
+        recommender.flush()
+
+    def master():
+        # Only the threads of the forking one survive a fork, so this starts with none but the main thread.
+        sessions = async_sessionmaker(bind=create_async_engine("sqlite+aiosqlite:///./test.db"))
+        asyncio.run(warm_up(sessions))
+        assert recommender.model is not None
+        assert similar_books.index is not None
+        # No thread of the master's may hold the model's lock when it forks.
+        assert update_threads() == []
+        return run_forked(worker)
+
+    assert run_forked(master) == 0
+    recommender.invalidate()
+    similar_books.invalidate()
+
+
+def test_recommender_rebuilds_from_the_database(setup_database):
+    """
+    Test that the model is rebuilt from user_book, picking up changes made by other processes.
+    """
+    db = TestingSessionLocal()
+    user = User(id="", email="testuser@example.com", name="Test User")
+    other = User(id="other", email="other@example.com", name="Other User")
+    books = [Book(title=f"Test Book {i}", isbn=f"isbn-{i}") for i in range(3)]
+    db.add_all([user, other, *books])
+    db.commit()
+    db.add(UserBook(user_id=user.id, book_id=books[0].id, status=BookStatus.COMPLETED))
+    db.commit()
+    recommender.invalidate()
+    assert client.get("/recommendations").json() == []
+
+    # Written by another worker, so never published to this one's model.
+    db.add_all(
+        [
+            UserBook(user_id=other.id, book_id=books[0].id, status=BookStatus.COMPLETED),
+            UserBook(user_id=other.id, book_id=books[1].id, status=BookStatus.COMPLETED),
+        ]
+    )
+    db.commit()
+    assert client.get("/recommendations").json() == []
+
+    async def request_when_due():
+        recommender.rebuild_interval = 0
+        try:
+            async with AsyncTestingSessionLocal() as session:
+                await recommender.get_model(session)
+            # Let the rebuild the request started finish reading.
+            await asyncio.gather(*asyncio.all_tasks() - {asyncio.current_task()})
+        finally:
+            recommender.rebuild_interval = settings.recommend_rebuild_interval
+
+    asyncio.run(request_when_due())
+    recommender.flush()
+    assert [book["id"] for book in client.get("/recommendations").json()] == [books[1].id]
+
+    # Changes published while a rebuild reads the database are kept too.
+    async def rebuild_and_publish():
+        async with AsyncTestingSessionLocal() as session:
+            rebuilding = asyncio.create_task(recommender.rebuild(session))
+            await asyncio.sleep(0)
+            recommender.publish(other.id, books[2].id, BookStatus.READING)
+            await rebuilding
+
+    asyncio.run(rebuild_and_publish())
+    recommender.flush()
+    assert sorted(book["id"] for book in client.get("/recommendations").json()) == [books[1].id, books[2].id]
+    recommender.invalidate()
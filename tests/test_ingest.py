@@ -0,0 +1,119 @@
+import io
+import json
+
+import pytest
+from openbook import ingest as ingest_module
+from openbook.ingest import LOADED_TABLES, ingest, read_csv, read_jsonl, suspend_schema
+from sqlalchemy import create_engine
+
+
+@pytest.fixture
+def engine(migrated_db):
+    """An autocommit engine on a database built by the Alembic migrations."""
+    engine = create_engine(f"sqlite:///{migrated_db}", isolation_level="AUTOCOMMIT")
+    yield engine
+    engine.dispose()
+
+
+def jsonl(*editions):
+    return io.StringIO("".join(json.dumps(edition) + "\n" for edition in editions))
+
+
+def schema(engine):
+    with engine.connect() as connection:
+        return connection.exec_driver_sql(
+            "SELECT type, name FROM sqlite_master WHERE type IN ('trigger', 'index') ORDER BY name"
+        ).all()
+
+
+def query(engine, sql):
+    with engine.connect() as connection:
+        return connection.exec_driver_sql(sql).all()
+
+
+EDITIONS = [
+    {"title": "A Wizard of Earthsea", "isbn_13": ["978-0-553-38304-2"], "authors": [{"name": "Ursula K. Le Guin"}]},
+    {"title": "The Dispossessed", "isbn": "9780061054884", "authors": ["ursula k.  le guin"]},
+    {"title": "A Wizard of Earthsea (again)", "isbn_10": ["9780553383042"], "authors": ["Ursula K. Le Guin"]},
+    {"title": "Good Omens", "isbn": "9780060853983", "authors": ["Terry Pratchett", "Neil Gaiman"]},
+    {"title": "", "isbn": "9780000000000", "authors": ["Nobody"]},
+]
+
+
+def test_ingest_dedupes_and_rebuilds_search(engine):
+    before = schema(engine)
+
+    stats = ingest(engine, read_jsonl(jsonl(*EDITIONS)), batch_size=2)
+
+    assert (stats.read, stats.books, stats.authors, stats.skipped) == (5, 3, 3, 2)
+    assert query(engine, "SELECT isbn, title FROM book ORDER BY id") == [
+        ("9780553383042", "A Wizard of Earthsea"),
+        ("9780061054884", "The Dispossessed"),
+        ("9780060853983", "Good Omens"),
+    ]
+    assert query(engine, "SELECT name FROM author ORDER BY id") == [
+        ("Ursula K. Le Guin",),
+        ("Terry Pratchett",),
+        ("Neil Gaiman",),
+    ]
+    assert len(query(engine, "SELECT * FROM author_book")) == 4
+    assert query(engine, "SELECT title FROM fts_book WHERE fts_book MATCH 'wizard'") == [("A Wizard of Earthsea",)]
+    assert query(engine, "SELECT name FROM fts_author WHERE fts_author MATCH 'gaiman'") == [("Neil Gaiman",)]
+    assert schema(engine) == before
+    assert query(engine, "SELECT * FROM suspended_schema") == []
+
+    # The triggers are back, so ordinary inserts are searchable again.
+    with engine.connect() as connection:
+        connection.exec_driver_sql("INSERT INTO book (isbn, title) VALUES ('x', 'Tehanu')")
+    assert query(engine, "SELECT title FROM fts_book WHERE fts_book MATCH 'tehanu'") == [("Tehanu",)]
+
+    # Loading the same dump again adds nothing.
+    stats = ingest(engine, read_jsonl(jsonl(*EDITIONS)))
+    assert (stats.books, stats.authors, stats.skipped) == (0, 0, 5)
+
+
+def test_ingest_restores_schema_after_failed_load(engine):
+    before = schema(engine)
+
+    def records():
+        yield from read_jsonl(jsonl(EDITIONS[0]))
+        raise ValueError("truncated dump")
+
+    with pytest.raises(ValueError, match="truncated dump"):
+        ingest(engine, records(), batch_size=1)
+    assert schema(engine) == before
+    assert query(engine, "SELECT title FROM fts_book WHERE fts_book MATCH 'wizard'") == [("A Wizard of Earthsea",)]
+
+    # A load killed outright leaves the definitions behind; the next load puts them back.
+    with engine.connect() as connection:
+        connection.exec_driver_sql("BEGIN")
+        suspend_schema(connection, LOADED_TABLES)
+        connection.exec_driver_sql("COMMIT")
+    assert schema(engine) != before
+    ingest(engine, [])
+    assert schema(engine) == before
+
+
+def test_read_csv():
+    stream = io.StringIO('isbn,title,authors\n0-441-17271-7,Dune,"Frank  Herbert"\n1,"Two, Authors",A;B\n')
+    assert [tuple(record) for record in read_csv(stream)] == [
+        ("0441172717", "Dune", ["Frank Herbert"]),
+        ("1", "Two, Authors", ["A", "B"]),
+    ]
+
+
+def test_read_jsonl_in_parallel_reads_a_bounded_number_of_chunks_ahead(monkeypatch):
+    monkeypatch.setattr(ingest_module, "PARSE_CHUNK", 10)
+    read = 0
+
+    def lines():
+        nonlocal read
+        for i in range(1000):
+            read += 1
+            yield json.dumps({"title": f"Book {i}", "isbn": str(i), "authors": ["A"]}) + "\n"
+
+    records = read_jsonl(lines(), workers=2)
+    assert next(records).title == "Book 0"
+    # The first chunk's result, plus the chunks queued for the two workers.
+    assert read <= 10 * (1 + ingest_module.CHUNKS_PER_WORKER * 2) + 1
+    assert [record.isbn for record in records] == [str(i) for i in range(1, 1000)]
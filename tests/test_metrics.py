@@ -0,0 +1,84 @@
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from openbook.auth import verify_user
+from openbook.constants import Settings
+from openbook.database import get_db
+from openbook.metrics import instrument_engine
+from openbook.models.orm import Base, User
+from openbook.server import app
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+client = TestClient(app)
+
+USER = User(id="metrics-user", email="metrics@example.com", name="Metrics User")
+
+
+@pytest.fixture
+def metrics_db(tmp_path, dependency_overrides):
+    """An instrumented database behind the app, with the test user logged in."""
+    path = tmp_path / "metrics.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    instrument_engine(async_engine)
+    sessions = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+    async def override_get_db():
+        async with sessions() as db:
+            yield db
+
+    dependency_overrides[get_db] = override_get_db
+    dependency_overrides[verify_user] = lambda: USER
+    yield
+    engine.dispose()
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_requests_are_timed_with_their_sql_and_encoding(metrics_db):
+    before = {
+        "requests": sample("openbook_request_duration_seconds_count", method="GET", route="/books", status="200"),
+        "statements": sample("openbook_request_sql_statements_sum", route="/books"),
+        "encodings": sample("openbook_serialization_seconds_count", route="/books"),
+    }
+
+    assert client.get("/books").status_code == 200
+
+    after = {
+        "requests": sample("openbook_request_duration_seconds_count", method="GET", route="/books", status="200"),
+        "statements": sample("openbook_request_sql_statements_sum", route="/books"),
+        "encodings": sample("openbook_serialization_seconds_count", route="/books"),
+    }
+    assert after["requests"] == before["requests"] + 1
+    # The catalog version and the (empty) page of book ids.
+    assert after["statements"] == before["statements"] + 2
+    assert after["encodings"] == before["encodings"] + 1
+
+    client.get("/no/such/route")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert 'openbook_request_duration_seconds_count{method="GET",route="/books",status="200"}' in response.text
+    assert 'route="unmatched"' in response.text
+
+
+def test_slow_queries_are_logged_over_the_threshold(caplog):
+    engine = create_engine("sqlite://")
+    instrument_engine(engine, Settings(slow_query_ms=1e-6))
+    quiet = create_engine("sqlite://")
+    instrument_engine(quiet, Settings(slow_query_ms=0))
+
+    with caplog.at_level(logging.WARNING, logger="openbook.metrics"):
+        with quiet.connect() as connection:
+            connection.execute(text("select 1"))
+        assert caplog.records == []
+        with engine.connect() as connection:
+            connection.execute(text("select :secret"), {"secret": "hunter2"})
+
+    assert any("select ?" in record.getMessage() for record in caplog.records)
+    assert not any("hunter2" in record.getMessage() for record in caplog.records)
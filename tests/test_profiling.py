@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from openbook import profiling
+from openbook.auth import verify_user
+from openbook.constants import settings
+from openbook.endpoints import admin
+from openbook.exceptions import UnauthenticatedError
+from openbook.models.orm import User
+from openbook.profiling import ProfilingMiddleware, check_profile_access, sample_stacks
+
+ADMIN = User(id="admin", email="admin@example.com", name="Admin")
+READER = User(id="reader", email="reader@example.com", name="Reader")
+
+
+def profiled_app(monkeypatch, user, lookups=None):
+    """
+    An app with profiling installed, as the server has it when PROFILING_ENABLED is set.
+
+    Each time check_profile_access looks the user up, the request's path is appended to `lookups`.
+    """
+    app = FastAPI(dependencies=[Depends(check_profile_access)])
+    app.add_middleware(ProfilingMiddleware)
+
+    @app.get("/work")
+    async def work() -> dict:
+        return {"total": sum(range(1000))}
+
+    app.include_router(admin.router)
+
+    def logged_in_user():
+        if user is None:
+            raise UnauthenticatedError
+        return user
+
+    async def profiling_user(request, db):
+        if lookups is not None:
+            lookups.append(request.url.path)
+        return user
+
+    monkeypatch.setattr(profiling, "optional_user", profiling_user)
+    app.dependency_overrides[verify_user] = logged_in_user
+    return app
+
+
+@pytest.fixture(autouse=True)
+def profiling_settings(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "profiling_enabled", True)
+    monkeypatch.setattr(settings, "admin_emails", [ADMIN.email])
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path))
+
+
+def test_admins_get_a_profile_instead_of_the_response(monkeypatch):
+    lookups = []
+    client = TestClient(profiled_app(monkeypatch, ADMIN, lookups))
+
+    response = client.get("/work", params={"profile": 1})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.text.startswith("GET /work -> 200 in ")
+    assert "cumulative" in response.text
+    assert client.get("/work").json() == {"total": 499500}
+    # Only the request asking for a profile looked the user up.
+    assert lookups == ["/work"]
+
+
+@pytest.mark.parametrize("user", [READER, None], ids=["reader", "anonymous"])
+def test_only_admins_may_profile(monkeypatch, user):
+    client = TestClient(profiled_app(monkeypatch, user))
+
+    assert client.get("/work", params={"profile": 1}).status_code == 403
+    assert client.get("/work").status_code == 200
+    assert client.post("/admin/profile/sample", params={"seconds": 0.01}).status_code in (401, 403)
+
+
+def test_sample_stacks_sees_what_a_thread_runs():
+    stop = threading.Event()
+
+    def busy_loop():
+        while not stop.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy_loop)
+    thread.start()
+    try:
+        stacks = sample_stacks(thread.ident, 0.1, 0.001)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert stacks
+    assert all("busy_loop" in stack for stack in stacks)
+    assert all(stack.index("run") < stack.index("busy_loop") for stack in stacks)
+
+
+def test_sampling_writes_a_collapsed_stack_file(monkeypatch, tmp_path):
+    client = TestClient(profiled_app(monkeypatch, ADMIN))
+
+    start = time.monotonic()
+    response = client.post("/admin/profile/sample", params={"seconds": 0.1})
+    assert time.monotonic() - start >= 0.1
+
+    assert response.status_code == 200
+    result = response.json()
+    lines = (tmp_path / result["path"].rsplit("/", 1)[1]).read_text().splitlines()
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == result["samples"] > 0
+
+    again = client.post("/admin/profile/sample", params={"seconds": 0.01}).json()
+    assert again["path"] != result["path"]
+    assert len(list(tmp_path.iterdir())) == 2
@@ -0,0 +1,154 @@
+import numpy as np
+from openbook.recommend import ann
+from openbook.recommend.als import FactorModel, train_als
+from openbook.recommend.ann import IVFIndex, build_ivf, embed_book
+from openbook.recommend.incremental import IncrementalSimilarity
+from openbook.recommend.similarity import build_item_similarity
+
+
+def brute_force_cosine(users, books):
+    user_ids = sorted(set(users))
+    book_ids = sorted(set(books))
+    x = np.zeros((len(user_ids), len(book_ids)))
+    for u, b in zip(users, books, strict=True):
+        x[user_ids.index(u), book_ids.index(b)] = 1
+    co = x.T @ x
+    norms = np.sqrt(np.diag(co))
+    sims = co / np.outer(norms, norms)
+    np.fill_diagonal(sims, 0)
+    return book_ids, sims
+
+
+def test_similarity_matches_brute_force():
+    rng = np.random.default_rng(0)
+    users = [f"u{u}" for u in rng.integers(0, 40, size=400)]
+    books = rng.integers(0, 60, size=400).tolist()
+    k = 5
+
+    # A tiny block budget forces the build through many blocks.
+    model = build_item_similarity(users, books, k=k, block_budget=50)
+    book_ids, sims = brute_force_cosine(users, books)
+
+    assert model.item_ids.tolist() == book_ids
+    for i in range(len(book_ids)):
+        expected = np.sort(sims[i])[::-1][:k]
+        expected = expected[expected > 0]
+        got = model.scores[i][model.neighbors[i] >= 0]
+        np.testing.assert_allclose(got, expected, rtol=1e-5)
+        np.testing.assert_allclose(sims[i, model.neighbors[i][: got.size]], got, rtol=1e-5)
+
+
+def test_recommend_aggregates_neighbours_and_excludes_shelf():
+    # Everyone who read 1 also read 2; one of them also read 3; 4 is unrelated.
+    users = ["a", "a", "b", "b", "b", "c"]
+    books = [1, 2, 1, 2, 3, 4]
+    model = build_item_similarity(users, books, k=10)
+
+    assert [book for book, _ in model.recommend(seeds=[1], exclude=[1], n=10)] == [2, 3]
+    assert [book for book, _ in model.recommend(seeds=[1], exclude=[1, 2], n=10)] == [3]
+    assert model.recommend(seeds=[99], exclude=[], n=10) == []
+
+
+def neighbour_scores(model, book_id):
+    row = model.index[book_id]
+    valid = model.neighbors[row] >= 0
+    return {
+        int(model.item_ids[c]): float(s)
+        for c, s in zip(model.neighbors[row][valid], model.scores[row][valid], strict=True)
+    }
+
+
+def test_incremental_updates_patch_neighbour_lists():
+    model = IncrementalSimilarity.from_interactions(["a", "a", "b"], [1, 2, 1], k=10)
+    assert neighbour_scores(model.model, 1) == {2: np.float32(1 / np.sqrt(2))}
+
+    # b starts reading 2: 1 and 2 now share both readers. 3 is new to the model.
+    model.apply("b", 2, positive=True)
+    model.apply("b", 3, positive=True)
+    assert neighbour_scores(model.model, 1)[2] == 1.0
+    assert neighbour_scores(model.model, 2)[1] == 1.0
+    assert [book for book, _ in model.recommend(seeds=[3], exclude=[3], n=10)] == [1, 2]
+
+    # Removing a book drops the pair from both lists.
+    model.apply("b", 3, positive=False)
+    assert 3 not in neighbour_scores(model.model, 1)
+    assert model.recommend(seeds=[3], exclude=[], n=10) == []
+
+
+def test_als_ranks_co_read_books_first(tmp_path):
+    # Two groups of readers with disjoint tastes; "a" has only read part of the first group's books.
+    users, books = ["a", "a"], [1, 2]
+    for i in range(5):
+        users += [f"x{i}"] * 3 + [f"y{i}"] * 3
+        books += [1, 2, 3, 10, 11, 12]
+    model = train_als(users, books, factors=4, iterations=10)
+
+    ranked = model.recommend("a", exclude=[1, 2], n=10)
+    assert [book for book, _ in ranked][0] == 3
+    assert {book for book, _ in ranked} == {3, 10, 11, 12}
+    assert model.recommend("a", exclude=[1, 2], n=1) == ranked[:1]
+    assert model.recommend("unknown", exclude=[], n=10) == []
+
+    model.save(tmp_path)
+    loaded = FactorModel.load(tmp_path)
+    assert isinstance(loaded.item_factors, np.memmap)
+    assert loaded.recommend("a", exclude=[1, 2], n=10) == ranked
+
+
+def test_embed_book_is_stable_and_matches_shared_words():
+    dune = embed_book("Dune", ["Frank Herbert"])
+    assert np.array_equal(dune, embed_book("dune!", ["FRANK HERBERT"]))
+    assert np.isclose(np.linalg.norm(dune), 1.0)
+    assert dune @ embed_book("Dune Messiah", ["Frank Herbert"]) > dune @ embed_book("Emma", ["Jane Austen"])
+
+
+def test_ivf_index_recall_inserts_and_mmap(tmp_path):
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((20, 16))
+    vectors = centres[rng.integers(0, 20, size=2000)] + 0.3 * rng.standard_normal((2000, 16))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    ids = np.arange(1, 2001)
+    index = build_ivf(ids[:1500], vectors[:1500], lists=40, nprobe=8)
+    for book_id, vector in zip(ids[1500:], vectors[1500:], strict=True):
+        index.add(int(book_id), vector)
+    assert len(index) == 2000
+    assert index.max_id == 2000
+
+    hits = 0
+    for query in range(0, 2000, 50):
+        expected = set(ids[np.argsort(-(vectors @ vectors[query]))[1:11]].tolist())
+        got = {book_id for book_id, _ in index.similar(int(ids[query]), n=10)}
+        hits += len(expected & got)
+    assert hits / 400 > 0.9
+
+    before = index.similar(1990, n=10)
+    index.save(tmp_path)
+    loaded = IVFIndex.load(tmp_path, nprobe=8)
+    assert isinstance(loaded.vectors, np.memmap)
+    after = loaded.similar(1990, n=10)
+    assert [book_id for book_id, _ in after] == [book_id for book_id, _ in before]
+    np.testing.assert_allclose([score for _, score in after], [score for _, score in before], rtol=1e-5)
+
+
+def test_ivf_index_extended_copies_and_merges_past_threshold(monkeypatch):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((300, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = np.arange(1, 301)
+    # Probing every list makes searches exact.
+    index = build_ivf(ids[:100], vectors[:100], lists=10, nprobe=10)
+    monkeypatch.setattr(ann, "MERGE_THRESHOLD", 150)
+
+    buffered = index.extended(ids[100:200], vectors[100:200])
+    assert len(index) == 100
+    assert len(buffered) == 200
+    assert len(buffered.added_ids) == 100
+    assert buffered.ids is index.ids
+
+    merged = buffered.extended(ids[200:], vectors[200:])
+    assert len(buffered) == 200
+    assert len(merged) == 300
+    assert merged.added_ids == []
+    assert merged.max_id == 300
+    expected = ids[np.argsort(-(vectors @ vectors[249]))[1:6]].tolist()
+    assert [book_id for book_id, _ in merged.similar(250, n=5)] == expected
@@ -0,0 +1,212 @@
+import pytest
+from fastapi.testclient import TestClient
+from openbook import search
+from openbook.auth import optional_user
+from openbook.catalog import BookCache, BookRecord, book_cache
+from openbook.database import get_db
+from openbook.models.orm import Author, AuthorBook, Book, BookStatus, User, UserBook
+from openbook.search import Fts5Search, Match, PostgresSearch, search_cache, typeahead_score
+from openbook.server import app
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def search_db(migrated_db, dependency_overrides):
+    """A migrated database behind the app, with the search and book caches emptied."""
+    engine = create_engine(f"sqlite:///{migrated_db}")
+    sessions = async_sessionmaker(
+        bind=create_async_engine(f"sqlite+aiosqlite:///{migrated_db}"), expire_on_commit=False
+    )
+
+    async def override_get_db():
+        async with sessions() as db:
+            yield db
+
+    dependency_overrides[get_db] = override_get_db
+    search_cache.clear()
+    book_cache.clear()
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def add_books(session_factory, titles, author_name="Test Author"):
+    with session_factory() as db:
+        author = Author(name=author_name)
+        books = [Book(title=title, isbn=f"{author_name}-{i}") for i, title in enumerate(titles)]
+        db.add_all([author, *books])
+        db.flush()
+        db.add_all([AuthorBook(book_id=book.id, author_id=author.id) for book in books])
+        db.commit()
+        return [book.id for book in books]
+
+
+def walk(params):
+    """Follow next_cursor until the results run out."""
+    results = []
+    cursor = None
+    while True:
+        response = client.get("/books/search", params=params | ({"cursor": cursor} if cursor else {}))
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["books"]) <= params["limit"]
+        results.extend(page["books"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return results
+
+
+def test_search_title_is_ranked_and_paged(search_db):
+    titles = [f"dragon tale {i}" for i in range(7)] + ["dragon dragon dragon", "no match here"]
+    ids = add_books(search_db, titles)
+
+    results = walk({"title": "dragon", "limit": 3})
+
+    assert len(results) == 8
+    assert len({book["id"] for book in results}) == 8
+    # The title that mentions the term most often ranks first under bm25.
+    assert results[0]["id"] == ids[7]
+
+
+def test_search_author_is_paged(search_db):
+    add_books(search_db, [f"book {i}" for i in range(5)], author_name="Ursula Le Guin")
+    add_books(search_db, ["other book"], author_name="Someone Else")
+
+    results = walk({"author": "ursula", "limit": 2})
+
+    assert sorted(book["title"] for book in results) == [f"book {i}" for i in range(5)]
+    assert all(book["authors"][0]["name"] == "Ursula Le Guin" for book in results)
+
+
+def test_search_rejects_bad_cursor(search_db):
+    response = client.get("/books/search", params={"title": "dragon", "cursor": "bm90IGEgY3Vyc29y"})
+    assert response.status_code == 400
+
+
+def test_search_cache_is_invalidated_by_catalog_changes(search_db):
+    add_books(search_db, ["dragon tale"])
+    first = client.get("/books/search", params={"title": "dragon", "limit": 5}).json()
+    # Extra whitespace normalizes to the same cached page.
+    assert client.get("/books/search", params={"title": " dragon ", "limit": 5}).json() == first
+    assert len(search_cache) == 1
+
+    add_books(search_db, ["dragon song"], author_name="Another Author")
+    results = client.get("/books/search", params={"title": "dragon", "limit": 5}).json()["books"]
+
+    assert sorted(book["title"] for book in results) == ["dragon song", "dragon tale"]
+    assert len(search_cache) == 2
+
+
+def test_books_are_cached_until_the_catalog_changes(search_db):
+    [book_id] = add_books(search_db, ["dragon tale"])
+    assert client.get("/books/search", params={"title": "dragon"}).json()["books"][0]["title"] == "dragon tale"
+    assert len(book_cache) == 1
+
+    with search_db() as db:
+        db.get(Book, book_id).title = "dragon saga"
+        db.commit()
+
+    assert client.get("/books/search", params={"title": "dragon"}).json()["books"][0]["title"] == "dragon saga"
+    assert client.get("/books/search", params={"title": "saga"}).json()["books"][0]["id"] == book_id
+
+
+def test_book_cache_ignores_callers_at_an_older_version():
+    cache = BookCache(maxsize=10)
+    current = BookRecord(1, "isbn", "new title", ())
+    cache.get_many([1], version=2)
+    cache.set_many([current], version=2)
+
+    assert cache.get_many([1], version=1) == {}
+    cache.set_many([BookRecord(1, "isbn", "old title", ())], version=1)
+    assert cache.get_many([1], version=2) == {1: current}
+
+    assert cache.get_many([1], version=3) == {}
+    assert len(cache) == 0
+
+
+def test_search_returns_each_book_once_with_the_users_status(search_db, dependency_overrides):
+    reader = User(id="reader", email="reader@example.com", name="Reader")
+    with search_db() as db:
+        authors = [Author(name="Ursula Smith"), Author(name="Terry Smith")]
+        book = Book(title="dragon tale", isbn="co-written")
+        other = User(id="other", email="other@example.com", name="Other")
+        db.add_all([*authors, book, User(id=reader.id, email=reader.email, name=reader.name), other])
+        db.flush()
+        db.add_all([AuthorBook(book_id=book.id, author_id=author.id) for author in authors])
+        db.add(UserBook(user_id=other.id, book_id=book.id, status=BookStatus.COMPLETED))
+        db.add(UserBook(user_id=reader.id, book_id=book.id, status=BookStatus.READING))
+        db.commit()
+        book_id = book.id
+
+    dependency_overrides[optional_user] = lambda: reader
+    for params in ({"title": "dragon"}, {"author": "smith"}):
+        books = client.get("/books/search", params=params).json()["books"]
+        assert [book["id"] for book in books] == [book_id]
+        assert sorted(author["name"] for author in books[0]["authors"]) == ["Terry Smith", "Ursula Smith"]
+        assert books[0]["status"] == "reading"
+    del dependency_overrides[optional_user]
+
+    assert client.get("/books/search", params={"title": "dragon"}).json()["books"][0]["status"] == "unread"
+
+
+@pytest.mark.parametrize("backend", [Fts5Search(), PostgresSearch()], ids=["sqlite", "postgresql"])
+@pytest.mark.parametrize("keyset", [False, True])
+def test_search_backends_take_the_same_parameters(backend, keyset):
+    after = {"after_0", "after_1"} if keyset else set()
+    title = backend.title_query(keyset).compile(dialect=postgresql.dialect())
+    author = backend.author_query(keyset).compile(dialect=postgresql.dialect())
+    assert set(title.params) == {"title", "limit"} | after
+    assert set(author.params) == {"author", "limit"} | after
+
+
+@pytest.mark.parametrize("backend", [Fts5Search(), PostgresSearch()], ids=["sqlite", "postgresql"])
+@pytest.mark.parametrize("match", list(Match))
+def test_typeahead_queries_take_the_same_parameters(backend, match):
+    for field in ("title", "author"):
+        query = backend.typeahead_query(field, match).compile(dialect=postgresql.dialect())
+        assert set(query.params) == {"query", "candidates", "scan"}
+    assert backend.typeahead_terms(match, ["harr", "pott"]) is not None
+    assert backend.typeahead_terms(Match.TRIGRAM, ["ab"]) is None
+
+
+def test_typeahead_finds_partial_and_misspelled_titles(search_db):
+    ids = add_books(search_db, ["Harry Potter and the Goblet of Fire", "Harrowing Tales", "The Potteries", "Fire"])
+
+    def typeahead(**params):
+        response = client.get("/books/search", params={"mode": "typeahead", **params})
+        assert response.status_code == 200
+        assert response.json()["next_cursor"] is None
+        return [book["id"] for book in response.json()["books"]]
+
+    assert typeahead(title="harr pott") == [ids[0]]
+    assert typeahead(title="hary poter") == [ids[0]]
+    # "harr" is more of "Harry" than of "Harrowing".
+    assert typeahead(title="harr")[:2] == [ids[0], ids[1]]
+    # An exact word beats a prefix of one.
+    assert typeahead(title="fire")[:2] == [ids[3], ids[0]]
+    assert typeahead(author="test auth") == typeahead(author="test auther") == ids
+    assert typeahead(title="?!") == []
+
+    response = client.get("/books/search", params={"mode": "typeahead", "title": "harr", "cursor": "x"})
+    assert response.status_code == 400
+
+
+def test_typeahead_keeps_the_best_ranked_candidates(search_db, monkeypatch):
+    monkeypatch.setattr(search, "TYPEAHEAD_CANDIDATES", 3)
+    ids = add_books(search_db, [f"the long chronicles of the dragon volume {i}" for i in range(5)] + ["dragon"])
+
+    response = client.get("/books/search", params={"mode": "typeahead", "title": "dragon"})
+
+    assert response.json()["books"][0]["id"] == ids[-1]
+
+
+def test_typeahead_scores_words_then_prefixes_then_similar_words():
+    query = ["potter"]
+    scores = [typeahead_score(query, text) for text in ("Potter", "Potteries", "Poter", "Porter", "Hatter")]
+    assert scores == sorted(scores, reverse=True)
+    assert scores[0] == 1.0
+    assert scores[-1] == 0.0